@@ -2,13 +2,16 @@
 # Modern, deprecation-free analyst agent for the 3-agent MVP
 from __future__ import annotations
 
-from typing import List
+from typing import Iterator, List
 
 from langchain_openai import ChatOpenAI
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 
+from utils.context_packer import pack_context
+from utils.metrics import callback as metrics_callback
+
 
 def _format_docs_with_citations(docs: List[Document]) -> List[Document]:
     """
@@ -31,6 +34,7 @@ llm = ChatOpenAI(
     streaming=True,
     timeout=60,
     max_retries=2,
+    callbacks=[metrics_callback],   # LLM latency and token usage → /metrics
 )
 
 # Prompt template: keep it grounded in provided evidence
@@ -54,6 +58,12 @@ lightweight citations like [p.X | filename] taken from the context.
 analyst_chain = create_stuff_documents_chain(llm=llm, prompt=prompt)
 
 
+NO_CONTEXT_ANSWER = (
+    "No supporting context was retrieved, so I can't answer confidently. "
+    "Please rebuild the index or broaden the query."
+)
+
+
 def analyst_agent(input_documents: List[Document], query: str) -> str:
     """
     Run the analyst over retrieved documents to produce a concise, grounded answer.
@@ -67,15 +77,39 @@ def analyst_agent(input_documents: List[Document], query: str) -> str:
     """
     # Guard rails: handle empty retrieval gracefully
     if not input_documents:
-        return (
-            "No supporting context was retrieved, so I can't answer confidently. "
-            "Please rebuild the index or broaden the query."
-        )
+        return NO_CONTEXT_ANSWER
 
-    docs_with_citations = _format_docs_with_citations(input_documents)
+    # Merge overlapping chunks, drop near-duplicates and cap the prompt's context tokens
+    docs_with_citations = _format_docs_with_citations(pack_context(input_documents))
 
     # Pass docs under the key "context" (the chain's expected variable)
     response: str = analyst_chain.invoke({"context": docs_with_citations, "query": query})
     print("\n[AnalystAgent] Done processing.\n")
     return response
 
+
+
+def analyst_agent_stream(input_documents: List[Document], query: str) -> Iterator[str]:
+    """
+    Streaming variant of `analyst_agent`: yields answer tokens as the model
+    produces them, so callers can show the first words without waiting for the rest.
+    """
+    if not input_documents:
+        yield NO_CONTEXT_ANSWER
+        return
+
+    docs_with_citations = _format_docs_with_citations(pack_context(input_documents))
+    for token in analyst_chain.stream({"context": docs_with_citations, "query": query}):
+        yield token
+    print("\n[AnalystAgent] Done streaming.\n")
+
+
+async def aanalyst_agent(input_documents: List[Document], query: str) -> str:
+    """Async variant of `analyst_agent` (awaits the LLM instead of blocking a thread)."""
+    if not input_documents:
+        return NO_CONTEXT_ANSWER
+
+    docs_with_citations = _format_docs_with_citations(pack_context(input_documents))
+    response: str = await analyst_chain.ainvoke({"context": docs_with_citations, "query": query})
+    print("\n[AnalystAgent] Done processing.\n")
+    return response
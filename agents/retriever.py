@@ -23,3 +23,10 @@ def retriever_agent(query: str):
     print(f"\n[RetrieverAgent] Done processing. Retrieved {len(docs)} documents.\n")
     return docs
 
+
+async def aretriever_agent(query: str):
+    """Async variant of `retriever_agent`, for running many audits concurrently."""
+    print(f"\n[RetrieverAgent] Processing query: {query}")
+    docs = await retriever_tool._arun(query)
+    print(f"\n[RetrieverAgent] Done processing. Retrieved {len(docs)} documents.\n")
+    return docs
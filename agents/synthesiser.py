@@ -6,7 +6,9 @@ from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
-_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, timeout=60, max_retries=2)
+from utils.metrics import callback as metrics_callback
+
+_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, timeout=60, max_retries=2, callbacks=[metrics_callback])
 
 _prompt = ChatPromptTemplate.from_template(
     """You are a senior analyst. Write a concise executive summary from the analyst's findings.
@@ -40,3 +42,8 @@ def synthesiser_agent(analyst_answer: str, docs: List[Document]) -> str:
     chain = _prompt | _llm | _parser
     return chain.invoke({"analyst_answer": analyst_answer, "citations": citations})
 
+
+async def asynthesiser_agent(analyst_answer: str, docs: List[Document]) -> str:
+    citations = _collect_citations(docs)
+    chain = _prompt | _llm | _parser
+    return await chain.ainvoke({"analyst_answer": analyst_answer, "citations": citations})
@@ -1,13 +1,20 @@
 # app.py — Flask app for Risk Auditor Agent (context-only GPT + concise sources)
 
-from flask import Flask, render_template, request, session
-from chains.chat_chain import get_chain
+from flask import Flask, Response, g, jsonify, render_template, request, session, stream_with_context
+from chains.chat_chain import condense_question, get_chain, stream_answer
+from utils.answer_cache import SemanticAnswerCache
+from utils.index_registry import RegistryEmbeddings, get_vectorstore
+from utils.metrics import metrics, span
+from utils.query_cache import query_cache_stats
 from utils.query_filter import extract_page_number_from_query
-from utils.score_responses import score_response_gpt
+from utils.reranker import get_reranker
+from utils.session_store import SessionStore
+from utils.topic_continuity import TopicTracker
+from utils.eval_queue import get_eval_queue
 from utils.snippet_utils import summarize_sources_for_display
 import re
-import openai
 import os
+import uuid
 from dotenv import load_dotenv
 import logging
 
@@ -15,7 +22,6 @@ import logging
 # Load environment variables
 # ──────────────────────────────
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 # ──────────────────────────────
 # Logging configuration
@@ -36,32 +42,42 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 chain = get_chain()
+# Embeds through the current store's query-embedding cache (resolved per call, so a
+# rebuilt index with another model is followed), and a miss costs no extra call at retrieval
+answer_cache = SemanticAnswerCache(RegistryEmbeddings())
+# GPT scoring runs on a bounded background pool, never on the request path
+evaluator = get_eval_queue()
+# Per-session vector of the previous question, for the "new topic?" prompt
+topics = TopicTracker(RegistryEmbeddings())
+# Chat history lives server-side; the cookie only carries the session ID
+sessions = SessionStore()
 
 # ──────────────────────────────
-# Topic continuity check (via GPT)
+# Conversation history (server-side, token-budgeted)
 # ──────────────────────────────
-def is_topic_related(new_question: str, previous_question: str, threshold: float = 0.75) -> bool:
-    prompt = f"""
-Determine how topically related these two questions are on a scale from 0 to 1 (0 = unrelated, 1 = very related):
+def _load_conversation(reset: bool):
+    """(sid, windowed history, previous question) for this browser session; `reset` clears it."""
+    sid = session.setdefault("sid", uuid.uuid4().hex)
+    if reset:
+        sessions.reset(sid)
+    return sid, sessions.history(sid), sessions.last_question(sid)
 
-Q1: "{previous_question}"
-Q2: "{new_question}"
-
-Just return a single number between 0 and 1.
-"""
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-        )
-        score_str = response.choices[0].message["content"].strip()
-        score = float(score_str)
-        logger.info(f"Topic similarity score: {score:.2f}")
-        return score >= threshold
-    except Exception as e:
-        logger.warning(f"Failed to evaluate topic similarity: {e}")
-        return True  # Fail open
+# ──────────────────────────────
+# Topic continuity check (embedding similarity)
+# ──────────────────────────────
+def suggest_topic_reset(sid: str, standalone: str, previous_question: str, reset: bool) -> bool:
+    """
+    True when the new question drifts away from the session's previous one.
+    Reuses the standalone question's embedding, which retrieval needs anyway.
+    """
+    if reset:
+        topics.reset(sid)
+    with span("topic_check"):
+        score = topics.similarity(sid, standalone, None if reset else previous_question)
+    if score is None:
+        return False
+    logger.info(f"Topic similarity score: {score:.2f}")
+    return score < topics.threshold
 
 # ──────────────────────────────
 # Optional truncation helper
@@ -85,42 +101,226 @@ def ask():
     question = request.form["question"]
     reset = request.form.get("reset") == "true"
 
-    chat_history = [] if reset or "chat_history" not in session else session["chat_history"]
-    previous_question = session.get("previous_question", "")
-    suggest_reset = False
-
-    if previous_question and not reset:
-        suggest_reset = not is_topic_related(question, previous_question)
-        logger.info(f"Suggest reset: {suggest_reset}")
+    sid, chat_history, previous_question = _load_conversation(reset)
 
-   
-    # Run LLM chain
-    # Invoke chain normally; context will be injected via retrieval
-    result = chain.invoke({"question": question, "chat_history": chat_history})
+    # Condense the follow-up first, so near-duplicate questions can be answered
+    # from the semantic cache (scoped to the index version currently served)
+    with span("condense"):
+        standalone = condense_question(chain, question, chat_history)
+    suggest_reset = suggest_topic_reset(sid, standalone, previous_question, reset)
+    logger.info(f"Suggest reset: {suggest_reset}")
+    store = get_vectorstore()
+    with span("answer_cache_lookup"):
+        cached = answer_cache.lookup(standalone, store.index_version)
+    if cached:
+        logger.info("Answer cache hit (%.3f): %r ~ %r", cached["similarity"], standalone, cached["cached_question"])
+        answer, source_summaries, eval_id = _cached_answer(cached, question, store.index_version)
+    else:
+        # Run LLM chain on the standalone question; the empty history skips a second condensation
+        with span("chain"):  # retrieval and the answer LLM call are spans inside it
+            result = chain.invoke({"question": standalone, "chat_history": []})
 
+        answer = result["answer"]
 
-    answer = result["answer"]
+        # Source summarisation
+        source_summaries = summarize_sources_for_display(result["source_documents"], max_sentences=3)
+        logger.info("Source Pages Passed: %s", [doc.metadata.get("page") for doc in result["source_documents"]])
 
-    # Source summarisation
-    source_summaries = summarize_sources_for_display(result["source_documents"], max_sentences=3)
-    logger.info("Source Pages Passed: %s", [doc.metadata.get("page") for doc in result["source_documents"]])
+        # Evaluate in the background; the page polls /scores/<id>
+        eval_id = evaluator.submit(question, answer, source_summaries)
+        answer_cache.store(standalone, store.index_version,
+                           {"answer": answer, "sources": source_summaries, "eval_id": eval_id})
 
-    # Evaluate (optional)
-    scores = score_response_gpt(question, answer, source_summaries)
-
-    # Update session
-    session["chat_history"] = chat_history + [(question, answer)]
-    session["previous_question"] = question
+    # Record the turn in the server-side history
+    sessions.append(sid, question, answer, standalone)
 
     return render_template(
         "partials/answer_block.html",
         answer=answer,
         sources=source_summaries,
-        scores=scores,
         suggest_reset=suggest_reset,
-        question=question
+        question=question,
+        **_evaluation(eval_id),
     )
 
+# ──────────────────────────────
+# Background answer evaluation
+# ──────────────────────────────
+def _cached_answer(cached: dict, question: str, version: str) -> tuple:
+    """(answer, sources, eval_id) of an answer-cache hit, re-queuing scoring if its evaluation record is gone."""
+    answer, source_summaries, eval_id = cached["answer"], cached["sources"], cached["eval_id"]
+    if evaluator.status(eval_id) is None:
+        # evicted from the evaluator's bounded results: score the cached answer again
+        eval_id = evaluator.submit(question, answer, source_summaries)
+        answer_cache.store(cached["cached_question"], version,
+                           {"answer": answer, "sources": source_summaries, "eval_id": eval_id})
+    return answer, source_summaries, eval_id
+
+
+def _evaluation(eval_id: str) -> dict:
+    """Template context for partials/scores.html."""
+    record = evaluator.status(eval_id) or {}
+    return {"eval_id": eval_id, "status": record.get("status"), "scores": record.get("scores")}
+
+
+@app.route("/scores/<eval_id>")
+def scores(eval_id):
+    """Polled by the answer block until the background evaluation has finished."""
+    return render_template("partials/scores.html", **_evaluation(eval_id))
+
+
+@app.route("/stats/evaluations")
+def evaluation_stats():
+    return jsonify(evaluator.stats())
+
+# ──────────────────────────────
+# Streaming variant of /ask (Server-Sent Events)
+# ──────────────────────────────
+def _sse(event: str, data: str) -> str:
+    lines = [f"event: {event}"]
+    lines += [f"data: {line}" for line in data.split("\n")]
+    return "\n".join(lines) + "\n\n"
+
+
+@app.route("/ask/stream")
+def ask_stream():
+    question = request.args.get("question", "").strip()
+    if not question:
+        return "Question cannot be empty.", 400
+    reset = request.args.get("reset") == "true"
+    # Resolve the session before the stream starts: the cookie can't change afterwards
+    sid, chat_history, previous_question = _load_conversation(reset)
+    # the stream outlives this view, so the generator (not teardown_request) finishes the trace
+    trace, trace_token = g.pop("trace", None), g.pop("trace_token", None)
+
+    def events():
+        with span("condense"):
+            standalone = condense_question(chain, question, chat_history)
+        suggest_reset = suggest_topic_reset(sid, standalone, previous_question, reset)
+        store = get_vectorstore()
+        with span("answer_cache_lookup"):
+            cached = answer_cache.lookup(standalone, store.index_version)
+        if cached:
+            logger.info("Answer cache hit (%.3f): %r ~ %r", cached["similarity"], standalone, cached["cached_question"])
+            answer, source_summaries, eval_id = _cached_answer(cached, question, store.index_version)
+            yield _sse("token", answer)
+        else:
+            docs, tokens = stream_answer(chain, standalone)
+            parts = []
+            for token in tokens:
+                parts.append(token)
+                yield _sse("token", token)
+            answer = "".join(parts)
+
+            # Sources follow the answer text; scores are polled once the background evaluation is done
+            source_summaries = summarize_sources_for_display(docs, max_sentences=3)
+            logger.info("Source Pages Passed: %s", [doc.metadata.get("page") for doc in docs])
+            eval_id = evaluator.submit(question, answer, source_summaries)
+            answer_cache.store(standalone, store.index_version,
+                               {"answer": answer, "sources": source_summaries, "eval_id": eval_id})
+
+        sessions.append(sid, question, answer, standalone)  # history is server-side, so no cookie update needed
+        yield _sse("done", render_template(
+            "partials/answer_block.html",
+            answer=answer,
+            sources=source_summaries,
+            suggest_reset=suggest_reset,
+            question=question,
+            streamed=True,
+            **_evaluation(eval_id),
+        ))
+
+    def traced_events():
+        try:
+            with metrics.use_trace(trace):
+                yield from events()
+        finally:
+            if trace is not None:
+                metrics.finish_trace(trace, trace_token)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if trace is not None:
+        headers["X-Trace-Id"] = trace.trace_id
+    return Response(stream_with_context(traced_events()), mimetype="text/event-stream", headers=headers)
+
+
+# ──────────────────────────────
+# Latency tracing and /metrics
+# ──────────────────────────────
+TRACED_ENDPOINTS = {"ask", "ask_stream"}
+
+
+@app.before_request
+def start_trace():
+    if request.endpoint in TRACED_ENDPOINTS:
+        g.trace, g.trace_token = metrics.start_trace(request.endpoint)
+
+
+@app.after_request
+def add_trace_header(response):
+    if "trace" in g:
+        response.headers["X-Trace-Id"] = g.trace.trace_id
+    return response
+
+
+@app.teardown_request
+def finish_trace(exc):
+    if "trace" in g:
+        metrics.finish_trace(g.pop("trace"), g.pop("trace_token"))
+
+
+def _component_metrics():
+    """Hit rates and queue sizes that the caches and the evaluator already track."""
+    hit_rates = [({"cache": "query_embedding", "model": s["model"]}, s["hit_rate"]) for s in query_cache_stats()]
+    hit_rates.append(({"cache": "answer"}, answer_cache.stats()["hit_rate"]))
+    reranker = get_reranker()
+    if reranker:
+        r = reranker.stats()
+        lookups = r["cache_hits"] + r["pairs_scored"]
+        hit_rates.append(({"cache": "rerank_pairs"}, r["cache_hits"] / lookups if lookups else 0.0))
+    evals = evaluator.stats()
+    return [
+        ("cache_hit_ratio", "gauge", "Hit rate of each cache since start", hit_rates),
+        ("evaluations", "gauge", "Background evaluations, by status",
+         [({"status": status}, n) for status, n in sorted(evals.items()) if status != "workers"]),
+    ]
+
+
+metrics.register_collector(_component_metrics)
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/stats/latency")
+def latency_stats():
+    """p50 / p95 / p99 per pipeline stage over the recent window."""
+    return jsonify(metrics.latency())
+
+
+@app.route("/traces/<trace_id>")
+def trace_detail(trace_id):
+    """Per-stage timings of a recent /ask request (ID from its X-Trace-Id header)."""
+    trace = metrics.get_trace(trace_id)
+    return jsonify(trace) if trace else ("Unknown or expired trace.", 404)
+
+
+@app.route("/stats/query-cache")
+def query_cache():
+    """Hit rate and embedding time saved by the query-embedding cache."""
+    return jsonify(query_cache_stats())
+
+@app.route("/stats/answer-cache")
+def answer_cache_stats():
+    return jsonify(answer_cache.stats())
+
+@app.route("/stats/reranker")
+def reranker_stats():
+    reranker = get_reranker()
+    return jsonify(reranker.stats() if reranker else {"enabled": False})
+
 # ──────────────────────────────
 # Run the app
 # ──────────────────────────────
@@ -5,31 +5,60 @@
 # ──────────────────────────────────────────────────────────────
 from __future__ import annotations
 
-from typing import Any, List
+from typing import Any, Iterator, List, Tuple
 
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 from langchain_openai import ChatOpenAI
 from langchain.schema import BaseRetriever, Document
-from pydantic import Field                                  # ← needed for Pydantic fields
-
-from utils.vectorstore import load_vectorstore
+from langchain_core.prompts import format_document
+from langchain_core.pydantic_v1 import Field               # BaseRetriever is a pydantic v1 model
+
+from utils.hybrid import fuse_with_bm25
+from utils.index_registry import RegistryRetriever, get_vectorstore
+from utils.metadata_index import allowed_chunk_ids
+from utils.metrics import callback as metrics_callback, span
+from utils.reranker import RERANK_TOP_K, get_reranker
+from utils.vectorstore import VECTORSTORE_PATH
 from config import USE_MMR, SCORE_THRESHOLD, TOP_K
 
 # ─── Custom wrapper that boosts exact keyword matches ─────────
 class SimpleBoostedRetriever(BaseRetriever):
     """
-    Wrap an existing LangChain retriever and push up any chunk that
-    contains an exact keyword from the query.
+    Wrap an existing LangChain retriever and push up chunks that match the
+    query's keywords: fused with the index's BM25 ranking when it has one,
+    otherwise by floating any chunk that contains an exact keyword. With a
+    `reranker`, the fused candidate pool is reranked by a cross-encoder instead.
     """
 
     inner: Any = Field(...)           # required – underlying Retriever / FAISS wrapper
     k: int = Field(default=TOP_K)
+    reranker: Any = Field(default=None)   # optional utils.reranker.CrossEncoderReranker
 
     # sync
     def get_relevant_documents(self, query: str) -> List[Document]:
+        with span("retrieval") as attrs:
+            docs = self._retrieve(query)
+            attrs["documents"] = len(docs)
+        return docs
+
+    def _retrieve(self, query: str) -> List[Document]:
         # pull 2×k candidate docs from the inner retriever
         candidates = self.inner.get_relevant_documents(query)
+        pool = max(self.k, self.reranker.pool_size) if self.reranker else self.k
+
+        store = get_vectorstore(getattr(self.inner, "path", VECTORSTORE_PATH))
+        if getattr(store, "bm25", None) is not None:
+            # keyword evidence comes from posting lists, not a scan of every candidate
+            metadata_index = getattr(store, "metadata_index", None)
+            ids = metadata_index.select_for_query(query) if metadata_index is not None else None
+            allowed = allowed_chunk_ids(store, ids) if ids is not None and len(ids) else None
+            fused = fuse_with_bm25(store, query, candidates, pool, fetch_k=2 * pool, allowed=allowed)
+            return self.reranker.rerank(query, fused, self.k) if self.reranker else fused
+
+        if self.reranker:
+            return self.reranker.rerank(query, candidates, self.k)
+
         keywords = {w.lower() for w in query.split()}
 
         scored: list[tuple[Document, float]] = []
@@ -48,32 +77,69 @@ class SimpleBoostedRetriever(BaseRetriever):
 
 # ─── Factory ──────────────────────────────────────────────────
 def get_chain() -> ConversationalRetrievalChain:
-    # 1. Load the FAISS store you built earlier
-    vectorstore = load_vectorstore()
-
-    # 2. Create the standard vectorstore retriever (MMR or similarity)
-    base_retriever = vectorstore.as_retriever(
+    # 1–2. Standard vectorstore retriever (MMR or similarity) over the shared
+    #      FAISS store; it resolves the registry on each query so rebuilds hot-swap
+    #      With reranking on, it fetches the larger candidate pool instead
+    reranker = get_reranker()
+    base_retriever = RegistryRetriever(
         search_type="mmr" if USE_MMR else "similarity",
-        search_kwargs={"k": TOP_K, "score_threshold": SCORE_THRESHOLD},
+        search_kwargs={"k": reranker.pool_size if reranker else TOP_K, "score_threshold": SCORE_THRESHOLD},
     )
 
-    # 3. Wrap it with our boosting logic
-    boosted_retriever = SimpleBoostedRetriever(inner=base_retriever, k=TOP_K)
-
-    # 4. Add conversational memory
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True,
-        output_key="answer",
-    )
+    # 3. Wrap it with our boosting logic (and the cross-encoder, which can
+    #    hand the LLM fewer, more precise chunks)
+    boosted_retriever = SimpleBoostedRetriever(inner=base_retriever, k=RERANK_TOP_K if reranker else TOP_K,
+                                               reranker=reranker)
 
-    # 5. Assemble the chain
-    llm = ChatOpenAI(temperature=0)
+    # 4. Assemble the chain. It holds no memory: the chain is shared by every
+    #    request, so callers pass each session's (token-budgeted) chat_history
+    llm = ChatOpenAI(temperature=0, callbacks=[metrics_callback])  # LLM latency and token usage → /metrics
     return ConversationalRetrievalChain.from_llm(
         llm=llm,
         retriever=boosted_retriever,
-        memory=memory,
         return_source_documents=True,
         output_key="answer",
     )
 
+
+
+def condense_question(chain: ConversationalRetrievalChain, question: str, chat_history) -> str:
+    """
+    Rewrite a follow-up into a standalone question, as the chain itself would.
+    Invoking the chain afterwards with that question and an empty history
+    skips its own condensation step, so the LLM call isn't repeated.
+    """
+    turns = [tuple(turn) for turn in chat_history or []]  # session JSON turns tuples into lists
+    if not turns:
+        return question
+    get_chat_history = chain.get_chat_history or _get_chat_history
+    return chain.question_generator.invoke(
+        {"question": question, "chat_history": get_chat_history(turns)}
+    )["text"].strip()
+
+
+def stream_answer(chain: ConversationalRetrievalChain, question: str) -> Tuple[List[Document], Iterator[str]]:
+    """
+    Retrieve for a standalone `question`, then stream the answer tokens.
+
+    Runs the same retriever, prompt and LLM as `chain.invoke` with an empty
+    history; the documents are returned up front, the tokens lazily.
+    """
+    docs = chain.retriever.invoke(question)
+    stuff = chain.combine_docs_chain
+    llm_chain = stuff.llm_chain
+    # Fill the prompt as the stuff chain does: each document through its document prompt, joined by its separator
+    context = stuff.document_separator.join(format_document(doc, stuff.document_prompt) for doc in docs)
+    values = {stuff.document_variable_name: context, "question": question, "chat_history": ""}
+    inputs = {name: values[name] for name in llm_chain.prompt.input_variables if name in values}
+    return docs, _timed_tokens((llm_chain.prompt | llm_chain.llm).stream(inputs))
+
+
+def _timed_tokens(chunks) -> Iterator[str]:
+    # the span covers first token to last, i.e. while the client is being streamed to
+    with span("answer_llm") as attrs:
+        n = 0
+        for chunk in chunks:
+            n += 1
+            yield chunk.content
+        attrs["chunks"] = n
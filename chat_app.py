@@ -8,19 +8,19 @@ from datetime import datetime
 from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI
-from utils.vectorstore import build_vectorstore, split_documents, load_documents_from_pdf_dir
-from utils.stats import log_chunk_stats, log_document_token_stats
-from utils.query_filter import filter_chunks_by_page
+from utils.index_registry import RegistryRetriever, get_vectorstore
+from utils.metadata_index import query_constraints
+from utils.stats import log_chunk_stats
+from utils.eval_queue import get_eval_queue
 from utils.score_responses import score_response_gpt
 from config import USE_MMR, SCORE_THRESHOLD, TOP_K
-from config import FILENAME_FILTERING_ENABLED
-from utils.query_filter import filter_chunks_by_filename
 from flask import Flask, render_template, request, jsonify
 from chains.chat_chain import get_chain
 from utils.score_responses import score_response_gpt
 
 app = Flask(__name__)
 chat_chain = get_chain()
+evaluator = get_eval_queue()
 
 @app.route("/")
 def index():
@@ -44,53 +44,25 @@ def ask():
             "snippet": doc.page_content[:300]  # Short preview
         })
 
-    scores = score_response_gpt(question, answer, source_info)
+    # Scored in the background; the answer block polls /scores/<id>
+    eval_id = evaluator.submit(question, answer, source_info)
 
-    return render_template("partials/answer_block.html", answer=answer, sources=source_info, scores=scores)
+    return render_template("partials/answer_block.html", answer=answer, sources=source_info,
+                           eval_id=eval_id, status=(evaluator.status(eval_id) or {}).get("status"))
+
+
+@app.route("/scores/<eval_id>")
+def scores(eval_id):
+    record = evaluator.status(eval_id) or {}
+    return render_template("partials/scores.html", eval_id=eval_id, status=record.get("status"),
+                           scores=record.get("scores"))
 if __name__ == "__main__":
     app.run(debug=True)
 
-    # Load documents
-    docs = load_documents_from_pdf_dir("data")
-    print(f"Loaded {len(docs)} documents from PDF files.")
-    for i, d in enumerate(docs[:3]):
-        print("---")
-        print(d.page_content[:300])
-        print("Source:", d.metadata.get("source"))
-
-    # Log token stats
-    log_document_token_stats(docs)
-
-    # Split into smaller chunks
-    chunks = split_documents(docs)
-
-    # Optional: filter chunks by filename clue in query
-    user_query_preview = input("Type a test query to optimise vectorstore (or press Enter to skip): ")
-    filtered_chunks = filter_chunks_by_filename(chunks, user_query_preview) if user_query_preview else chunks
-    def filter_chunks_by_filename(chunks, query):
-        """Filter chunks based on filename clue in the query."""
-        match = re.search(r"\b(?:WIR)?(?:20)?(1[0-9]|20[0-9]{2}|21[0-9]{2})\b", query)
-        if match:
-            clue = f"wir{match.group(1)}"
-            return [c for c in chunks if clue in c.metadata.get("source", "")]
-        return chunks  # no clue in query, return all   
-
-    # Log WIR chunk count (optional)
-    wir_chunks = [doc for doc in chunks if 'wir2024' in doc.metadata.get("source", "")]
-    print(f"Found {len(wir_chunks)} chunks from wir2024.pdf.")
-    log_chunk_stats(chunks)
-
-    # Build vectorstore
-    # after loading and splitting docs
-    query = input("User: ")  # or wherever your query is captured
-    user_query_preview = query  # Optional: could use a simplified/normed version
-
-    if FILENAME_FILTERING_ENABLED and user_query_preview:
-        filtered_chunks = filter_chunks_by_filename(chunks, user_query_preview)
-    else:
-        filtered_chunks = chunks
-
-    vs = build_vectorstore(filtered_chunks)
+    # Use the saved index; page and filename clues in each query are applied
+    # inside the search through its metadata index, so no per-query rebuild
+    vs = get_vectorstore()
+    log_chunk_stats([vs.docstore.search(doc_id) for doc_id in vs.index_to_docstore_id.values()])
 
 
     # Set up memory + LLM
@@ -101,7 +73,7 @@ if __name__ == "__main__":
         output_key="answer"
     )
 
-    retriever = vs.as_retriever(
+    retriever = RegistryRetriever(
         search_type="mmr" if USE_MMR else "similarity",
         search_kwargs={"k": TOP_K, "score_threshold": SCORE_THRESHOLD}
     )
@@ -136,16 +108,9 @@ if __name__ == "__main__":
             print("No answer found. Please try a different question.")
             continue
 
-        # Filter sources by page if "page X" is in query
-        match = re.search(r"\bpage\s+(\d+)", query.lower())
-        if match:
-            requested_page = int(match.group(1))
-            filtered_docs = filter_chunks_by_page(result["source_documents"], requested_page)
-            if filtered_docs:
-                result["source_documents"] = filtered_docs
-                print(f"[Filter] Showing only results from page {requested_page}.")
-            else:
-                print(f"[Filter] No results for page {requested_page}, showing all original sources.")
+        constraints = query_constraints(query)
+        if constraints:
+            print(f"[Filter] Searched only chunks matching {constraints}.")
 
         print("\nBot:", result["answer"])
 
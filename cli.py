@@ -18,7 +18,7 @@ def run_cli():
     if FILTER_BY_PAGE:
         page = extract_page_number_from_query(query)
         if page:
-            print(f" Page filter detected: filtering for page {page}")
+            print(f" Page filter detected: searching only chunks from page {page}")
 
     chain = get_chain()
     response = chain.invoke({
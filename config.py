@@ -1,4 +1,5 @@
 # config.py
+import os
 
 # Whether to use Maximal Marginal Relevance (MMR) during retrieval
 USE_MMR = True
@@ -16,4 +17,117 @@ FILENAME_FILTERING_ENABLED = True
 # Whether to filter chunks based on filename clues in the query
 FILTER_BY_PAGE = True
 
+# On-disk embedding cache shared by index builds (keyed by model + chunk text)
+EMBEDDING_CACHE_PATH = ".cache/embeddings.sqlite"
 
+# Worker processes for PDF parsing (1 = parse sequentially in-process)
+LOADER_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+# Pages per parsing task, so large reports are split across workers
+PAGES_PER_TASK = 40
+
+# Embedding requests kept in flight concurrently during index builds
+EMBED_MAX_IN_FLIGHT = 4
+# Token budget per embedding request (counted with tiktoken)
+EMBED_MAX_BATCH_TOKENS = 20000
+
+# Hybrid retrieval: weights of the dense (FAISS) and sparse (BM25) rankings
+# in reciprocal-rank fusion, and the RRF rank constant
+HYBRID_DENSE_WEIGHT = 1.0
+HYBRID_SPARSE_WEIGHT = 1.0
+RRF_K = 60
+
+# FAISS index family for new builds: "flat" (exact), "hnsw" or "ivf"
+FAISS_INDEX_TYPE = "flat"
+# Overrides for the family's defaults, e.g. {"M": 32, "efSearch": 64} or {"nlist": 256, "nprobe": 16}
+FAISS_INDEX_PARAMS = {}
+
+# Saved index versions kept on disk (older ones are pruned); readers still
+# loading a pruned version retry with the current one
+INDEX_KEEP_VERSIONS = 3
+
+# Filtered (page / filename) searches over at most this many chunks are scored
+# exactly in NumPy; larger filters run inside FAISS with an ID selector
+FILTER_EXACT_SCAN_MAX = 2048
+
+# Query-embedding cache used at retrieval time: max entries, time-to-live in
+# seconds, and the on-disk tier that survives restarts (None to disable)
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 3600.0
+QUERY_CACHE_PATH = ".cache/query_embeddings.sqlite"
+
+# Semantic answer cache for /ask: cosine similarity a new standalone question
+# needs to reuse an earlier answer, and the max number of cached answers
+ANSWER_CACHE_THRESHOLD = 0.93
+ANSWER_CACHE_SIZE = 256
+
+# Background answer evaluation (GPT scoring off the request path): worker
+# threads, queue bound, fraction of answers scored normally and once the queue
+# is half full, and the JSONL evaluation log
+EVAL_WORKERS = 2
+EVAL_MAX_QUEUE = 32
+EVAL_SAMPLE_RATE = 1.0
+EVAL_OVERLOAD_SAMPLE_RATE = 0.25
+EVAL_LOG_PATH = "outputs/evaluations.jsonl"
+
+# Batch evaluation CLI (scripts/evaluate_log.py): max concurrent scorer calls
+EVAL_BATCH_MAX_IN_FLIGHT = 32
+
+# Cosine similarity below which a follow-up counts as a new topic (suggest a reset)
+TOPIC_SIMILARITY_THRESHOLD = 0.8
+
+# Server-side chat history: SQLite path, token budget of the history window
+# passed to the chain, turns kept per session, and idle-session expiry (seconds)
+SESSION_DB_PATH = ".cache/sessions.sqlite"
+HISTORY_TOKEN_BUDGET = 1500
+SESSION_MAX_TURNS = 50
+SESSION_TTL = 7 * 24 * 3600
+
+# Analyst context packing: token budget for retrieved passages in the prompt,
+# and the shingle overlap at which a passage counts as a near-duplicate
+CONTEXT_MAX_TOKENS = 3000
+CONTEXT_NEAR_DUP_THRESHOLD = 0.8
+
+# Max audits in flight when main.run_audits runs many queries concurrently
+AUDIT_MAX_CONCURRENCY = 8
+
+# Queries embedded together and searched as one matrix by scripts/batch_audit.py
+AUDIT_SEARCH_BATCH = 64
+
+# Multi-facet questions in the audit retriever: "off", "rules" (split on coordinated
+# facets) or "llm" (ask the model, rules as fallback); at most MAX_SUBQUERIES searches
+QUERY_DECOMPOSITION = "rules"
+MAX_SUBQUERIES = 4
+
+# Token accounting (utils/token_accounting.py): tiktoken encoding, encoder threads
+# for batch counts, and the chunk size flagged as oversize in the corpus report
+TOKEN_ENCODING = "cl100k_base"
+TOKEN_THREADS = 8
+CHUNK_OVERSIZE_TOKENS = 3000
+
+# Embedding backend for new indexes: "openai" (API) or "local" (sentence-transformers
+# on CPU). Loading always uses the backend/model recorded in the index's metadata.
+EMBEDDING_BACKEND = "openai"
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# Local backend: torch CPU threads, padded tokens per batch, and max texts per batch
+EMBEDDING_THREADS = os.cpu_count() or 1
+LOCAL_EMBED_BATCH_TOKENS = 16384
+LOCAL_EMBED_MAX_BATCH = 128
+
+# Cross-encoder reranking (utils/reranker.py; needs sentence-transformers). When on,
+# retrievers fetch RERANK_POOL candidates and pass the best RERANK_TOP_K onwards;
+# scoring stops early once RERANK_BUDGET_MS is used up, and pair scores are cached
+RERANK_ENABLED = False
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_POOL = 20
+RERANK_TOP_K = 3
+RERANK_BUDGET_MS = 150
+RERANK_BATCH_SIZE = 8
+RERANK_CACHE_SIZE = 4096
+
+# Latency tracing: percentiles cover the last METRICS_WINDOW samples per stage;
+# the last TRACE_BUFFER_SIZE request traces are served at /traces/<id> and, if
+# TRACE_LOG_PATH is set, appended there as JSON lines
+METRICS_WINDOW = 1024
+TRACE_BUFFER_SIZE = 200
+TRACE_LOG_PATH = None
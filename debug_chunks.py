@@ -1,9 +1,9 @@
 # debug_chunks.py
 
-from utils.vectorstore import load_vectorstore
+from utils.index_registry import get_vectorstore
 
 def debug_chunk_for_phrase(phrase):
-    vs = load_vectorstore()
+    vs = get_vectorstore()
     results = vs.similarity_search(phrase, k=1)
     
     if not results:
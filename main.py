@@ -1,32 +1,96 @@
 # main.py
 
-from agents.retriever import retriever_agent
-from agents.analyst import analyst_agent
-from agents.synthesiser import synthesiser_agent
+import asyncio
+import sys
+from typing import Dict, List
+
+from agents.retriever import aretriever_agent, retriever_agent
+from agents.analyst import aanalyst_agent, analyst_agent_stream
+from agents.synthesiser import asynthesiser_agent, synthesiser_agent
+from utils.metrics import metrics, span
+
+try:
+    from config import AUDIT_MAX_CONCURRENCY
+except Exception:
+    AUDIT_MAX_CONCURRENCY = 8
 
 
 def run_audit(query: str):
-    docs = retriever_agent(query)
+    trace, token = metrics.start_trace("audit")
+    try:
+        _run_audit(query)
+    finally:
+        metrics.finish_trace(trace, token)
+
+
+def _run_audit(query: str):
+    with span("retriever"):
+        docs = retriever_agent(query)
 
     # Debug preview of retrieved evidence
     for d in docs:
         print(d.metadata.get("source"), d.metadata.get("page"), d.page_content[:300], "...\n")
 
-    # Analyst step
-    answer = analyst_agent(input_documents=docs, query=query)
-
+    # Analyst step (tokens are printed as they arrive)
     print("\n========================\nFinal Answer:\n")
-    print(answer)
-    print("\n========================\n")
+    parts = []
+    with span("analyst"):
+        for token in analyst_agent_stream(input_documents=docs, query=query):
+            print(token, end="", flush=True)
+            parts.append(token)
+    answer = "".join(parts)
+    print("\n\n========================\n")
 
     # Synthesiser step (executive summary)
-    summary = synthesiser_agent(answer, docs)
+    with span("synthesiser"):
+        summary = synthesiser_agent(answer, docs)
     print("\n[Synthesiser] Executive Summary\n")
     print(summary)
 
 
+async def arun_audit(query: str) -> Dict:
+    """Async pipeline: retrieval, analyst and synthesiser awaited in turn."""
+    trace, token = metrics.start_trace("audit")  # each gathered task has its own context
+    try:
+        with span("retriever"):
+            docs = await aretriever_agent(query)
+        with span("analyst"):
+            answer = await aanalyst_agent(input_documents=docs, query=query)
+        with span("synthesiser"):
+            summary = await asynthesiser_agent(answer, docs)
+    finally:
+        metrics.finish_trace(trace, token)
+    return {"query": query, "answer": answer, "summary": summary, "documents": len(docs)}
+
+
+async def run_audits(queries: List[str], max_concurrency: int = AUDIT_MAX_CONCURRENCY) -> List[Dict]:
+    """
+    Run many audits concurrently, at most `max_concurrency` at a time.
+    Results come back in input order; a failed audit is reported, not raised.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded(query: str) -> Dict:
+        async with semaphore:
+            try:
+                return await arun_audit(query)
+            except Exception as e:
+                print(f"❌ Audit failed for {query!r}: {e}")
+                return {"query": query, "error": str(e)}
+
+    return await asyncio.gather(*(bounded(q) for q in queries))
+
+
 if __name__ == "__main__":
-    query = input("Enter your audit query: ")
-    run_audit(query)
+    if len(sys.argv) > 1:
+        # python main.py queries.txt → one audit per non-empty line, run concurrently
+        with open(sys.argv[1], encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        for result in asyncio.run(run_audits(queries)):
+            print("\n========================\n" + result["query"])
+            print(result.get("summary") or result.get("error"))
+    else:
+        query = input("Enter your audit query: ")
+        run_audit(query)
 
 
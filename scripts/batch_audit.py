@@ -0,0 +1,47 @@
+# scripts/batch_audit.py
+"""
+Run a file of audit queries against the current index and write JSONL results.
+
+    python scripts/batch_audit.py --queries standard_questions.txt --out outputs/audit_results.jsonl
+
+One query per line (or JSON lines with "query" and an optional "id").
+Queries are embedded and searched in batches; analyst and synthesiser calls
+run concurrently. Results are appended as they finish, so rerunning the same
+command after a crash or a rate-limit abort picks up where it stopped.
+"""
+import argparse, asyncio, pathlib, sys
+from tqdm import tqdm
+
+# Allow `python scripts/batch_audit.py` from the repo root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from utils.batch_audit import AUDIT_MAX_CONCURRENCY, AUDIT_SEARCH_BATCH, TOP_K, iter_queries, run_batch_audit
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", required=True, help="Text file, one query per line (or JSONL with 'query')")
+    ap.add_argument("--out", default="outputs/audit_results.jsonl", help="Per-query results (also the checkpoint)")
+    ap.add_argument("--k", type=int, default=TOP_K, help="Chunks retrieved per query, ranked as in the app (prefilter, BM25 fusion, reranker)")
+    ap.add_argument("--max-concurrency", type=int, default=AUDIT_MAX_CONCURRENCY,
+                    help="Queries in the analyst / synthesiser stage at once")
+    ap.add_argument("--search-batch", type=int, default=AUDIT_SEARCH_BATCH,
+                    help="Queries embedded and searched together")
+    args = ap.parse_args()
+
+    from agents.analyst import aanalyst_agent
+    from agents.synthesiser import asynthesiser_agent
+    from utils.index_registry import get_vectorstore
+
+    progress = tqdm(desc="Auditing", unit="query")
+    counts = asyncio.run(run_batch_audit(
+        iter_queries(args.queries), args.out, get_vectorstore(), aanalyst_agent, asynthesiser_agent,
+        k=args.k, max_concurrency=args.max_concurrency, search_batch=args.search_batch,
+        on_result=lambda _: progress.update(),
+    ))
+    progress.close()
+    print(f"Audited {counts['done']}, failed {counts['failed']}, already done {counts['skipped']}")
+    print(f"✅ Results → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
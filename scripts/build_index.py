@@ -1,19 +1,28 @@
 # scripts/build_index.py
 # scripts/build_index.py
-import argparse, os, pathlib
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+import argparse, os, pathlib, sys
+from tqdm import tqdm
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
-def load_docs(src_paths):
-    docs=[]
-    for p in src_paths:
-        if p.lower().endswith(".pdf"):
-            docs.extend(PyPDFLoader(p).load())
-        else:
-            docs.extend(TextLoader(p, encoding="utf-8").load())
-    return docs
+# Allow `python scripts/build_index.py` from the repo root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from utils.embedding_backends import (
+    DEFAULT_MODELS, EMBEDDING_BACKEND, EMBEDDING_BACKENDS, EMBEDDING_THREADS, make_embeddings,
+)
+from utils.embedding_cache import EMBEDDING_CACHE_PATH, CachedEmbeddings, EmbeddingCache
+from utils.embedding_executor import EMBED_MAX_BATCH_TOKENS, EMBED_MAX_IN_FLIGHT, ConcurrentEmbeddings
+from utils.faiss_index import (
+    DEFAULT_PARAMS, FAISS_INDEX_PARAMS, FAISS_INDEX_TYPE, INDEX_TYPES, index_spec, supports_delete,
+)
+from utils.index_manifest import (
+    MANIFEST_FILE, chunk_id, chunk_ids_for, file_entry, fingerprint_file, load_manifest, plan_update, source_key,
+)
+from utils.ingest import build_vectorstore_streaming, iter_chunks, iter_pdf_pages
+from utils.parallel_loader import LOADER_WORKERS, PAGES_PER_TASK
+from utils.tagger import default_tagger
+from utils.token_accounting import annotate_token_counts
+from utils.vectorstore import resolve_index_dir, save_index
 
 def main():
     ap = argparse.ArgumentParser()
@@ -21,18 +30,138 @@ def main():
     ap.add_argument("--out", default="vectorstore_index", help="Output dir")
     ap.add_argument("--chunk", type=int, default=1200)
     ap.add_argument("--overlap", type=int, default=200)
-    ap.add_argument("--embedding-model", default="text-embedding-3-small")
+    ap.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND,
+                    help="openai = API embeddings; local = sentence-transformers on CPU")
+    ap.add_argument("--embedding-model", help="Default: the backend's configured model")
+    ap.add_argument("--threads", type=int, default=EMBEDDING_THREADS,
+                    help="CPU threads for the local backend")
+    ap.add_argument("--embedding-cache", default=EMBEDDING_CACHE_PATH,
+                    help="SQLite embedding cache reused across builds")
+    ap.add_argument("--no-cache", action="store_true", help="Embed every chunk from scratch")
+    ap.add_argument("--workers", type=int, default=LOADER_WORKERS,
+                    help="Processes used to parse PDFs (1 = sequential)")
+    ap.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK,
+                    help="Pages per parsing task, so large PDFs are split across workers")
+    ap.add_argument("--batch-size", type=int, default=512,
+                    help="Chunks per streaming window; each window is embedded as concurrent requests")
+    ap.add_argument("--max-pending-batches", type=int, default=2,
+                    help="Windows buffered ahead of the embedder (bounds memory)")
+    ap.add_argument("--max-in-flight", type=int, default=EMBED_MAX_IN_FLIGHT,
+                    help="Concurrent embedding requests")
+    ap.add_argument("--max-batch-tokens", type=int, default=EMBED_MAX_BATCH_TOKENS,
+                    help="Token budget per embedding request")
+    ap.add_argument("--index-type", choices=INDEX_TYPES, default=FAISS_INDEX_TYPE,
+                    help="flat = exact search; hnsw / ivf = approximate, flat latency as the corpus grows")
+    ap.add_argument("--hnsw-m", type=int, help="HNSW graph degree M")
+    ap.add_argument("--ef-construction", type=int, help="HNSW efConstruction")
+    ap.add_argument("--ef-search", type=int, help="HNSW efSearch (recorded, applied at query time)")
+    ap.add_argument("--nlist", type=int, help="IVF centroids")
+    ap.add_argument("--nprobe", type=int, help="IVF lists probed per query (recorded, applied at query time)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Only re-embed new/changed sources and drop chunks of removed ones")
     args = ap.parse_args()
 
     os.makedirs(args.out, exist_ok=True)
-    docs = load_docs(args.src)
     splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk, chunk_overlap=args.overlap)
-    chunks = splitter.split_documents(docs)
+    overrides = {"M": args.hnsw_m, "efConstruction": args.ef_construction, "efSearch": args.ef_search,
+                 "nlist": args.nlist, "nprobe": args.nprobe}
+    spec = index_spec(args.index_type, **{**FAISS_INDEX_PARAMS, **overrides})
+    spec = {k: v for k, v in spec.items() if k == "type" or k in DEFAULT_PARAMS[args.index_type]}
+    args.embedding_model = args.embedding_model or DEFAULT_MODELS[args.embedding_backend]
+    params = {"embedding_backend": args.embedding_backend, "embedding_model": args.embedding_model,
+              "chunk": args.chunk, "overlap": args.overlap, "index": spec}
 
-    embeddings = OpenAIEmbeddings(model=args.embedding_model)
-    vs = FAISS.from_documents(chunks, embeddings)
-    vs.save_local(args.out)
-    print(f"✅ Built index with {len(chunks)} chunks → {args.out}")
+    if args.embedding_backend == "openai":
+        # Retries are left to the executor: it backs off on 429s across all threads
+        # and retries 5xx / timeouts / connection errors per batch
+        executor = ConcurrentEmbeddings(make_embeddings("openai", args.embedding_model, max_retries=0),
+                                        max_in_flight=args.max_in_flight, max_batch_tokens=args.max_batch_tokens)
+        embeddings = executor
+        # The store itself queries through a normally configured client
+        store_embeddings = make_embeddings("openai", args.embedding_model)
+    else:
+        # Local models batch by length themselves; no rate limits to manage
+        executor = None
+        embeddings = store_embeddings = make_embeddings(args.embedding_backend, args.embedding_model,
+                                                        threads=args.threads)
+    cache = None if args.no_cache else EmbeddingCache(args.embedding_cache)
+    if cache:
+        embeddings = CachedEmbeddings(embeddings, cache, args.embedding_model)
+
+    index_dir = resolve_index_dir(args.out)
+    manifest = load_manifest(index_dir) if args.incremental else {}
+    if args.incremental and (
+        manifest.get("params") != params or not os.path.exists(os.path.join(index_dir, "index.faiss"))
+    ):
+        print("ℹ️  No compatible manifest in --out; doing a full build.")
+        manifest = {}
+    plan = plan_update(manifest, args.src)
+    if manifest and plan.stale_ids(manifest) and not supports_delete(spec):
+        print(f"ℹ️  {spec['type']} indexes can't delete vectors safely; doing a full build.")
+        manifest = {}
+        plan = plan_update(manifest, args.src)
+    if manifest and plan.is_noop:
+        print(f"✅ Index in {args.out} is up to date ({len(plan.unchanged)} sources unchanged).")
+        return
+
+    vs = None
+    files = {}
+    if manifest:
+        vs = FAISS.load_local(index_dir, store_embeddings, allow_dangerous_deserialization=True)
+        stale = plan.stale_ids(manifest)
+        if stale:
+            vs.delete(stale)
+        for key in plan.unchanged:
+            old = manifest["files"][key]
+            files[key] = file_entry(key, old["chunk_ids"], sha256=old["sha256"])
+        print(f"Incremental: {len(plan.added)} added, {len(plan.changed)} changed, "
+              f"{len(plan.removed)} removed, {len(plan.unchanged)} unchanged; "
+              f"dropped {len(stale)} stale chunks")
+
+    # Stream page → chunk → embedding batch → index; each chunk gets a stable ID
+    # so the manifest can trace it back to its source file
+    given = {source_key(p): p for p in args.src}
+    to_load = plan.added + plan.changed
+    shas = {key: fingerprint_file(key) for key in to_load}
+    counts = {key: 0 for key in to_load}
+    tagger = default_tagger()
+
+    def tagged_chunks():
+        # PDFs are parsed with pypdf (same output as PyPDFLoader); other files via TextLoader
+        pages = iter_pdf_pages([given[key] for key in to_load], backend="pypdf",
+                               workers=args.workers, pages_per_task=args.pages_per_task)
+        def split_page(page):
+            # token counts are stored with each chunk, so budget checks never re-encode them
+            chunks = splitter.split_documents(page)
+            annotate_token_counts(chunks)
+            return chunks
+
+        for chunk in iter_chunks(pages, split_page):
+            key = source_key(chunk.metadata["source"])
+            chunk.metadata["chunk_id"] = chunk_id(key, shas[key], counts[key])
+            chunk.metadata["tags"] = tagger.tag(chunk.page_content)
+            counts[key] += 1
+            yield chunk
+
+    progress = tqdm(desc="Embedding chunks", unit="chunk")
+    vs = build_vectorstore_streaming(tagged_chunks(), embeddings, batch_size=args.batch_size,
+                                     max_pending_batches=args.max_pending_batches, store=vs,
+                                     on_batch=progress.update, spec=spec,
+                                     store_embeddings=store_embeddings)
+    progress.close()
+    for key in to_load:
+        files[key] = file_entry(key, chunk_ids_for(key, shas[key], counts[key]), sha256=shas[key])
+
+    if vs is None:
+        raise SystemExit("No chunks were produced from --src; nothing to index.")
+    if executor:
+        print(executor.report())
+    if cache:
+        print(cache.report())
+    version = save_index(vs, args.out, meta=params, sidecars={
+        MANIFEST_FILE: {"params": params, "files": files},
+    })
+    print(f"✅ Built index with {vs.index.ntotal} chunks ({sum(counts.values())} newly embedded) → {args.out} (version {version})")
 
 if __name__ == "__main__":
     main()
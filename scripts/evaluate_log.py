@@ -0,0 +1,50 @@
+# scripts/evaluate_log.py
+"""
+Batch-score logged interactions (e.g. chat_log.jsonl) with the GPT evaluator.
+
+    python scripts/evaluate_log.py --input chat_log.jsonl --out outputs/eval_results.jsonl
+
+Items are scored concurrently under an adaptive in-flight limit. Results are
+appended to --out as they finish, so rerunning the same command after a crash
+resumes where it stopped. A summary of the metric distributions is written
+to --summary.
+"""
+import argparse, json, pathlib, sys
+from tqdm import tqdm
+
+# Allow `python scripts/evaluate_log.py` from the repo root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from utils.batch_eval import EVAL_BATCH_MAX_IN_FLIGHT, BatchEvaluator, iter_log, summarise
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", default="chat_log.jsonl", help="JSONL with question / answer / sources per line")
+    ap.add_argument("--out", default="outputs/eval_results.jsonl", help="Per-item results (also the checkpoint)")
+    ap.add_argument("--summary", help="Aggregate metrics JSON (default: <out>.summary.json)")
+    ap.add_argument("--max-in-flight", type=int, default=EVAL_BATCH_MAX_IN_FLIGHT,
+                    help="Upper bound on concurrent scorer calls; halved on rate limits")
+    ap.add_argument("--max-retries", type=int, default=6)
+    args = ap.parse_args()
+
+    from utils.score_responses import score_response_gpt
+
+    evaluator = BatchEvaluator(score_response_gpt, max_in_flight=args.max_in_flight, max_retries=args.max_retries)
+    progress = tqdm(desc="Scoring", unit="item")
+    counts = evaluator.run(iter_log(args.input), args.out, on_result=lambda _: progress.update())
+    progress.close()
+    print(f"Scored {counts['done']}, failed {counts['failed']}, already done {counts['skipped']}")
+    print(evaluator.report())
+
+    summary = summarise(args.out)
+    summary_path = args.summary or str(pathlib.Path(args.out).with_suffix(".summary.json"))
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    for metric, stats in summary["metrics"].items():
+        print(f"{metric:>13}: mean {stats['mean']:.3f}  p10 {stats['p10']:.2f}  p50 {stats['p50']:.2f}  "
+              f"p90 {stats['p90']:.2f}  (n={stats['count']})")
+    print(f"✅ Summary → {summary_path}")
+
+
+if __name__ == "__main__":
+    main()
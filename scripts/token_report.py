@@ -0,0 +1,39 @@
+# scripts/token_report.py
+"""
+Token statistics for a saved index, written as JSON.
+
+    python scripts/token_report.py --index vectorstore_index --out outputs/token_report.json
+
+Reports per-source token histograms and percentiles, and lists the chunks
+over --oversize tokens. Counts recorded at indexing time are reused; older
+indexes are encoded in one multi-threaded batch.
+"""
+import argparse, os, pathlib, pickle, sys
+
+# Allow `python scripts/token_report.py` from the repo root
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from utils.token_accounting import CHUNK_OVERSIZE_TOKENS, corpus_report, format_report, write_report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index", default="vectorstore_index", help="Index dir (index.faiss / index.pkl)")
+    ap.add_argument("--out", default="outputs/token_report.json")
+    ap.add_argument("--oversize", type=int, default=CHUNK_OVERSIZE_TOKENS, help="Flag chunks above this many tokens")
+    ap.add_argument("--bins", type=int, default=10, help="Histogram bins")
+    args = ap.parse_args()
+
+    # Only the docstore is needed, so skip loading the FAISS index and the embedder.
+    # The pickle is our own index output (same trust as allow_dangerous_deserialization).
+    with open(os.path.join(args.index, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    docs = [docstore.search(doc_id) for doc_id in index_to_docstore_id.values()]
+
+    report = corpus_report(docs, oversize_tokens=args.oversize, bins=args.bins)
+    write_report(report, args.out)
+    print(format_report(report))
+    print(f"✅ Report → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
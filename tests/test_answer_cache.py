@@ -0,0 +1,53 @@
+# tests/test_answer_cache.py
+
+from langchain_core.embeddings import Embeddings
+
+from utils.answer_cache import SemanticAnswerCache
+
+VECTORS = {
+    "top 3 risks in the report": [1.0, 0.0, 0.0],
+    "what are the three biggest risks?": [0.96, 0.28, 0.0],
+    "how did FDI to Africa change?": [0.0, 0.0, 1.0],
+    "what are the tariff risks on page 5?": [0.0, 1.0, 0.0],
+    "what are the tariff risks on page 6?": [0.0, 0.99, 0.14],
+}
+
+
+class TableEmbedding(Embeddings):
+    def embed_documents(self, texts):
+        return [VECTORS[t] for t in texts]
+
+    def embed_query(self, text):
+        return VECTORS[text]
+
+
+def test_near_duplicate_question_hits_within_the_same_index_version():
+    cache = SemanticAnswerCache(TableEmbedding(), threshold=0.9)
+    assert cache.lookup("top 3 risks in the report", "v1") is None
+    cache.store("top 3 risks in the report", "v1", {"answer": "A", "sources": [], "scores": {}})
+
+    hit = cache.lookup("what are the three biggest risks?", "v1")
+    assert hit["answer"] == "A" and hit["cached_question"] == "top 3 risks in the report"
+    assert hit["similarity"] >= 0.9
+    assert cache.lookup("how did FDI to Africa change?", "v1") is None
+
+    # a rebuilt index invalidates the cached answers
+    assert cache.lookup("top 3 risks in the report", "v2") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_eviction_keeps_recently_hit_answers():
+    cache = SemanticAnswerCache(TableEmbedding(), threshold=0.99, max_size=2)
+    cache.store("top 3 risks in the report", "v1", {"answer": "risks"})
+    cache.store("how did FDI to Africa change?", "v1", {"answer": "fdi"})
+    assert cache.lookup("top 3 risks in the report", "v1")["answer"] == "risks"
+    cache.store("what are the three biggest risks?", "v1", {"answer": "three"})  # evicts the FDI answer
+    assert cache.lookup("how did FDI to Africa change?", "v1") is None
+    assert cache.lookup("top 3 risks in the report", "v1")["answer"] == "risks"
+
+
+def test_questions_with_different_page_constraints_never_share_an_answer():
+    cache = SemanticAnswerCache(TableEmbedding(), threshold=0.9)
+    cache.store("what are the tariff risks on page 5?", "v1", {"answer": "page 5"})
+    assert cache.lookup("what are the tariff risks on page 6?", "v1") is None  # cosine ≈ 0.99
+    assert cache.lookup("what are the tariff risks on page 5?", "v1")["answer"] == "page 5"
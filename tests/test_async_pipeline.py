@@ -0,0 +1,53 @@
+# tests/test_async_pipeline.py
+
+import asyncio
+import importlib
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from utils.query_cache import CachedQueryEmbeddings
+
+
+def _main(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")  # agents build their clients at import time
+    return importlib.import_module("main")
+
+
+def test_run_audits_bounds_concurrency_and_keeps_order(monkeypatch):
+    main = _main(monkeypatch)
+    active, peak = 0, 0
+
+    async def retrieve(query):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        if query == "q3":
+            raise RuntimeError("store unavailable")
+        return [query]
+
+    async def analyse(input_documents, query):
+        await asyncio.sleep(0)
+        return f"answer {query}"
+
+    async def synthesise(answer, docs):
+        return f"summary of {answer}"
+
+    monkeypatch.setattr(main, "aretriever_agent", retrieve)
+    monkeypatch.setattr(main, "aanalyst_agent", analyse)
+    monkeypatch.setattr(main, "asynthesiser_agent", synthesise)
+
+    queries = [f"q{i}" for i in range(10)]
+    results = asyncio.run(main.run_audits(queries, max_concurrency=3))
+    assert peak == 3
+    assert [r["query"] for r in results] == queries
+    assert results[0] == {"query": "q0", "answer": "answer q0", "summary": "summary of answer q0", "documents": 1}
+    assert results[3] == {"query": "q3", "error": "store unavailable"}
+
+
+def test_async_query_embedding_shares_the_cache():
+    cache = CachedQueryEmbeddings(DeterministicFakeEmbedding(size=8))
+    vector = asyncio.run(cache.aembed_query("Tariff risk"))
+    assert cache.embed_query("Tariff  risk") == vector
+    assert cache.stats()["misses"] == 1 and cache.stats()["hits"] == 1
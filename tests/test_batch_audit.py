@@ -0,0 +1,77 @@
+# tests/test_batch_audit.py
+
+import asyncio
+import json
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from utils.batch_audit import batch_search, iter_queries, run_batch_audit
+from utils.bm25 import BM25Index
+from utils.metadata_index import MetadataIndex
+from utils.query_cache import CachedQueryEmbeddings
+from utils.vectorstore import rank_candidates
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    batches: list = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        return super().embed_documents(texts)
+
+
+def _store():
+    texts = [f"report section {i} on tariff and currency risk" for i in range(30)]
+    store = FAISS.from_texts(texts, DeterministicFakeEmbedding(size=16),
+                             metadatas=[{"source": "wir2024.pdf", "page": i} for i in range(30)])
+    store.embedding_function = CachedQueryEmbeddings(CountingEmbedding(size=16))
+    return store
+
+
+def test_matrix_search_matches_the_retrieval_pipeline_with_one_embedding_call():
+    store = _store()
+    queries = ["tariff risk", "currency risk", "tariff risk", "FDI outlook"]
+    results = batch_search(store, queries, k=3)
+    assert store.embedding_function.embeddings.batches == [3]  # the repeat is embedded once
+    for query, docs in zip(queries, results):
+        assert docs == rank_candidates(store, query, k=3)[0]
+
+
+def test_batch_search_applies_the_prefilter_and_bm25_fusion():
+    store = _store()
+    for doc_id in store.index_to_docstore_id.values():  # as load_vectorstore does
+        store.docstore.search(doc_id).metadata["chunk_id"] = doc_id
+    store.bm25 = BM25Index.from_store(store)
+    store.metadata_index = MetadataIndex.from_store(store)
+    [filtered, fused] = batch_search(store, ["currency risk on page 5", "tariff risk"], k=3)
+    assert [d.metadata["page"] for d in filtered] == [4]  # page 5 is 0-based page 4
+    assert fused == rank_candidates(store, "tariff risk", k=3)[0]
+
+
+def test_batch_audit_writes_results_and_resumes(tmp_path):
+    queries, out = tmp_path / "queries.txt", tmp_path / "results.jsonl"
+    queries.write_text("# standard questions\n" + "\n".join(f"question {i}" for i in range(7))
+                       + '\n{"id": "custom", "query": "question 99"}\n', encoding="utf-8")
+    store, fail = _store(), {"question 3"}
+
+    async def analyse(input_documents, query):
+        if query in fail:
+            raise RuntimeError("rate limited")
+        return f"answer to {query}"
+
+    async def synthesise(answer, docs):
+        return f"summary of {answer}"
+
+    run = lambda: asyncio.run(run_batch_audit(iter_queries(str(queries)), str(out), store, analyse, synthesise,
+                                              k=2, max_concurrency=2, search_batch=3))
+    assert run() == {"done": 7, "failed": 1, "skipped": 0}
+
+    results = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    custom = next(r for r in results if r["id"] == "custom")
+    assert custom["summary"] == "summary of answer to question 99"
+    assert len(custom["citations"]) == 2 and custom["citations"][0]["source"] == "wir2024.pdf"
+    assert set(custom["timings"]) == {"retrieve", "analyse", "synthesise", "total"}
+
+    fail.clear()
+    assert run() == {"done": 1, "failed": 0, "skipped": 7}
@@ -0,0 +1,77 @@
+# tests/test_batch_eval.py
+
+import json
+import threading
+
+from utils.batch_eval import AdaptiveLimiter, BatchEvaluator, iter_log, summarise
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    class response:
+        status_code = 429
+        headers = {"retry-after": "0"}
+
+
+def _write_log(path, n):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"question": f"q{i}", "answer": f"a{i}", "sources": []}) + "\n")
+        f.write("not json\n")
+
+
+def test_concurrent_run_resumes_from_checkpoint_and_summarises(tmp_path):
+    log, out = tmp_path / "chat_log.jsonl", tmp_path / "results.jsonl"
+    _write_log(log, 20)
+    lock, seen = threading.Lock(), []
+
+    def flaky(question, answer, sources):
+        with lock:
+            seen.append(question)
+        if question in ("q3", "q4"):
+            raise ValueError("unparseable")  # not transient: recorded as failed
+        return {"relevance": 1.0, "completeness": 0.5, "faithfulness": int(question[1:]) / 20}
+
+    counts = BatchEvaluator(flaky, max_in_flight=4).run(iter_log(str(log)), str(out))
+    assert counts == {"done": 18, "failed": 2, "skipped": 0}
+
+    # simulate a crash mid-write, then resume: only the failures are retried
+    with open(out, "a", encoding="utf-8") as f:
+        f.write('{"id": "line-1", "sta')
+    seen.clear()
+    counts = BatchEvaluator(lambda q, a, s: {"relevance": 0.0, "completeness": 0.0, "faithfulness": 0.0},
+                            max_in_flight=4).run(iter_log(str(log)), str(out))
+    assert counts == {"done": 2, "failed": 0, "skipped": 18}
+
+    summary = summarise(str(out))
+    assert summary["results"] == 20 and summary["failed"] == 0
+    assert summary["metrics"]["completeness"]["count"] == 20
+    assert sum(summary["metrics"]["relevance"]["histogram"]) == 20
+
+
+def test_rate_limits_halve_concurrency_and_are_retried(tmp_path):
+    log, out = tmp_path / "chat_log.jsonl", tmp_path / "results.jsonl"
+    _write_log(log, 6)
+    failures = {"q0": 2, "q1": 1}
+    lock = threading.Lock()
+
+    def limited(question, answer, sources):
+        with lock:
+            if failures.get(question, 0):
+                failures[question] -= 1
+                raise RateLimited()
+        return {"relevance": 1, "completeness": 1, "faithfulness": 1}
+
+    evaluator = BatchEvaluator(limited, max_in_flight=8, base_delay=0.01, max_delay=0.02)
+    assert evaluator.run(iter_log(str(log)), str(out))["done"] == 6
+    assert evaluator.rate_limits == 3 and evaluator.limiter.limit < 8
+
+
+def test_limiter_additive_increase_is_capped():
+    limiter = AdaptiveLimiter(4)
+    limiter.on_rate_limit(0)
+    assert limiter.limit == 2
+    for _ in range(20):
+        limiter.on_success()
+    assert limiter.limit == 4
@@ -0,0 +1,45 @@
+# tests/test_context_packer.py
+
+from langchain_core.documents import Document
+
+from utils.context_packer import merge_overlapping, pack_context
+
+PAGE = ("Global FDI fell by 2 per cent to $1.3 trillion in 2023. Project finance deals declined sharply as "
+        "financing conditions tightened. Greenfield announcements in manufacturing rose in Asia, while "
+        "investment in sustainable development sectors in developing countries remained weak.")
+
+
+def words(text):
+    return len(text.split())
+
+
+def _doc(text, page=4, source="wir2024.pdf"):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def test_merge_overlapping_joins_on_the_shared_text_in_either_order():
+    a, b = PAGE[:150], PAGE[110:]
+    assert merge_overlapping(a, b) == PAGE
+    assert merge_overlapping(b, a) == PAGE
+    assert merge_overlapping(PAGE, PAGE[20:90]) == PAGE
+    assert merge_overlapping(PAGE[:60], PAGE[100:]) is None
+
+
+def test_pack_merges_neighbours_drops_near_duplicates_and_keeps_rank_order():
+    docs = [
+        _doc(PAGE[110:]),                                      # rank 0 (second half of the page)
+        _doc("Tariff escalation raises supply chain risk for exporters in the region.", page=9),
+        _doc(PAGE[:150]),                                      # overlaps rank 0 → merged
+        _doc("Tariff escalation raises supply chain risk for exporters in the region!", page=2),  # near-dup
+    ]
+    packed = pack_context(docs, max_tokens=1000, count_tokens=words)
+    assert [d.page_content for d in packed] == [PAGE, docs[1].page_content]
+    assert packed[0].metadata == {"source": "wir2024.pdf", "page": 4, "merged_chunks": 2}
+    assert docs[0].metadata == {"source": "wir2024.pdf", "page": 4}  # inputs untouched
+
+
+def test_pack_respects_the_token_budget_but_fills_with_smaller_passages():
+    docs = [_doc("alpha " * 50, page=1), _doc("beta " * 80, page=2), _doc("gamma " * 20, page=3)]
+    packed = pack_context(docs, max_tokens=75, count_tokens=words)
+    assert [d.metadata["page"] for d in packed] == [1, 3]
+    assert sum(words(d.page_content) for d in packed) <= 75
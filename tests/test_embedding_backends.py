@@ -0,0 +1,104 @@
+# tests/test_embedding_backends.py
+
+import sys
+import types
+
+import numpy as np
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from utils import query_cache
+from utils.embedding_backends import LocalEmbeddings, embeddings_for_index, make_embeddings, plan_length_batches
+from utils.vectorstore import load_vectorstore, read_index_meta, save_index
+
+
+class FakeSentenceTransformer:
+    calls = []
+    instances = 0
+
+    def __init__(self, name, device="cpu"):
+        FakeSentenceTransformer.instances += 1
+        self.name, self.max_seq_length = name, 256
+        self._fake = DeterministicFakeEmbedding(size=8)
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts, batch_size, normalize_embeddings, convert_to_numpy, show_progress_bar):
+        self.calls.append(len(texts))
+        x = np.asarray(self._fake.embed_documents(texts), dtype=np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True) if normalize_embeddings else x
+
+
+@pytest.fixture
+def fake_st(monkeypatch):
+    FakeSentenceTransformer.calls = []
+    monkeypatch.setitem(sys.modules, "sentence_transformers",
+                        types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer))
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(set_num_threads=lambda n: None))
+
+
+def test_length_batches_bound_padded_tokens():
+    lengths = [100, 5, 6, 90, 7, 8]
+    batches = plan_length_batches(lengths, max_batch_tokens=200, max_batch_size=3)
+    assert sorted(i for b in batches for i in b) == list(range(6))
+    assert batches[0] == [1, 2, 4]  # shortest first, capped at max_batch_size
+    assert all(len(b) * max(lengths[i] for i in b) <= 200 for b in batches)
+
+
+def test_local_backend_keeps_input_order_and_normalises(fake_st):
+    emb = LocalEmbeddings("fake-minilm", threads=None, max_batch_tokens=64, max_batch_size=4)
+    texts = ["x" * n for n in (400, 10, 200, 30, 20)]
+    vectors = np.asarray(emb.embed_documents(texts))
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.allclose(vectors[2], emb.embed_query(texts[2]))
+    assert len(FakeSentenceTransformer.calls) > 2  # split into length buckets
+    with pytest.raises(ValueError):
+        make_embeddings("cohere")
+
+
+def test_load_vectorstore_uses_the_recorded_backend(fake_st, tmp_path, monkeypatch):
+    # keep the fake embedder out of the process-wide query caches and the on-disk tier
+    monkeypatch.setattr(query_cache, "_shared", {})
+    monkeypatch.setattr("utils.vectorstore.shared_query_embeddings",
+                        lambda key, factory: query_cache.shared_query_embeddings(key, factory, disk_path=None))
+    store = FAISS.from_texts(["tariff risk", "FDI trends"], LocalEmbeddings("fake-minilm", threads=None))
+    save_index(store, str(tmp_path), meta={"embedding_backend": "local", "embedding_model": "fake-minilm"})
+    assert read_index_meta(str(tmp_path))["embedding_dim"] == 8
+
+    loaded = load_vectorstore(str(tmp_path))
+    assert isinstance(loaded.embedding_function.embeddings, LocalEmbeddings)
+    assert loaded.similarity_search("tariff risk", k=1)[0].page_content == "tariff risk"
+
+    # a reload reuses the shared embedder instead of loading the model again
+    built = FakeSentenceTransformer.instances
+    assert load_vectorstore(str(tmp_path)).embedding_function is loaded.embedding_function
+    assert FakeSentenceTransformer.instances == built
+
+    with pytest.raises(ValueError):
+        embeddings_for_index({"embedding_backend": "local", "embedding_model": "fake-minilm", "embedding_dim": 384})
+
+
+def test_indexes_without_a_recorded_backend_load_with_their_openai_model(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert embeddings_for_index({"embedding_model": "text-embedding-3-large"}).model == "text-embedding-3-large"
+
+
+def test_openai_builds_keep_retries_on_the_stores_embedder(monkeypatch):
+    from utils import vectorstore
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(vectorstore, "EMBEDDING_BACKEND", "openai")
+    model, executor, _, _ = vectorstore._make_embedder(cache_path=None)
+    assert executor.embeddings.max_retries == 0  # the executor retries itself
+    assert model.max_retries > 0 and model is not executor.embeddings
+
+
+def test_streaming_build_queries_with_the_store_embeddings():
+    from utils.ingest import build_vectorstore_streaming
+    from langchain_core.documents import Document
+
+    build_only, plain = DeterministicFakeEmbedding(size=8), DeterministicFakeEmbedding(size=8)
+    store = build_vectorstore_streaming([Document(page_content="a")], build_only, store_embeddings=plain)
+    assert store.embedding_function is plain
@@ -0,0 +1,38 @@
+# tests/test_embedding_cache.py
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+
+from utils.embedding_cache import CachedEmbeddings, EmbeddingCache, cache_key
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    calls: list = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return super().embed_documents(texts)
+
+
+def test_cached_embeddings_only_embed_misses(tmp_path):
+    inner = CountingEmbeddings(size=8, calls=[])
+    cache = EmbeddingCache(str(tmp_path / "emb.sqlite"))
+    embedder = CachedEmbeddings(inner, cache, "fake-model")
+
+    first = embedder.embed_documents(["geopolitical risk", "financing risk", "geopolitical risk"])
+    assert inner.calls == [["geopolitical risk", "financing risk"]]
+    assert first[0] == first[2]
+
+    second = embedder.embed_documents(["geopolitical  risk\n", "new chunk"])
+    assert inner.calls[-1] == ["new chunk"]  # whitespace-only change is a hit
+    assert second[0] == first[0]
+    assert cache.hits == 1 and cache.misses == 3
+    assert cache.bytes_written == 3 * 8 * 4
+
+
+def test_cache_persists_and_is_scoped_by_model(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    CachedEmbeddings(CountingEmbeddings(size=4, calls=[]), EmbeddingCache(path), "model-a").embed_documents(["x"])
+
+    reopened = EmbeddingCache(path)
+    assert cache_key("model-a", "x") in reopened.get_many([cache_key("model-a", "x")])
+    assert reopened.get_many([cache_key("model-b", "x")]) == {}
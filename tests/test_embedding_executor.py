@@ -0,0 +1,122 @@
+# tests/test_embedding_executor.py
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from langchain_openai import OpenAIEmbeddings
+
+from utils.embedding_executor import ConcurrentEmbeddings, plan_batches
+
+words = lambda text: len(text.split())
+
+
+class StubEmbeddingServer(ThreadingHTTPServer):
+    """OpenAI-compatible /v1/embeddings stub: vector = [len(text), index]."""
+
+    def __init__(self, fail_first=1, latency=0.05):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.fail_first = fail_first
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = [body["input"]] if isinstance(body["input"], str) else body["input"]
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            rate_limited = server.calls <= server.fail_first
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.latency)
+        with server.lock:
+            server.in_flight -= 1
+
+        if rate_limited:
+            payload, status = {"error": {"message": "Rate limit", "type": "rate_limit_error"}}, 429
+        else:
+            data = [
+                {"object": "embedding", "index": i, "embedding": [float(len(t)), float(i)]}
+                for i, t in enumerate(inputs)
+            ]
+            payload, status = {"object": "list", "data": data, "model": body["model"],
+                               "usage": {"prompt_tokens": 1, "total_tokens": 1}}, 200
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+@pytest.fixture
+def stub_server():
+    server = StubEmbeddingServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+def test_plan_batches_respects_token_and_size_limits():
+    texts = ["a b c", "d e", "f", "g h i j", "k"]
+    assert plan_batches(texts, words, max_batch_tokens=5) == [[0, 1], [2, 3], [4]]
+    assert plan_batches(texts, words, max_batch_tokens=100, max_batch_size=2) == [[0, 1], [2, 3], [4]]
+
+
+def test_concurrent_embeddings_keep_order_and_retry_429(stub_server):
+    client = OpenAIEmbeddings(
+        model="stub-model",
+        api_key="test",
+        base_url=f"http://127.0.0.1:{stub_server.server_port}/v1",
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+    executor = ConcurrentEmbeddings(client, max_in_flight=4, max_batch_tokens=8, base_delay=0.01,
+                                    count_tokens=words)
+    texts = [f"chunk number {i} " + "x" * i for i in range(40)]
+
+    vectors = executor.embed_documents(texts)
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert executor.retries == 1
+    assert executor.requests == 21  # 20 token-bounded batches + 1 retry
+    # OpenAIEmbeddings sends one HTTP request per text when ctx-length checks are off
+    assert stub_server.calls == 41
+    assert 1 < stub_server.max_in_flight <= 4
+    assert executor.chunks_per_sec > 0
+
+
+def test_transient_errors_are_retried_without_pausing_the_executor():
+    class Flaky:
+        calls = 0
+
+        def embed_documents(self, texts):
+            Flaky.calls += 1
+            if Flaky.calls == 1:
+                raise ConnectionError("connection reset by peer")
+            return [[float(len(t))] for t in texts]
+
+    executor = ConcurrentEmbeddings(Flaky(), max_in_flight=1, base_delay=0.01, count_tokens=words)
+    assert executor.embed_documents(["a b", "c"]) == [[3.0], [1.0]]
+    assert executor.retries == 1 and executor.rate_limits == 0
+
+    class Broken:
+        def embed_documents(self, texts):
+            raise ValueError("bad input")  # not transient: fails at once
+
+    with pytest.raises(ValueError):
+        ConcurrentEmbeddings(Broken(), base_delay=0.01, count_tokens=words).embed_documents(["a"])
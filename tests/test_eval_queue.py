@@ -0,0 +1,54 @@
+# tests/test_eval_queue.py
+
+import json
+import random
+import threading
+
+from utils.eval_queue import DONE, DROPPED, FAILED, PENDING, SKIPPED, EvaluationQueue
+
+SCORES = {"relevance": 0.9, "completeness": 0.8, "faithfulness": 1.0}
+
+
+def test_scores_in_background_and_logs_results(tmp_path):
+    log = tmp_path / "evals.jsonl"
+
+    def scorer(question, answer, sources):
+        if question == "boom":
+            raise RuntimeError("API down")
+        return SCORES
+
+    evaluator = EvaluationQueue(scorer, workers=2, log_path=str(log))
+    ok = evaluator.submit("What are the risks?", "Tariffs.", [])
+    bad = evaluator.submit("boom", "x", [])
+    evaluator.join()
+
+    assert evaluator.status(ok)["status"] == DONE and evaluator.status(ok)["scores"] == SCORES
+    assert evaluator.status(bad)["status"] == FAILED
+    records = {r["id"]: r for r in map(json.loads, log.read_text().splitlines())}
+    assert records[ok]["scores"] == SCORES and records[bad]["status"] == FAILED
+
+
+def test_overload_sheds_scoring_instead_of_blocking(tmp_path):
+    release = threading.Event()
+
+    def slow_scorer(question, answer, sources):
+        release.wait(5)
+        return SCORES
+
+    evaluator = EvaluationQueue(slow_scorer, workers=1, max_queue=4, sample_rate=1.0, overload_sample_rate=0.0,
+                                log_path=None, rng=random.Random(0))
+    ids = [evaluator.submit(f"q{i}", "a", []) for i in range(10)]
+    statuses = [evaluator.status(i)["status"] for i in ids]
+    # the first few are queued; once the queue is half full the rest are sampled out
+    assert statuses.count(PENDING) <= 4 and statuses.count(SKIPPED) >= 5
+    release.set()
+    evaluator.join()
+    assert all(evaluator.status(i)["status"] in (DONE, SKIPPED) for i in ids)
+
+    full = EvaluationQueue(slow_scorer, workers=1, max_queue=2, sample_rate=1.0, overload_sample_rate=1.0,
+                           log_path=None)
+    release.clear()
+    dropped = [full.submit(f"q{i}", "a", []) for i in range(6)]
+    assert any(full.status(i)["status"] == DROPPED for i in dropped)
+    release.set()
+    full.join()
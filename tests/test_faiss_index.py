@@ -0,0 +1,90 @@
+# tests/test_faiss_index.py
+
+import faiss
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.faiss_index import apply_search_params, index_spec, supports_delete, training_size
+from utils.ingest import build_vectorstore_streaming
+from utils.vectorstore import read_index_meta, resolve_index_dir, save_index
+
+
+def _chunks(n):
+    return [Document(page_content=f"chunk number {i} about supply chains", metadata={"chunk_id": f"c{i}"})
+            for i in range(n)]
+
+
+def test_hnsw_store_is_built_saved_and_reloaded_with_search_params(tmp_path):
+    emb = DeterministicFakeEmbedding(size=16)
+    spec = index_spec("hnsw", M=8, efSearch=40)
+    store = build_vectorstore_streaming(_chunks(30), emb, batch_size=7, spec=spec)
+    assert isinstance(store.index, faiss.IndexHNSWFlat) and store.index.ntotal == 30
+    assert not supports_delete(spec)
+
+    save_index(store, str(tmp_path))
+    meta = read_index_meta(str(tmp_path))
+    assert meta["index"] == {"type": "hnsw", "M": 8, "efConstruction": 80, "efSearch": 40}
+
+    loaded = FAISS.load_local(resolve_index_dir(str(tmp_path)), emb, allow_dangerous_deserialization=True)
+    loaded.index.hnsw.efSearch = 16  # efSearch isn't guaranteed to survive serialisation
+    apply_search_params(loaded.index, meta["index"])
+    assert loaded.index.hnsw.efSearch == 40
+    hit = loaded.similarity_search("chunk number 3 about supply chains", k=1)[0]
+    assert hit.metadata["chunk_id"] == "c3"
+
+
+def test_ivf_holds_back_batches_until_trained_and_clamps_nlist():
+    emb = DeterministicFakeEmbedding(size=16)
+    spec = index_spec("ivf", nlist=4, nprobe=8)
+    assert training_size(spec) == 4 * 39
+
+    added = []
+    store = build_vectorstore_streaming(_chunks(100), emb, batch_size=10, spec=spec, on_batch=added.append)
+    # corpus smaller than the training target: trained on all of it, nlist shrunk to fit
+    assert isinstance(store.index, faiss.IndexIVFFlat) and store.index.is_trained
+    assert store.index.nlist == 2 and store.index.nprobe == 2
+    assert sum(added) == store.index.ntotal == 100
+    assert set(store.index_to_docstore_id.values()) == {f"c{i}" for i in range(100)}
+
+
+def test_ivf_trains_on_a_sample_of_the_whole_stream(monkeypatch):
+    import numpy as np
+
+    import utils.ingest as ingest
+
+    emb = DeterministicFakeEmbedding(size=16)
+    trained_on = []
+    real_empty_store = ingest.empty_store
+    monkeypatch.setattr(ingest, "empty_store",
+                        lambda e, spec, dim, training=None: trained_on.append(training) or
+                        real_empty_store(e, spec, dim, training))
+
+    chunks = _chunks(400)
+    store = build_vectorstore_streaming(chunks, emb, batch_size=10, spec=index_spec("ivf", nlist=2))
+    assert store.index.ntotal == 400 and len(trained_on[0]) == 2 * 39
+
+    # not a prefix: the sample reaches into the second half of the corpus
+    late = np.asarray(emb.embed_documents([c.page_content for c in chunks[200:]]), dtype=np.float32)
+    assert any((late == row).all(axis=1).any() for row in trained_on[0])
+
+
+def test_only_flat_indexes_take_incremental_deletes():
+    emb = DeterministicFakeEmbedding(size=16)
+    assert supports_delete(index_spec("flat")) and not supports_delete(index_spec("ivf", nlist=2))
+
+    # flat: positions compact after remove_ids, so LangChain's renumbered mapping stays valid
+    store = build_vectorstore_streaming(_chunks(100), emb, batch_size=10)
+    store.delete([f"c{i}" for i in range(0, 100, 2)])
+    hit = store.similarity_search("chunk number 7 about supply chains", k=1)[0]
+    assert hit.metadata["chunk_id"] == "c7" and store.index.ntotal == 50
+
+    # IVF keeps the removed ids' gaps: the same delete leaves a broken mapping, hence the full rebuild
+    ivf = build_vectorstore_streaming(_chunks(100), emb, batch_size=10, spec=index_spec("ivf", nlist=2, nprobe=2))
+    ivf.delete([f"c{i}" for i in range(0, 100, 2)])
+    try:
+        hits = ivf.similarity_search("chunk number 7 about supply chains", k=5)
+        broken = any(int(h.metadata["chunk_id"][1:]) % 2 == 0 for h in hits)
+    except KeyError:
+        broken = True
+    assert broken
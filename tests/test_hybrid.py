@@ -0,0 +1,42 @@
+# tests/test_hybrid.py
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from utils.bm25 import BM25Index
+from utils.hybrid import fuse_with_bm25, reciprocal_rank_fusion
+from utils.vectorstore import resolve_index_dir, save_index
+
+TEXTS = {
+    "c1": "Geopolitical tensions weigh on investment in Asia.",
+    "c2": "Tighter financing conditions reduced project finance deals.",
+    "c3": "Cybersecurity incidents could harm operations.",
+    "c4": "Financing for renewable energy projects in Africa fell sharply; financing gaps widened.",
+}
+
+
+def test_bm25_ranks_by_term_evidence_only_over_postings():
+    bm25 = BM25Index.build(TEXTS.items())
+    hits = bm25.search("What happened to financing?", k=5)
+    assert [doc_id for doc_id, _ in hits] == ["c4", "c2"]
+    assert bm25.search("the of and", k=5) == []
+
+
+def test_reciprocal_rank_fusion_weights_lists():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], weights=[1.0, 1.0], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["b", "a", "c"]
+    sparse_heavy = reciprocal_rank_fusion([["a", "b"], ["c"]], weights=[0.1, 1.0])
+    assert sparse_heavy[0][0] == "c"
+
+
+def test_save_index_persists_bm25_and_fusion_pulls_in_sparse_hits(tmp_path):
+    store = FAISS.from_texts(list(TEXTS.values()), DeterministicFakeEmbedding(size=8),
+                             metadatas=[{"chunk_id": i} for i in TEXTS], ids=list(TEXTS))
+    save_index(store, str(tmp_path))
+    store.bm25 = BM25Index.load(resolve_index_dir(str(tmp_path)))
+    assert store.bm25.doc_ids == list(TEXTS)
+
+    dense = [store.docstore.search("c1"), store.docstore.search("c3")]
+    docs = fuse_with_bm25(store, "financing", dense, k=3)
+    # dense [c1, c3] and sparse [c4, c2] interleave; c4 is fetched from the docstore
+    assert [d.metadata["chunk_id"] for d in docs] == ["c1", "c4", "c3"]
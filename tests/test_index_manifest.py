@@ -0,0 +1,46 @@
+# tests/test_index_manifest.py
+
+from utils.index_manifest import chunk_ids_for, file_entry, plan_update, source_key
+
+
+def _manifest_for(*paths):
+    files = {}
+    for p in paths:
+        key = source_key(p)
+        entry = file_entry(p, [])
+        entry["chunk_ids"] = chunk_ids_for(key, entry["sha256"], 2)
+        files[key] = entry
+    return {"files": files}
+
+
+def test_plan_update_classifies_sources(tmp_path):
+    a, b, c, d = (tmp_path / n for n in ("a.txt", "b.txt", "c.txt", "d.txt"))
+    for p in (a, b, c):
+        p.write_text(f"contents of {p.name}")
+    manifest = _manifest_for(str(a), str(b), str(c))
+
+    b.write_text("b was edited")
+    d.write_text("a brand new report")
+    c.unlink()
+
+    plan = plan_update(manifest, [str(a), str(b), str(d)])
+
+    assert plan.unchanged == [source_key(str(a))]
+    assert plan.changed == [source_key(str(b))]
+    assert plan.added == [source_key(str(d))]
+    assert plan.removed == [source_key(str(c))]
+    assert len(plan.stale_ids(manifest)) == 4
+
+
+def test_touched_but_identical_file_is_unchanged(tmp_path):
+    a = tmp_path / "a.txt"
+    a.write_text("same")
+    manifest = _manifest_for(str(a))
+    manifest["files"][source_key(str(a))]["mtime_ns"] -= 10
+
+    assert plan_update(manifest, [str(a)]).is_noop
+
+
+def test_chunk_ids_are_deterministic_and_unique_per_source():
+    assert chunk_ids_for("/x/a.pdf", "f" * 64, 2) == chunk_ids_for("/x/a.pdf", "f" * 64, 2)
+    assert set(chunk_ids_for("/x/a.pdf", "f" * 64, 2)).isdisjoint(chunk_ids_for("/x/b.pdf", "f" * 64, 2))
@@ -0,0 +1,171 @@
+# tests/test_index_registry.py
+
+import os
+import threading
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from utils.index_registry import IndexRegistry, RegistryRetriever
+from utils.vectorstore import read_index_meta, resolve_index_dir, save_index
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+
+
+def _build(texts):
+    return FAISS.from_texts(texts, EMBEDDINGS)
+
+
+def _loader(path):
+    index_dir = resolve_index_dir(path)
+    store = FAISS.load_local(index_dir, EMBEDDINGS, allow_dangerous_deserialization=True)
+    store.index_meta = read_index_meta(index_dir)
+    return store
+
+
+def test_registry_loads_once_and_hot_swaps_new_version(tmp_path):
+    path = str(tmp_path / "index")
+    save_index(_build(["supply chain risk", "currency risk"]), path)
+
+    registry = IndexRegistry(loader=_loader, check_interval=0)
+    first = registry.get(path)
+    assert registry.get(path) is first
+    assert registry.loads == 1
+
+    save_index(_build(["supply chain risk", "currency risk", "cyber risk"]), path)
+    second = registry.get(path)
+
+    assert second is not first
+    assert second.index.ntotal == 3
+    assert first.index.ntotal == 2  # old handle stays usable for in-flight queries
+    assert registry.version(path) == read_index_meta(path)["version"]
+    assert registry.loads == 2
+
+
+def test_registry_serves_old_store_while_reload_in_progress(tmp_path):
+    path = str(tmp_path / "index")
+    save_index(_build(["a", "b"]), path)
+
+    release = threading.Event()
+
+    def slow_loader(p):
+        if registry.loads:
+            release.wait(5)
+        return _loader(p)
+
+    registry = IndexRegistry(loader=slow_loader, check_interval=0)
+    old = registry.get(path)
+    save_index(_build(["a", "b", "c"]), path)
+
+    reloader = threading.Thread(target=registry.get, args=(path,))
+    reloader.start()
+    while not registry._entry(str(tmp_path / "index")).lock.locked():
+        pass
+    assert registry.get(path) is old  # not blocked by the reload
+
+    release.set()
+    reloader.join()
+    assert registry.get(path).index.ntotal == 3
+
+
+def test_registry_retriever_defaults_to_empty_search_kwargs(tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+    save_index(_build(["supply chain risk", "currency risk", "debt risk", "tariff risk", "energy risk"]), path)
+    monkeypatch.setattr("utils.index_registry.registry", IndexRegistry(loader=_loader, check_interval=0))
+
+    retriever = RegistryRetriever(path=path)
+    assert retriever.search_kwargs == {}
+    assert len(retriever.invoke("currency risk")) == 4  # LangChain's default k
+
+
+def test_filtered_queries_keep_the_retrievers_search_type(tmp_path, monkeypatch):
+    from utils.metadata_index import MetadataIndex
+
+    path = str(tmp_path / "index")
+    texts = [f"page {p} risk note {j}" for p in range(3) for j in range(4)]
+    store = FAISS.from_texts(texts, EMBEDDINGS, metadatas=[{"source": "wir2024.pdf", "page": p}
+                                                           for p in range(3) for _ in range(4)])
+    save_index(store, path)
+
+    def loader(p):
+        loaded = _loader(p)
+        loaded.metadata_index = MetadataIndex.from_store(loaded)
+        return loaded
+
+    calls = []
+    monkeypatch.setattr("utils.index_registry.registry", IndexRegistry(loader=loader, check_interval=0))
+    monkeypatch.setattr("utils.index_registry.filtered_search",
+                        lambda store, query, ids, **kw: calls.append((len(ids), kw)) or [])
+    RegistryRetriever(path=path, search_type="mmr",
+                      search_kwargs={"k": 2, "score_threshold": 0.7}).invoke("risks on page 2")
+    assert calls == [(4, {"k": 2, "search_type": "mmr", "score_threshold": 0.7, "fetch_k": 20,
+                          "lambda_mult": 0.5})]
+
+
+def test_save_index_publishes_versions_atomically_and_prunes_old_ones(tmp_path):
+    path = str(tmp_path / "index")
+    versions = [save_index(_build(["a"] * n), path, keep_versions=2) for n in (1, 2, 3)]
+
+    assert open(os.path.join(path, "CURRENT")).read() == versions[-1]
+    assert sorted(os.listdir(os.path.join(path, "versions"))) == versions[1:]
+    assert resolve_index_dir(path) == os.path.join(path, "versions", versions[-1])
+    assert read_index_meta(path)["ntotal"] == 3
+
+
+def test_failed_reload_keeps_serving_the_loaded_store(tmp_path):
+    path = str(tmp_path / "index")
+    save_index(_build(["a", "b"]), path)
+    fail = threading.Event()
+
+    def flaky_loader(p):
+        if fail.is_set():
+            raise OSError("truncated index.faiss")
+        return _loader(p)
+
+    registry = IndexRegistry(loader=flaky_loader, check_interval=0)
+    old = registry.get(path)
+    old_version = registry.version(path)
+    save_index(_build(["a", "b", "c"]), path)
+    fail.set()
+
+    assert registry.get(path) is old  # no exception, old store kept
+    assert registry.version(path) == old_version
+
+    fail.clear()
+    assert registry.get(path).index.ntotal == 3
+
+
+def test_store_whose_version_check_fails_is_not_installed(tmp_path):
+    path = str(tmp_path / "index")
+    save_index(_build(["a", "b"]), path)
+    registry = IndexRegistry(loader=_loader, check_interval=0)
+    old = registry.get(path)
+
+    def stale_loader(p):
+        store = _loader(p)
+        store.index_meta = dict(store.index_meta, ntotal=99)  # never matches the loaded index
+        return store
+
+    save_index(_build(["a", "b", "c"]), path)
+    registry._loader = stale_loader
+    assert registry.get(path) is old
+    assert registry.loads == 1
+
+
+def test_registry_embeddings_follow_the_current_store(tmp_path, monkeypatch):
+    from utils.index_registry import RegistryEmbeddings
+
+    path = str(tmp_path / "index")
+    save_index(_build(["a", "b"]), path)
+    models = iter([DeterministicFakeEmbedding(size=16), DeterministicFakeEmbedding(size=32)])
+
+    def loader(p):
+        store = _loader(p)
+        store.embedding_function = next(models)
+        return store
+
+    monkeypatch.setattr("utils.index_registry.registry", IndexRegistry(loader=loader, check_interval=0))
+    embeddings = RegistryEmbeddings(path)
+    assert len(embeddings.embed_query("risk")) == 16
+    save_index(_build(["a", "b", "c"]), path)  # rebuilt with another model
+    assert len(embeddings.embed_query("risk")) == 32
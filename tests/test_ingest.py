@@ -0,0 +1,65 @@
+# tests/test_ingest.py
+
+import threading
+
+import pytest
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+
+from utils.ingest import build_vectorstore_streaming, iter_batches
+
+
+def test_iter_batches_keeps_tail():
+    assert list(iter_batches(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_streaming_build_is_bounded_and_keeps_chunk_ids():
+    produced = consumed = 0
+    max_lead = 0
+
+    def chunks():
+        nonlocal produced, max_lead
+        for i in range(1000):
+            produced += 1
+            max_lead = max(max_lead, produced - consumed)
+            yield Document(page_content=f"chunk {i}", metadata={"chunk_id": f"id-{i}", "page": i})
+
+    def on_batch(n):
+        nonlocal consumed
+        consumed += n
+
+    store = build_vectorstore_streaming(
+        chunks(), DeterministicFakeEmbedding(size=8), batch_size=50, max_pending_batches=2, on_batch=on_batch
+    )
+
+    assert store.index.ntotal == 1000
+    assert store.index_to_docstore_id[999] == "id-999"
+    assert store.docstore.search("id-10").page_content == "chunk 10"
+    # queue (2) + batch being embedded (1) + batch being assembled (1)
+    assert max_lead <= 4 * 50
+
+
+def test_streaming_build_of_nothing_returns_none():
+    assert build_vectorstore_streaming(iter(()), DeterministicFakeEmbedding(size=8)) is None
+
+
+def test_failing_embedder_stops_the_producer():
+    closed = threading.Event()
+
+    class FailingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            raise RuntimeError("embedding service down")
+
+    def chunks():
+        try:
+            for i in range(1000):
+                yield Document(page_content=f"chunk {i}")
+        finally:
+            closed.set()
+
+    threads = threading.active_count()
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        build_vectorstore_streaming(chunks(), FailingEmbeddings(size=8), batch_size=10, max_pending_batches=1)
+    # the producer was blocked on the full queue; it exits and closes the source
+    assert closed.is_set()
+    assert threading.active_count() == threads
@@ -0,0 +1,92 @@
+# tests/test_metadata_index.py
+
+import numpy as np
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.bm25 import BM25Index
+from utils.faiss_index import index_spec
+from utils.hybrid import fuse_with_bm25
+from utils.ingest import build_vectorstore_streaming
+from utils.metadata_index import MetadataIndex, allowed_chunk_ids, filtered_search, filtered_search_with_score
+from utils.vectorstore import resolve_index_dir, save_index
+
+
+def _docs():
+    docs = []
+    for src in ("wir2023.pdf", "wir2024.pdf"):
+        for page in range(10):
+            for j in range(3):
+                cid = f"{src[:7]}-p{page}-{j}"
+                docs.append(Document(page_content=f"{src} page {page} part {j} investment trends",
+                                     metadata={"source": src, "page": page, "chunk_id": cid,
+                                               "tags": ["Asia"] if page % 2 else []}))
+    return docs
+
+
+def _store(spec=None):
+    return build_vectorstore_streaming(_docs(), DeterministicFakeEmbedding(size=16), batch_size=16, spec=spec)
+
+
+def test_select_intersects_query_clues_and_ignores_unknown_sources():
+    index = MetadataIndex.from_store(_store())
+    ids = index.select_for_query("What does WIR2024 say on page 3?")
+    store = _store()
+    assert {store.docstore.search(store.index_to_docstore_id[int(p)]).metadata["chunk_id"] for p in ids} == \
+        {"wir2024-p2-0", "wir2024-p2-1", "wir2024-p2-2"}  # 1-based page 3 == 0-based page 2
+    assert len(index.select_for_query("Trends since 2019 on page 3")) == 6  # no wir2019 source
+    assert index.select_for_query("investment trends") is None
+    assert len(index.select(tags=["Asia"], source="wir2023")) == 15
+
+
+def test_filtered_search_returns_k_hits_inside_the_filter():
+    for spec in (None, index_spec("hnsw", M=8, efSearch=8)):
+        store = _store(spec)
+        ids = MetadataIndex.from_store(store).select(source="wir2023", page=5)
+        for exact_scan_max in (0, 100):  # selector inside FAISS, then the NumPy scan
+            hits = filtered_search_with_score(store, "wir2023.pdf page 4 part 1 investment trends", ids, k=5,
+                                              exact_scan_max=exact_scan_max)
+            assert len(hits) == 3
+            assert all(d.metadata["source"] == "wir2023.pdf" and d.metadata["page"] == 4 for d, _ in hits)
+            assert [s for _, s in hits] == sorted(s for _, s in hits)
+            assert hits[0][0].metadata["chunk_id"] == "wir2023-p4-1"
+
+
+def test_exact_scan_matches_unfiltered_flat_search():
+    store = _store()
+    all_ids = np.arange(store.index.ntotal, dtype=np.int64)
+    query = "wir2024.pdf page 7 part 2 investment trends"
+    expected = [d.metadata["chunk_id"] for d in store.similarity_search(query, k=4)]
+    assert [d.metadata["chunk_id"] for d in filtered_search(store, query, all_ids, k=4)] == expected
+
+
+def test_sidecar_round_trip_and_fusion_respects_filter(tmp_path):
+    store = _store(index_spec("ivf", nlist=2, nprobe=1))
+    save_index(store, str(tmp_path))
+    loaded = FAISS.load_local(resolve_index_dir(str(tmp_path)), store.embedding_function, allow_dangerous_deserialization=True)
+    index = MetadataIndex.load(str(tmp_path), loaded)
+    assert index.to_dict() == MetadataIndex.from_store(store).to_dict()
+
+    ids = index.select(source="wir2024", page=1)
+    dense = filtered_search(loaded, "investment", ids, k=3)  # IVF needs a direct map to reconstruct
+    loaded.bm25 = BM25Index.load(str(tmp_path))
+    fused = fuse_with_bm25(loaded, "investment trends", dense, k=10, allowed=allowed_chunk_ids(loaded, ids))
+    assert {d.metadata["chunk_id"] for d in fused} == {"wir2024-p0-0", "wir2024-p0-1", "wir2024-p0-2"}
+
+
+def test_filtered_search_honours_search_type_and_threshold():
+    store = _store()
+    ids = MetadataIndex.from_store(store).select(source="wir2023")
+    query = "wir2023.pdf page 4 part 1 investment trends"
+    ranked = filtered_search_with_score(store, query, ids, k=5)
+
+    # "similarity": the threshold is a raw distance, as in FAISS.similarity_search
+    kept = filtered_search(store, query, ids, k=5, score_threshold=ranked[2][1])
+    assert [d.metadata["chunk_id"] for d in kept] == [d.metadata["chunk_id"] for d, _ in ranked[:3]]
+
+    # "mmr": k diverse picks from the fetch_k nearest, all inside the filter
+    mmr = filtered_search(store, query, ids, k=3, search_type="mmr", fetch_k=10, lambda_mult=0.0)
+    assert len(mmr) == 3 and mmr[0].metadata["chunk_id"] == "wir2023-p4-1"
+    assert all(d.metadata["source"] == "wir2023.pdf" for d in mmr)
+    assert [d.metadata["chunk_id"] for d in mmr] != [d.metadata["chunk_id"] for d, _ in ranked[:3]]
@@ -0,0 +1,87 @@
+# tests/test_metrics.py
+
+import uuid
+
+import pytest
+from langchain_core.outputs import Generation, LLMResult
+
+from utils.metrics import Metrics, MetricsCallbackHandler
+
+
+def _clock(step_ms=10):
+    ticks = iter(range(0, 10 ** 6, step_ms))
+    return lambda: next(ticks) / 1000
+
+
+def test_spans_nest_inside_the_request_trace():
+    m = Metrics(clock=_clock())
+    trace, token = m.start_trace("ask")
+    with m.span("chain"):
+        with m.span("retrieval") as attrs:
+            attrs["documents"] = 3
+    record = m.finish_trace(trace, token)
+
+    retrieval, chain = record["spans"]  # recorded as they end
+    assert chain["name"] == "chain" and "parent" not in chain
+    assert retrieval == {"name": "retrieval", "start_ms": retrieval["start_ms"], "duration_ms": 10.0,
+                         "parent": "chain", "attrs": {"documents": 3}}
+    assert chain["duration_ms"] > retrieval["duration_ms"]
+    assert m.get_trace(trace.trace_id) == record
+
+    with m.span("untraced"):  # the trace is no longer current
+        pass
+    assert len(m.get_trace(trace.trace_id)["spans"]) == 2
+
+
+def test_latency_percentiles_over_the_window():
+    m = Metrics(window=100)
+    for ms in range(1, 201):
+        m.observe("retrieval", ms / 1000)
+    stats = m.latency()["retrieval"]
+    assert stats["count"] == 200  # all samples counted, percentiles over the last 100
+    assert stats["p50_ms"] == pytest.approx(150.5)
+    assert stats["p99_ms"] == pytest.approx(199.01)
+
+
+def test_errors_are_counted_and_marked_in_the_trace():
+    m = Metrics()
+    trace, token = m.start_trace("ask")
+    with pytest.raises(RuntimeError):
+        with m.span("chain"):
+            raise RuntimeError("boom")
+    record = m.finish_trace(trace, token)
+    assert record["spans"][0]["error"] == "RuntimeError"
+    assert m.counter("stage_errors_total", stage="chain") == 1
+
+
+def test_prometheus_exposition():
+    m = Metrics()
+    m.observe("retrieval", 0.02)
+    m.record_tokens(100, 20, "gpt-4o-mini")
+    m.register_collector(lambda: [("cache_hit_ratio", "gauge", "Hit rate", [({"cache": "answer"}, 0.25)])])
+    m.register_collector(lambda: 1 / 0)  # a broken collector doesn't break the scrape
+
+    text = m.prometheus()
+    assert "# TYPE rag_stage_seconds summary" in text
+    assert 'rag_stage_seconds{quantile="0.95",stage="retrieval"} 0.020000' in text
+    assert 'rag_stage_seconds_count{stage="retrieval"} 1' in text
+    assert 'rag_llm_tokens_total{kind="prompt",model="gpt-4o-mini"} 100' in text
+    assert "# TYPE rag_cache_hit_ratio gauge" in text
+    assert 'rag_cache_hit_ratio{cache="answer"} 0.25' in text
+
+
+def test_callback_times_llm_calls_and_counts_tokens():
+    m = Metrics(clock=_clock())
+    handler = MetricsCallbackHandler(m)
+
+    run = uuid.uuid4()
+    handler.on_chat_model_start({}, [[]], run_id=run)
+    handler.on_llm_end(LLMResult(generations=[[Generation(text="ok")]],
+                                 llm_output={"token_usage": {"prompt_tokens": 50, "completion_tokens": 7},
+                                             "model_name": "gpt-4o-mini"}), run_id=run)
+    assert m.counter("llm_tokens_total", kind="completion", model="gpt-4o-mini") == 7
+    assert m.latency()["llm"]["count"] == 1
+
+    # streamed output carries no usage: the generated text is counted locally
+    handler.on_llm_end(LLMResult(generations=[[Generation(text="x" * 40)]]), run_id=uuid.uuid4())
+    assert m.counter("llm_tokens_total", kind="completion", model="unknown") > 0
@@ -0,0 +1,69 @@
+# tests/test_parallel_loader.py
+
+import pytest
+
+from utils.parallel_loader import load_pdfs, plan_tasks
+
+
+def test_plan_tasks_splits_large_files_in_order():
+    tasks = plan_tasks([("a.pdf", 5), ("notes.txt", None), ("b.pdf", 2)], "pypdf", pages_per_task=2)
+    assert tasks == [
+        ("a.pdf", "pypdf", 0, 2),
+        ("a.pdf", "pypdf", 2, 4),
+        ("a.pdf", "pypdf", 4, 5),
+        ("notes.txt", "pypdf", None, None),
+        ("b.pdf", "pypdf", 0, 2),
+    ]
+
+
+@pytest.mark.parametrize("backend", ["pymupdf", "pypdf"])
+def test_parallel_load_matches_sequential(tmp_path, backend):
+    fitz = pytest.importorskip("fitz")
+    pytest.importorskip("pypdf")
+    paths = []
+    for name, n_pages in (("wir2023.pdf", 7), ("wir2024.pdf", 11)):
+        pdf = fitz.open()
+        for i in range(n_pages):
+            pdf.new_page().insert_text((72, 72), f"{name} page {i}")
+        pdf.save(str(tmp_path / name))
+        paths.append(str(tmp_path / name))
+
+    sequential = load_pdfs(paths, backend=backend, workers=1, pages_per_task=3)
+    parallel = load_pdfs(paths, backend=backend, workers=3, pages_per_task=3)
+
+    assert [(d.page_content, d.metadata) for d in parallel] == [(d.page_content, d.metadata) for d in sequential]
+    assert [d.metadata["page"] for d in parallel] == list(range(7)) + list(range(11))
+    assert parallel[9].page_content.strip() == "wir2024.pdf page 2"
+
+
+def test_pymupdf_pages_keep_the_document_metadata(tmp_path):
+    fitz = pytest.importorskip("fitz")
+    from langchain_community.document_loaders import PyMuPDFLoader
+
+    pdf = fitz.open()
+    for i in range(3):
+        pdf.new_page().insert_text((72, 72), f"page {i}")
+    pdf.set_metadata({"title": "World Investment Report 2024", "author": "UNCTAD"})
+    path = str(tmp_path / "wir2024.pdf")
+    pdf.save(path)
+
+    pages = load_pdfs([path], backend="pymupdf", workers=1, pages_per_task=2)
+    assert pages[2].metadata["title"] == "World Investment Report 2024" and pages[2].metadata["author"] == "UNCTAD"
+    assert [d.metadata for d in pages] == [d.metadata for d in PyMuPDFLoader(path).load()]
+
+
+def test_streamed_pages_parse_in_spawned_workers_from_the_producer_thread(tmp_path):
+    fitz = pytest.importorskip("fitz")
+    from langchain_community.embeddings import DeterministicFakeEmbedding
+
+    from utils.ingest import build_vectorstore_streaming, iter_pdf_pages
+
+    pdf = fitz.open()
+    for i in range(9):
+        pdf.new_page().insert_text((72, 72), f"page {i}")
+    pdf.save(str(tmp_path / "wir2024.pdf"))
+
+    pages = iter_pdf_pages([str(tmp_path / "wir2024.pdf")], backend="pymupdf", workers=2, pages_per_task=2)
+    store = build_vectorstore_streaming(pages, DeterministicFakeEmbedding(size=8), batch_size=4)
+    docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in range(9)]
+    assert [d.metadata["page"] for d in docs] == list(range(9))
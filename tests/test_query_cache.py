@@ -0,0 +1,67 @@
+# tests/test_query_cache.py
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from utils.embedding_cache import EmbeddingCache
+from utils.query_cache import CachedQueryEmbeddings
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_repeated_and_reformatted_queries_hit_memory():
+    base = CountingEmbedding(size=8)
+    cached = CachedQueryEmbeddings(base, max_size=10, ttl=60)
+    first = cached.embed_query("What are  the main risks?")
+    assert cached.embed_query("What are the main risks?\n") == first
+    assert base.calls == 1
+    stats = cached.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+
+def test_lru_size_and_ttl_eviction():
+    base = CountingEmbedding(size=8)
+    clock = FakeClock()
+    cached = CachedQueryEmbeddings(base, max_size=2, ttl=10, clock=clock)
+    for q in ("a", "b", "a", "c"):  # "b" is least recently used when "c" arrives
+        cached.embed_query(q)
+    assert base.calls == 3
+    cached.embed_query("a")
+    cached.embed_query("b")
+    assert base.calls == 4
+
+    clock.now = 11
+    cached.embed_query("b")
+    assert base.calls == 5 and cached.stats()["evictions"] >= 2
+
+
+def test_disk_tier_survives_restart_and_store_searches_use_the_cache(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    base = CountingEmbedding(size=8)
+    warm = CachedQueryEmbeddings(base, disk=EmbeddingCache(path))
+    vector = warm.embed_query("FDI to LDCs")
+    warm.disk.close()
+
+    cold = CachedQueryEmbeddings(base, disk=EmbeddingCache(path))
+    assert cold.embed_query("FDI to LDCs") == vector
+    assert base.calls == 1 and cold.stats()["disk_hits"] == 1
+
+    store = FAISS.from_texts(["FDI to LDCs rose", "Tariffs fell"], cold)
+    for _ in range(3):
+        store.similarity_search("Tariffs", k=1)
+        store.max_marginal_relevance_search("Tariffs", k=1, fetch_k=2)
+    assert base.calls == 2
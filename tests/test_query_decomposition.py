@@ -0,0 +1,61 @@
+# tests/test_query_decomposition.py
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.language_models import FakeListLLM
+
+from utils.query_decomposition import decompose_query, fanout_search
+
+
+def test_rules_expand_facets_sharing_a_head_or_a_stem():
+    assert decompose_query("Compare geopolitical and financing risks across regions?") == [
+        "Compare geopolitical and financing risks across regions?",
+        "geopolitical risks across regions",
+        "financing risks across regions",
+    ]
+    assert decompose_query("FDI risks in Asia, Africa and Latin America", max_subqueries=3)[1:] == [
+        "FDI risks in Asia", "FDI risks in Africa"]
+    assert decompose_query("What is the outlook for FDI?") == ["What is the outlook for FDI?"]
+
+
+def test_rules_leave_single_facet_questions_whole():
+    for question in [
+        "In 2023, how did FDI to Africa change?",
+        "Summarise page 5 of WIR2024, focusing on tariffs",
+        "What is the outlook for Bosnia and Herzegovina?",
+        "What drove FDI growth in 2023, and why?",
+        "Which risks affect Asia and how are they hedged?",
+    ]:
+        assert decompose_query(question) == [question], question
+
+
+def test_llm_decomposition_falls_back_to_rules_when_it_fails():
+    llm = FakeListLLM(responses=["1. tariff exposure in Asia\n- currency risk in Asia\n"])
+    assert decompose_query("Asian tariff and currency risk", llm=llm) == [
+        "Asian tariff and currency risk", "tariff exposure in Asia", "currency risk in Asia"]
+
+    class Broken:
+        def invoke(self, prompt):
+            raise TimeoutError("slow")
+
+    assert decompose_query("tariff and currency risk", llm=Broken())[1:] == ["tariff risk", "currency risk"]
+
+
+def test_fanout_fuses_subquery_rankings_without_duplicates():
+    texts = [f"section {i} on {topic}" for i in range(10) for topic in ("tariffs", "currency", "debt")]
+    store = FAISS.from_texts(texts, DeterministicFakeEmbedding(size=16),
+                             metadatas=[{"chunk_id": str(i)} for i in range(len(texts))])
+    subqueries = ["tariff and currency risk", "tariff risk", "currency risk"]
+    docs = fanout_search(store, subqueries, k=6)
+    assert len(docs) == 6 and len({d.page_content for d in docs}) == 6
+    per_query = {d.page_content for q in subqueries for d in store.similarity_search(q, k=12)}
+    assert {d.page_content for d in docs} <= per_query
+
+
+def test_fanout_weights_the_original_question_above_each_facet(monkeypatch):
+    weights = []
+    monkeypatch.setattr("utils.query_decomposition.reciprocal_rank_fusion",
+                        lambda rankings, w: weights.append(w) or [])
+    store = FAISS.from_texts(["a", "b"], DeterministicFakeEmbedding(size=4))
+    fanout_search(store, ["tariff and currency risk", "tariff risk", "currency risk"], k=2)
+    assert weights == [[2.0, 1.0, 1.0]]
@@ -0,0 +1,66 @@
+# tests/test_reranker.py
+
+from langchain_core.documents import Document
+
+from chains.chat_chain import SimpleBoostedRetriever
+from utils.reranker import CrossEncoderReranker
+
+
+def _docs(n):
+    return [Document(page_content=f"chunk {i} " + "tariff " * (i % 4), metadata={"chunk_id": f"c{i}"})
+            for i in range(n)]
+
+
+def _overlap(pairs):
+    """Stand-in cross-encoder: how often the query's first word occurs in the chunk."""
+    return [text.count(query.split()[0]) for query, text in pairs]
+
+
+def test_rerank_scores_the_pool_in_one_pass_and_caches_pairs():
+    calls = []
+    reranker = CrossEncoderReranker(pool_size=8, batch_size=8,
+                                    score_pairs=lambda pairs: calls.append(len(pairs)) or _overlap(pairs))
+    top = reranker.rerank("tariff risk", _docs(12), k=3)
+    assert [d.metadata["chunk_id"] for d in top] == ["c3", "c7", "c2"]
+    assert calls == [8]  # only the pool, in a single batch
+
+    reranker.rerank("Tariff  risk", _docs(12), k=3)  # same normalised query: all cached
+    assert calls == [8] and reranker.stats()["cache_hits"] == 8
+
+
+def test_budget_cuts_scoring_early_and_keeps_retrieval_order_for_the_rest():
+    clock = iter(range(0, 10000, 100))  # each clock read advances 100 ms
+    reranker = CrossEncoderReranker(pool_size=8, batch_size=2, budget_ms=250, score_pairs=_overlap,
+                                    clock=lambda: next(clock) / 1000)
+    docs = _docs(8)
+    top = reranker.rerank("tariff", docs, k=8)
+    assert reranker.stats()["cutoffs"] == 1 and reranker.stats()["pairs_scored"] < 8
+    scored = reranker.stats()["pairs_scored"]
+    assert [d.metadata["chunk_id"] for d in top[scored:]] == [f"c{i}" for i in range(scored, 8)]
+
+
+def test_boosted_retriever_hands_the_reranked_top_k_onwards(monkeypatch):
+    class Inner:
+        path = "unused"
+
+        def get_relevant_documents(self, query):
+            return _docs(10)
+
+    monkeypatch.setattr("chains.chat_chain.get_vectorstore", lambda path: object())  # no BM25 sidecar
+    retriever = SimpleBoostedRetriever(inner=Inner(), k=2,
+                                       reranker=CrossEncoderReranker(pool_size=10, score_pairs=_overlap))
+    assert [d.metadata["chunk_id"] for d in retriever.get_relevant_documents("tariff")] == ["c3", "c7"]
+
+
+def test_boosted_retriever_defaults_to_no_reranker(monkeypatch):
+    class Inner:
+        path = "unused"
+
+        def get_relevant_documents(self, query):
+            return _docs(6)
+
+    monkeypatch.setattr("chains.chat_chain.get_vectorstore", lambda path: object())
+    retriever = SimpleBoostedRetriever(inner=Inner(), k=2)
+    assert retriever.reranker is None
+    # keyword boost only: chunks containing "tariff" float up, in retrieval order
+    assert [d.metadata["chunk_id"] for d in retriever.invoke("tariff")] == ["c1", "c2"]
@@ -0,0 +1,69 @@
+# tests/test_session_store.py
+
+from utils.session_store import SessionStore
+
+
+def words(text):
+    return len(text.split())
+
+
+def test_history_window_stays_within_the_token_budget(tmp_path):
+    store = SessionStore(str(tmp_path / "s.sqlite"), max_history_tokens=10, count_tokens=words)
+    for i in range(20):
+        store.append("a", f"question {i}", f"answer number {i}")  # 5 tokens per turn
+    assert store.history("a") == [("question 18", "answer number 18"), ("question 19", "answer number 19")]
+    assert store.last_question("a") == "question 19"
+    assert store.history("b") == [] and store.last_question("b") == ""
+
+
+
+def test_latest_turn_over_the_budget_is_truncated_not_dropped(tmp_path):
+    store = SessionStore(str(tmp_path / "s.sqlite"), max_history_tokens=10, count_tokens=words)
+    store.append("a", "short question", "first answer")
+    store.append("a", "what are the risks?", " ".join(f"w{i}" for i in range(40)))  # over budget alone
+    assert store.history("a") == [("what are the risks?", "w0 w1 w2 w3 w4 w5")]
+
+    store.append("b", "one two three four five six seven eight nine ten eleven", "x")  # the question alone, too
+    assert store.history("b") == [("one two three four five six seven eight nine ten", "")]
+
+
+def test_turn_cap_reset_and_idle_expiry(tmp_path):
+    now = [0.0]
+    store = SessionStore(str(tmp_path / "s.sqlite"), max_turns=3, ttl=100, count_tokens=words,
+                         clock=lambda: now[0])
+    for i in range(5):
+        store.append("a", f"q{i}", "a")
+    (n,) = store._conn.execute("SELECT COUNT(*) FROM turns WHERE sid = 'a'").fetchone()
+    assert n == 3 and store.history("a")[0] == ("q2", "a")
+
+    store.append("b", "q", "a")
+    store.reset("b")
+    assert store.history("b") == []
+
+    now[0] = 50
+    store.append("c", "q", "a")
+    now[0] = 120
+    store.prune()  # "a" idle since t=0, "c" active at t=50
+    assert store.history("a") == [] and store.history("c") == [("q", "a")]
+
+    # history survives a restart
+    store.close()
+    assert SessionStore(str(tmp_path / "s.sqlite"), count_tokens=words).history("c") == [("q", "a")]
+
+
+def test_last_question_is_the_standalone_form_and_old_databases_migrate(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "s.sqlite")
+    old = sqlite3.connect(path)  # schema from before standalone questions were kept
+    old.execute("CREATE TABLE turns (sid TEXT, seq INTEGER, question TEXT, answer TEXT, tokens INTEGER, "
+                "created_at REAL, PRIMARY KEY (sid, seq))")
+    old.execute("INSERT INTO turns VALUES ('a', 0, 'what about its debt?', 'x', 5, 0)")
+    old.commit()
+    old.close()
+
+    store = SessionStore(path, count_tokens=words)
+    assert store.last_question("a") == "what about its debt?"  # recorded without a standalone form
+    store.append("a", "and its currency?", "y", standalone="What is Ghana's currency risk?")
+    assert store.last_question("a") == "What is Ghana's currency risk?"
+    assert store.history("a")[-1] == ("and its currency?", "y")
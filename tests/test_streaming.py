@@ -0,0 +1,54 @@
+# tests/test_streaming.py
+
+from langchain.chains import ConversationalRetrievalChain
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+from langchain_core.language_models import FakeListChatModel
+
+from chains.chat_chain import condense_question, stream_answer
+
+
+class PromptRecorder(BaseCallbackHandler):
+    def __init__(self):
+        self.prompts = []
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.prompts.append([m.content for m in messages[0]])
+
+
+def _chain(responses, callbacks=None):
+    store = FAISS.from_texts(["Tariffs raise supply chain risk.", "FDI to LDCs increased."],
+                             DeterministicFakeEmbedding(size=8))
+    return ConversationalRetrievalChain.from_llm(
+        llm=FakeListChatModel(responses=responses, callbacks=callbacks),
+        retriever=store.as_retriever(search_kwargs={"k": 1}),
+        return_source_documents=True,
+    )
+
+
+def test_stream_answer_yields_the_same_answer_as_invoke_token_by_token():
+    answer = "Tariffs are the main risk."
+    docs, tokens = stream_answer(_chain([answer]), "What is the main risk?")
+    tokens = list(tokens)
+    assert len(docs) == 1
+    assert len(tokens) > 1 and "".join(tokens) == answer
+
+    result = _chain([answer]).invoke({"question": "What is the main risk?", "chat_history": []})
+    assert result["answer"] == answer and result["source_documents"] == docs
+
+
+def test_stream_answer_sends_the_same_prompt_as_invoke():
+    streamed, invoked = PromptRecorder(), PromptRecorder()
+    _, tokens = stream_answer(_chain(["ok"], [streamed]), "What is the main risk?")
+    list(tokens)
+    _chain(["ok"], [invoked]).invoke({"question": "What is the main risk?", "chat_history": []})
+    assert streamed.prompts == invoked.prompts
+    assert "Tariffs raise supply chain risk." in streamed.prompts[0][0]
+
+
+def test_condense_question_uses_the_chain_question_generator():
+    chain = _chain(["What are the risks of tariffs?"])
+    assert condense_question(chain, "And tariffs?", []) == "And tariffs?"
+    history = [["What are the risks?", "Several."]]  # session JSON stores turns as lists
+    assert condense_question(chain, "And tariffs?", history) == "What are the risks of tariffs?"
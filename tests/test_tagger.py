@@ -0,0 +1,50 @@
+# tests/test_tagger.py
+
+import re
+
+from langchain_core.documents import Document
+
+from utils.tagger import GazetteerTagger, default_tagger
+
+GAZETTEER = {
+    "countries": ["mali", "south africa", "united states", "el salvador"],
+    "regions": ["africa", "united"],
+    "risk_categories": ["debt", "supply chain"],
+}
+
+
+def _per_term(text, terms):
+    return [t for t in terms if re.search(rf"\b{t}\b", text.lower())]
+
+
+def test_matches_per_term_search_including_nested_terms():
+    tagger = GazetteerTagger(GAZETTEER)
+    texts = [
+        "Investment in South Africa and Mali rose; Somalia is not Mali.",
+        "United States debt and supply-chain risks",
+        "Supply chain disruption in El Salvador, the United Kingdom and africa.",
+        "nothing relevant here, malign mentions only",
+    ]
+    for text in texts:
+        assert tagger.tag(text) == _per_term(text, tagger.terms)
+    assert tagger.tag(texts[0]) == ["mali", "south africa", "africa"]
+
+
+def test_tag_documents_sets_metadata_and_bundled_gazetteer_loads():
+    docs = [Document(page_content="Geopolitical risk in China and India")]
+    default_tagger().tag_documents(docs)
+    assert docs[0].metadata["tags"] == ["china", "india", "geopolitical"]
+
+
+def test_only_country_tags_get_the_strong_keyword_boost(monkeypatch):
+    from utils.vectorstore import _keyword_boost
+
+    monkeypatch.setattr("utils.vectorstore.default_tagger", lambda: GazetteerTagger(GAZETTEER))
+    assert GazetteerTagger(GAZETTEER).terms_in("countries") == ["mali", "south africa", "united states",
+                                                                "el salvador"]
+    dense = Document(page_content="debt distress in the region", metadata={"tags": ["debt"]})
+    tagged_debt = Document(page_content="unrelated text", metadata={"tags": ["debt"]})
+    tagged_mali = Document(page_content="unrelated text", metadata={"tags": ["mali"]})
+    results = [(dense, 1.0), (tagged_debt, 2.0), (tagged_mali, 4.0)]
+    # "mali" (a country tag) outranks everything; the "debt" tag is only a keyword hit
+    assert _keyword_boost("mali debt", results) == [tagged_mali, dense, tagged_debt]
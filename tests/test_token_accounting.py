@@ -0,0 +1,55 @@
+# tests/test_token_accounting.py
+
+import json
+
+from langchain_core.documents import Document
+
+from utils.context_packer import pack_context
+from utils.token_accounting import annotate_token_counts, corpus_report, count_batch, estimate_tokens, \
+    get_encoder, write_report
+
+
+def _chunks():
+    docs = []
+    for src, sizes in (("wir2023.pdf", [10, 20, 30]), ("wir2024.pdf", [40, 5000])):
+        for i, n in enumerate(sizes):
+            docs.append(Document(page_content="x" * n, metadata={"source": src, "page": i, "chunk_id": f"{src}-{i}",
+                                                                  "tokens": n}))
+    return docs
+
+
+def test_report_uses_recorded_counts_per_source_and_flags_oversize(tmp_path):
+    report = corpus_report(_chunks(), oversize_tokens=3000, bins=4)
+    assert report["chunks"] == 5 and report["tokens"] == 5100
+    assert report["sources"]["wir2023.pdf"]["max"] == 30 and report["sources"]["wir2024.pdf"]["chunks"] == 2
+    assert sum(report["sources"]["wir2024.pdf"]["histogram"]) == 2 and len(report["histogram_edges"]) == 5
+    assert report["oversize"] == {"count": 1, "chunks": [
+        {"source": "wir2024.pdf", "page": 1, "chunk_id": "wir2024.pdf-1", "tokens": 5000}]}
+
+    write_report(report, str(tmp_path / "out" / "report.json"))
+    assert json.loads((tmp_path / "out" / "report.json").read_text())["overall"]["p50"] == 30
+
+
+def test_annotate_only_counts_missing_docs_in_one_batch():
+    docs = [Document(page_content="tariff risk", metadata={"tokens": 7}), Document(page_content="FDI outlook")]
+    counts = annotate_token_counts(docs)
+    assert counts[0] == 7 and counts[1] == docs[1].metadata["tokens"] == count_batch(["FDI outlook"])[0]
+    if get_encoder() is None:  # offline: estimated
+        assert counts[1] == estimate_tokens("FDI outlook")
+
+
+def test_packer_budgets_with_recorded_counts():
+    docs = [Document(page_content=f"passage {i} on risk {'word ' * 20}", metadata={"source": "a.pdf", "page": i,
+                                                                                     "tokens": 40})
+            for i in range(5)]
+    assert len(pack_context(docs, max_tokens=100, near_dup_threshold=1.01)) == 2
+
+
+def test_streamed_chunks_carry_token_counts():
+    from utils.vectorstore import iter_split_documents
+
+    pages = [Document(page_content="Tariffs on steel rose sharply. " * 40, metadata={"source": "a.pdf", "page": p})
+             for p in range(2)]
+    chunks = list(iter_split_documents(pages))
+    assert len(chunks) > 2
+    assert [c.metadata["tokens"] for c in chunks] == count_batch([c.page_content for c in chunks])
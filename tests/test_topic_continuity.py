@@ -0,0 +1,56 @@
+# tests/test_topic_continuity.py
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.topic_continuity import TopicTracker
+
+VECTORS = {
+    "What are the main risks in Asia?": [1.0, 0.1, 0.0],
+    "What are the risks in Asian supply chains?": [0.95, 0.3, 0.0],
+    "How much did FDI to Africa grow?": [0.0, 0.2, 1.0],
+}
+
+
+class CountingEmbedding(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return VECTORS[text]
+
+
+def test_follow_ups_compare_against_the_cached_previous_vector():
+    emb = CountingEmbedding()
+    topics = TopicTracker(emb, threshold=0.8)
+    assert topics.is_related("s1", "What are the main risks in Asia?")  # first question
+    assert topics.is_related("s1", "What are the risks in Asian supply chains?")
+    assert not topics.is_related("s1", "How much did FDI to Africa grow?")
+    assert emb.calls == 3  # one embedding per question, none for the previous one
+    # sessions are independent
+    assert topics.similarity("s2", "How much did FDI to Africa grow?") is None
+
+
+def test_previous_question_is_re_embedded_after_a_restart_or_eviction():
+    emb = CountingEmbedding()
+    topics = TopicTracker(emb, max_sessions=1)
+    topics.similarity("s1", "What are the main risks in Asia?")
+    topics.similarity("s2", "How much did FDI to Africa grow?")  # evicts s1
+    score = topics.similarity("s1", "What are the risks in Asian supply chains?",
+                              previous_question="What are the main risks in Asia?")
+    assert score > 0.9 and emb.calls == 4
+    topics.reset("s1")
+    assert topics.similarity("s1", "How much did FDI to Africa grow?") is None
+
+
+def test_vector_from_another_embedding_model_is_re_embedded():
+    emb = CountingEmbedding()
+    topics = TopicTracker(emb)
+    topics._previous["s1"] = np.ones(8, dtype=np.float32)  # held from before a rebuild
+    score = topics.similarity("s1", "What are the risks in Asian supply chains?",
+                              previous_question="What are the main risks in Asia?")
+    assert score > 0.9 and topics._previous["s1"].shape == (3,)
@@ -1,41 +1,86 @@
 # tools/risk_retriever.py
 from __future__ import annotations
 
+import asyncio
 from typing import List
 
 # Keep BaseTool import as-is to avoid refactors; if it warns, you can switch to langchain_core.tools.BaseTool later.
 from langchain.tools import BaseTool
 from langchain_core.documents import Document
 
-from utils.vectorstore import load_vectorstore
+from utils.index_registry import get_vectorstore
+from utils.query_decomposition import decompose_query, fanout_search
+from utils.reranker import RERANK_TOP_K, get_reranker
 
 try:
     from config import TOP_K  # optional, user-configurable
 except Exception:
     TOP_K = 10  # sensible default
 
+try:
+    from config import QUERY_DECOMPOSITION  # "off" | "rules" | "llm"
+except Exception:
+    QUERY_DECOMPOSITION = "rules"
+
+_decomposition_llm = None
+
+
+def _get_decomposition_llm():
+    global _decomposition_llm
+    if _decomposition_llm is None:
+        from langchain_openai import ChatOpenAI
+        _decomposition_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, timeout=30, max_retries=1)
+    return _decomposition_llm
+
 
 class RiskRetrieverTool(BaseTool):
     name: str = "RiskRetriever"
     description: str = "Retrieves relevant investment risk information from indexed PDFs."
 
-    def _run(self, query: str) -> List[Document]:
-        """Synchronous retrieval entrypoint (BaseTool)."""
-        vectorstore = load_vectorstore()
+    decomposition: str = QUERY_DECOMPOSITION
+
+    def _store(self):
+        try:
+            vectorstore = get_vectorstore()  # shared handle; loaded once per process
+        except FileNotFoundError:
+            vectorstore = None
         if vectorstore is None:
             raise RuntimeError(
                 "Vectorstore not found. Rebuild it with:\n"
                 "  python scripts/build_index.py --src data/wir2024.pdf data/wir2023.pdf --out vectorstore_index"
             )
+        return vectorstore
 
+    def _retriever(self, k: int = TOP_K):
         # Similarity search is fine for MVP; you can switch to "mmr" for diversity if needed.
-        retriever = vectorstore.as_retriever(
+        return self._store().as_retriever(
             search_type="similarity",
-            search_kwargs={"k": int(TOP_K)},
+            search_kwargs={"k": int(k)},
         )
 
-        docs: List[Document] = retriever.invoke(query)
+    def _subqueries(self, query: str) -> List[str]:
+        if self.decomposition == "off":
+            return [query]
+        llm = _get_decomposition_llm() if self.decomposition == "llm" else None
+        return decompose_query(query, llm=llm)
 
+    def _search(self, query: str) -> List[Document]:
+        """
+        Single similarity search, or a fused fan-out when the query has several
+        facets; with reranking on, a larger pool is cut to RERANK_TOP_K by the cross-encoder.
+        """
+        reranker = get_reranker()
+        k = max(int(TOP_K), reranker.pool_size) if reranker else int(TOP_K)
+        subqueries = self._subqueries(query)
+        if len(subqueries) == 1:
+            docs = self._retriever(k).invoke(query)
+        else:
+            print(f"[RetrieverAgent] Fan-out over {len(subqueries)} sub-queries: {subqueries[1:]}")
+            docs = fanout_search(self._store(), subqueries, k=k)
+        return reranker.rerank(query, docs, RERANK_TOP_K) if reranker else docs
+
+    @staticmethod
+    def _preview(docs: List[Document]):
         # Debug preview (first 220 chars) — comment out if noisy
         try:
             preview = "\n".join(
@@ -46,9 +91,18 @@ class RiskRetrieverTool(BaseTool):
         except Exception:
             pass
 
+    def _run(self, query: str) -> List[Document]:
+        """Synchronous retrieval entrypoint (BaseTool)."""
+        docs: List[Document] = self._search(query)
+        self._preview(docs)
         return docs
 
-    def _arun(self, query: str):
-        raise NotImplementedError("Async not implemented.")
-
-
+    async def _arun(self, query: str) -> List[Document]:
+        """Async retrieval entrypoint; the query embedding is awaited, not run on a blocked thread."""
+        if self.decomposition == "off" and get_reranker() is None:
+            docs: List[Document] = await self._retriever().ainvoke(query)
+        else:
+            # decomposition, matrix search and reranking are CPU-bound; keep them off the loop
+            docs = await asyncio.to_thread(self._search, query)
+        self._preview(docs)
+        return docs
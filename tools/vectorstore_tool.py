@@ -9,6 +9,8 @@ if CREWAI_TOOLS_PATH not in sys.path:
 
 from crewai_tools.tool import BaseTool
 
+from utils.index_registry import get_vectorstore
+
 
 class RiskRetrieverTool(BaseTool):
     name = "Risk Retriever"
@@ -16,7 +18,11 @@ class RiskRetrieverTool(BaseTool):
 
     def __init__(self):
         super().__init__()
-        self.vectorstore = load_vectorstore()
+
+    @property
+    def vectorstore(self):
+        # Resolved per call so the tool follows index rebuilds
+        return get_vectorstore()
 
     def _run(self, input: str) -> str:
         docs = self.vectorstore.similarity_search(input, k=5)
@@ -0,0 +1,99 @@
+# utils/answer_cache.py
+"""
+Semantic cache of answered questions for the /ask route.
+
+A standalone (already condensed) question is embedded and compared with the
+questions answered before against the same index version. If the best cosine
+similarity reaches the threshold, the cached answer, sources and scores are
+returned without running retrieval, the LLM or the GPT scorer.
+
+Only questions with the same metadata constraints can match: "risks on
+page 5" and "risks on page 6" embed almost identically, but retrieval
+filters them to different chunks (see `utils.metadata_index.query_constraints`),
+so they must not share an answer.
+
+Entries are bounded by LRU eviction, and any entry recorded against an older
+index version is dropped as soon as a newer version is seen.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.metadata_index import query_constraints
+
+try:
+    from config import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD
+except Exception:
+    ANSWER_CACHE_SIZE = 256
+    ANSWER_CACHE_THRESHOLD = 0.93
+
+
+class SemanticAnswerCache:
+    def __init__(self, embeddings: Embeddings, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 max_size: int = ANSWER_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_size = max_size
+        # question → (unit vector, constraints key, payload)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        v = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else v
+
+    @staticmethod
+    def _constraints(question: str) -> tuple:
+        return tuple(sorted(query_constraints(question).items()))
+
+    def _check_version(self, version: str):
+        # Caller holds the lock. A rebuilt index invalidates every answer.
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def lookup(self, question: str, version: str) -> Optional[Dict[str, Any]]:
+        """Cached payload for the closest earlier question, or None below the threshold."""
+        query = self._embed(question)
+        constraints = self._constraints(question)
+        with self._lock:
+            self._check_version(version)
+            keys = [k for k, entry in self._entries.items() if entry[1] == constraints]
+            if keys:
+                matrix = np.stack([self._entries[k][0] for k in keys])
+                sims = matrix @ query
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    return dict(self._entries[keys[best]][2], cached_question=keys[best],
+                                similarity=float(sims[best]))
+            self.misses += 1
+            return None
+
+    def store(self, question: str, version: str, payload: Dict[str, Any]):
+        vector = self._embed(question)
+        constraints = self._constraints(question)
+        with self._lock:
+            self._check_version(version)
+            self._entries[question] = (vector, constraints, payload)
+            self._entries.move_to_end(question)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._entries), "version": self._version, "hits": self.hits,
+                    "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
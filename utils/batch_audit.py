@@ -0,0 +1,176 @@
+# utils/batch_audit.py
+"""
+Batch audit: run a file of standard queries through retrieval, the analyst
+and the synthesiser, writing one JSON result per query.
+
+Retrieval is done per batch of queries rather than per query:
+
+* all query vectors come from one embedding call (`embed_queries`, which
+  also serves repeats from the query-embedding cache);
+* FAISS searches the whole query matrix in a single `index.search`;
+* each query's candidates then go through the same ranking as the app's
+  `boosted_retriever` (`rank_candidates`: page / filename prefilter, BM25
+  fusion or keyword boost, optional reranker), so audited answers see the
+  documents an interactive query would.
+
+Analyst and synthesiser calls then fan out under an asyncio semaphore.
+Each result (answer, summary, citations, per-stage timings) is appended to
+the output JSONL as soon as it completes, and that file is the checkpoint:
+a rerun skips queries already recorded as done and retries failed ones.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.batch_eval import load_checkpoint, open_results
+from utils.embedding_cache import normalise_text
+from utils.reranker import get_reranker
+from utils.vectorstore import candidate_count, rank_candidates
+
+try:
+    from config import TOP_K
+except Exception:
+    TOP_K = 10
+
+try:
+    from config import AUDIT_MAX_CONCURRENCY, AUDIT_SEARCH_BATCH
+except Exception:
+    AUDIT_MAX_CONCURRENCY = 8
+    AUDIT_SEARCH_BATCH = 64
+
+
+def query_id(query: str) -> str:
+    """Stable ID for a query, so checkpoints survive reordering the query file."""
+    return hashlib.sha1(normalise_text(query).encode("utf-8")).hexdigest()[:16]
+
+
+def iter_queries(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    (query_id, query) per line of a text file. Lines may also be JSON objects
+    with a "query" (or "question") and an optional "id"; blank lines and
+    lines starting with '#' are skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if isinstance(record, dict):
+                    query = record.get("query") or record.get("question")
+                    if query:
+                        yield str(record.get("id") or query_id(query)), query
+                    continue
+            yield query_id(line), line
+
+
+def embed_queries(store: FAISS, queries: List[str]) -> np.ndarray:
+    """Query matrix (n × dim) from one embedding call, normalised like the store's own searches."""
+    emb = store.embedding_function
+    if hasattr(emb, "embed_queries"):  # CachedQueryEmbeddings: cache hits + one batched call
+        vectors = emb.embed_queries(queries)
+    else:
+        vectors = emb.embed_documents(queries)
+    x = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(store, "_normalize_L2", False):
+        faiss.normalize_L2(x)
+    return x
+
+
+def batch_search(store: FAISS, queries: List[str], k: int = TOP_K) -> List[List[Document]]:
+    """Top-k documents for every query: one matrix search for the candidates, then `rank_candidates` per query."""
+    if not queries:
+        return []
+    reranker = get_reranker()
+    distances, positions = store.index.search(embed_queries(store, queries), candidate_count(k, reranker))
+    results = []
+    for query, row, scores in zip(queries, positions, distances):
+        dense = [(store.docstore.search(store.index_to_docstore_id[int(p)]), float(d))
+                 for p, d in zip(row, scores) if p >= 0]
+        docs, _ = rank_candidates(store, query, k, reranker, dense=dense)
+        results.append(docs)
+    return results
+
+
+def citations(docs: List[Document]) -> List[Dict]:
+    """Distinct (source, page, chunk_id) references, in retrieval order."""
+    seen, refs = set(), []
+    for d in docs:
+        ref = {"source": d.metadata.get("source") or d.metadata.get("file_name") or "document",
+               "page": d.metadata.get("page"), "chunk_id": d.metadata.get("chunk_id")}
+        key = tuple(ref.values())
+        if key not in seen:
+            seen.add(key)
+            refs.append(ref)
+    return refs
+
+
+async def _audit(item_id: str, query: str, docs: List[Document], retrieve_seconds: float,
+                 analyse: Callable[..., Awaitable[str]], synthesise: Callable[..., Awaitable[str]],
+                 semaphore: asyncio.Semaphore) -> dict:
+    timings = {"retrieve": round(retrieve_seconds, 3)}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            answer = await analyse(input_documents=docs, query=query)
+            timings["analyse"] = round(time.perf_counter() - start, 3)
+            mark = time.perf_counter()
+            summary = await synthesise(answer, docs)
+            timings["synthesise"] = round(time.perf_counter() - mark, 3)
+        except Exception as e:
+            return {"id": item_id, "query": query, "status": "failed", "error": f"{type(e).__name__}: {e}",
+                    "timings": timings}
+    timings["total"] = round(sum(timings.values()), 3)
+    return {"id": item_id, "query": query, "status": "done", "answer": answer, "summary": summary,
+            "citations": citations(docs), "timings": timings}
+
+
+async def run_batch_audit(items: Iterator[Tuple[str, str]], out_path: str, store: FAISS,
+                          analyse: Callable[..., Awaitable[str]], synthesise: Callable[..., Awaitable[str]],
+                          k: int = TOP_K, max_concurrency: int = AUDIT_MAX_CONCURRENCY,
+                          search_batch: int = AUDIT_SEARCH_BATCH,
+                          on_result: Optional[Callable[[dict], None]] = None) -> Dict[str, int]:
+    """
+    Audit `items` not already done in `out_path`. Queries are retrieved
+    `search_batch` at a time; the retrieval time recorded per query is its
+    share of the batch's embedding + search.
+    """
+    done = load_checkpoint(out_path)
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+    todo = []
+    for item_id, query in items:
+        if item_id in done:
+            counts["skipped"] += 1
+            continue
+        done.add(item_id)  # duplicate queries are audited once
+        todo.append((item_id, query))
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    with open_results(out_path) as out:
+        for start in range(0, len(todo), search_batch):
+            batch = todo[start:start + search_batch]
+            mark = time.perf_counter()
+            results = batch_search(store, [query for _, query in batch], k=k)
+            per_query = (time.perf_counter() - mark) / len(batch)
+
+            tasks = [_audit(item_id, query, docs, per_query, analyse, synthesise, semaphore)
+                     for (item_id, query), docs in zip(batch, results)]
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()  # each line is a checkpoint
+                counts[result["status"]] += 1
+                if on_result:
+                    on_result(result)
+    return counts
@@ -0,0 +1,230 @@
+# utils/batch_eval.py
+"""
+Concurrent, resumable batch scoring of logged interactions.
+
+Reads a JSONL log (one {"question", "answer", "sources"} record per line, as
+written by chat_app.py) lazily and scores items on a thread pool. An AIMD
+limiter controls how many scorer calls are in flight:
+
+* each success raises the limit additively, up to `max_in_flight`;
+* a rate limit halves it and pauses every worker, honouring Retry-After;
+* transient failures are retried with full-jitter exponential backoff.
+
+Each result is appended to the output JSONL as soon as it is known, which
+doubles as the checkpoint: a rerun skips items already recorded as done and
+retries the ones that failed. `summarise` aggregates the per-metric score
+distributions over the whole output file.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from utils.embedding_executor import _is_transient, _rate_limit_delay
+
+try:
+    from config import EVAL_BATCH_MAX_IN_FLIGHT
+except Exception:
+    EVAL_BATCH_MAX_IN_FLIGHT = 32
+
+METRICS = ("relevance", "completeness", "faithfulness")
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase / multiplicative decrease and a shared cooldown."""
+
+    def __init__(self, max_in_flight: int, min_in_flight: int = 1, clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.limit = float(max_in_flight)
+        self.in_flight = 0
+        self._resume_at = 0.0
+        self._clock = clock
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                delay = self._resume_at - self._clock()
+                if delay <= 0 and self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                self._cond.wait(timeout=delay if delay > 0 else None)
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            self.limit = min(self.max_in_flight, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def on_rate_limit(self, delay: float):
+        with self._cond:
+            self.limit = max(self.min_in_flight, self.limit / 2)
+            self._resume_at = max(self._resume_at, self._clock() + delay)
+
+
+def iter_log(path: str) -> Iterator[Tuple[str, dict]]:
+    """(item_id, record) for each scoreable line; the ID is the record's "id" or its line number."""
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ Skipping malformed line {lineno}")
+                continue
+            if record.get("question") and record.get("answer"):
+                yield str(record.get("id", f"line-{lineno}")), record
+
+
+def load_checkpoint(out_path: str) -> Set[str]:
+    """IDs already scored successfully in an earlier run."""
+    done = set()
+    if os.path.exists(out_path):
+        with open(out_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                if result.get("status") == "done":
+                    done.add(result["id"])
+    return done
+
+
+def open_results(out_path: str):
+    """Open a results JSONL for appending, first terminating a torn last line left by a crash."""
+    if os.path.dirname(out_path):
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    out = open(out_path, "a+", encoding="utf-8")
+    if out.tell():
+        out.seek(out.tell() - 1)
+        if out.read(1) != "\n":
+            out.write("\n")
+    return out
+
+
+class BatchEvaluator:
+    def __init__(self, score_fn: Callable[[str, str, List[Dict]], Dict[str, float]],
+                 max_in_flight: int = EVAL_BATCH_MAX_IN_FLIGHT, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.score_fn = score_fn
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = AdaptiveLimiter(max_in_flight)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.rate_limits = 0
+
+    def _score(self, item_id: str, record: dict) -> dict:
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                with self._lock:
+                    self.calls += 1
+                scores = self.score_fn(record["question"], record["answer"], record.get("sources") or [])
+                self.limiter.on_success()
+                return {"id": item_id, "status": "done", "scores": scores,
+                        "seconds": round(time.perf_counter() - start, 3)}
+            except Exception as e:
+                suggested = _rate_limit_delay(e)
+                if (suggested is None and not _is_transient(e)) or attempt == self.max_retries:
+                    return {"id": item_id, "status": "failed", "error": f"{type(e).__name__}: {e}",
+                            "seconds": round(time.perf_counter() - start, 3)}
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                with self._lock:
+                    self.retries += 1
+                    self.rate_limits += suggested is not None
+                if suggested is not None:
+                    self.limiter.on_rate_limit(max(suggested, backoff))  # pauses every worker
+                    backoff = 0.0
+            finally:
+                self.limiter.release()
+            time.sleep(backoff)  # transient error: back off without holding a slot
+
+    def run(self, items: Iterator[Tuple[str, dict]], out_path: str,
+            on_result: Optional[Callable[[dict], None]] = None) -> Dict[str, int]:
+        """Score `items` not already done in `out_path`, appending each result as it completes."""
+        done = load_checkpoint(out_path)
+        counts = {"done": 0, "failed": 0, "skipped": 0}
+        with open_results(out_path) as out, ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            pending = set()
+
+            def drain(return_when):
+                nonlocal pending
+                finished, pending = wait(pending, return_when=return_when)
+                for future in finished:
+                    result = future.result()
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()  # each line is a checkpoint
+                    counts[result["status"]] += 1
+                    if on_result:
+                        on_result(result)
+
+            for item_id, record in items:
+                if item_id in done:
+                    counts["skipped"] += 1
+                    continue
+                done.add(item_id)  # duplicate IDs in the input are scored once
+                pending.add(pool.submit(self._score, item_id, record))
+                if len(pending) >= 2 * self.max_in_flight:  # bounded read-ahead
+                    drain(FIRST_COMPLETED)
+            while pending:
+                drain(FIRST_COMPLETED)
+        return counts
+
+    def report(self) -> str:
+        return (f"{self.calls} scorer calls, {self.retries} retries ({self.rate_limits} rate limited), "
+                f"final concurrency limit {self.limiter.limit:.1f}")
+
+
+def summarise(out_path: str, bins: int = 10) -> dict:
+    """Per-metric distribution (mean, percentiles, histogram over [0, 1]) of the done results."""
+    latest: Dict[str, dict] = {}  # a resumed run may have retried earlier failures
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if latest.get(result["id"], {}).get("status") != "done":
+                latest[result["id"]] = result
+
+    values: Dict[str, List[float]] = {m: [] for m in METRICS}
+    failed = 0
+    for result in latest.values():
+        if result.get("status") != "done":
+            failed += 1
+            continue
+        for m in METRICS:
+            try:
+                values[m].append(float(result["scores"][m]))
+            except (KeyError, TypeError, ValueError):
+                pass
+    summary = {"results": len(latest), "failed": failed, "metrics": {}}
+    for m, vals in values.items():
+        if not vals:
+            continue
+        arr = np.asarray(vals)
+        hist, _ = np.histogram(np.clip(arr, 0, 1), bins=bins, range=(0, 1))
+        summary["metrics"][m] = {
+            "count": len(vals), "mean": round(float(arr.mean()), 4), "min": float(arr.min()),
+            "p10": float(np.percentile(arr, 10)), "p50": float(np.percentile(arr, 50)),
+            "p90": float(np.percentile(arr, 90)), "max": float(arr.max()), "histogram": hist.tolist(),
+        }
+    return summary
@@ -0,0 +1,92 @@
+# utils/bm25.py
+"""
+Sparse BM25 keyword index stored next to the FAISS files.
+
+Postings (term → [(doc, tf), ...]) are built from the docstore when the index
+is saved, so a keyword lookup only touches the posting lists of the query
+terms instead of scanning every candidate's text.
+"""
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+BM25_FILE = "bm25.json"
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which "
+    "with how why who when where does do did their there these those than into about over under".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, doc_ids: List[str], doc_len: List[int], postings: Dict[str, List[Tuple[int, int]]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.doc_ids = doc_ids
+        self.doc_len = doc_len
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avgdl = sum(doc_len) / len(doc_len) if doc_len else 0.0
+
+    @classmethod
+    def build(cls, docs: Iterable[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index (doc_id, text) pairs."""
+        doc_ids, doc_len = [], []
+        postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        for doc_id, text in docs:
+            idx = len(doc_ids)
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_len.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append((idx, tf))
+        return cls(doc_ids, doc_len, dict(postings), k1, b)
+
+    @classmethod
+    def from_store(cls, store: FAISS) -> "BM25Index":
+        ids = list(store.index_to_docstore_id.values())
+        return cls.build((i, store.docstore.search(i).page_content) for i in ids)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """Top-k (doc_id, score); cost is proportional to the query terms' posting lists."""
+        n = len(self.doc_ids)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for idx, tf in plist:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[idx] / self.avgdl)
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(self.doc_ids[idx], score) for idx, score in top]
+
+    def to_dict(self) -> dict:
+        return {"k1": self.k1, "b": self.b, "doc_ids": self.doc_ids, "doc_len": self.doc_len,
+                "postings": self.postings}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BM25Index":
+        postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return cls(data["doc_ids"], data["doc_len"], postings, data["k1"], data["b"])
+
+    @classmethod
+    def load(cls, index_dir: str):
+        """Load the sidecar from an index directory, or None for indexes built without one."""
+        path = os.path.join(index_dir, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
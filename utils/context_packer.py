@@ -0,0 +1,124 @@
+# utils/context_packer.py
+"""
+Pack retrieved chunks into a token-budgeted prompt context.
+
+Chunks are split with 100–200 characters of overlap, so neighbours from the
+same page repeat text, and retrieval often returns near-identical passages.
+Given documents ranked best first, `pack_context`:
+
+1. merges chunks from the same source + page whose texts overlap or contain
+   one another into a single passage, ranked by its best chunk;
+2. drops passages whose word shingles are near-duplicates of a passage
+   already kept;
+3. keeps passages in relevance order while they fit in `max_tokens`.
+
+The packed documents keep their source / page metadata, so the analyst's
+`[p.X | file]` citation headers still apply.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from utils.token_accounting import TOKENS_KEY, count_tokens as default_count_tokens, doc_tokens
+
+try:
+    from config import CONTEXT_MAX_TOKENS, CONTEXT_NEAR_DUP_THRESHOLD
+except Exception:
+    CONTEXT_MAX_TOKENS = 3000
+    CONTEXT_NEAR_DUP_THRESHOLD = 0.8
+
+MIN_OVERLAP_CHARS = 20
+_WORD = re.compile(r"\w+")
+
+
+def merge_overlapping(a: str, b: str, min_overlap: int = MIN_OVERLAP_CHARS) -> Optional[str]:
+    """`a` and `b` joined on their shared overlap (either order), or None if they don't overlap."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    for first, second in ((a, b), (b, a)):
+        # earliest position where a suffix of `first` starts `second` = longest overlap
+        head = second[:min_overlap]
+        i = first.find(head, max(0, len(first) - len(second)))
+        while i != -1:
+            if second.startswith(first[i:]):
+                return first[:i] + second
+            i = first.find(head, i + 1)
+    return None
+
+
+def _shingles(text: str, n: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _similar(a: Set, b: Set) -> float:
+    """Overlap of two shingle sets relative to the smaller one (catches contained passages too)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _merge_group(docs: List[Tuple[int, Document]]) -> List[Tuple[int, Document, int]]:
+    """Merge one source/page group; returns (best rank, passage, chunks merged)."""
+    passages: List[List] = []  # [rank, text, metadata, count]
+    for rank, doc in docs:
+        text = doc.page_content.strip()
+        for passage in passages:
+            merged = merge_overlapping(passage[1], text)
+            if merged is not None:
+                passage[1] = merged
+                passage[3] += 1
+                break
+        else:
+            passages.append([rank, text, doc.metadata, 1])
+
+    # Merging can make earlier passages overlap each other; repeat until stable
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(passages)):
+            for j in range(i + 1, len(passages)):
+                merged = merge_overlapping(passages[i][1], passages[j][1])
+                if merged is not None:
+                    passages[i] = [min(passages[i][0], passages[j][0]), merged, passages[i][2],
+                                   passages[i][3] + passages[j][3]]
+                    del passages[j]
+                    changed = True
+                    break
+            if changed:
+                break
+    return [(rank, Document(page_content=text, metadata=meta), count) for rank, text, meta, count in passages]
+
+
+def pack_context(docs: List[Document], max_tokens: int = CONTEXT_MAX_TOKENS,
+                 near_dup_threshold: float = CONTEXT_NEAR_DUP_THRESHOLD,
+                 count_tokens: Optional[Callable[[str], int]] = None) -> List[Document]:
+    """Merge, de-duplicate and budget `docs` (best first); returns passages best first."""
+    count = count_tokens or default_count_tokens
+    groups: Dict[Tuple, List[Tuple[int, Document]]] = {}
+    for rank, doc in enumerate(docs or []):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append((rank, doc))
+
+    passages = sorted((p for group in groups.values() for p in _merge_group(group)), key=lambda p: p[0])
+
+    packed, kept_shingles, used = [], [], 0
+    for _, doc, merged in passages:
+        shingles = _shingles(doc.page_content)
+        if any(_similar(shingles, other) >= near_dup_threshold for other in kept_shingles):
+            continue
+        # an unmerged chunk's count was recorded at indexing time (see utils.token_accounting)
+        tokens = doc_tokens(doc) if merged == 1 and count_tokens is None else count(doc.page_content)
+        if used + tokens > max_tokens:
+            continue  # a shorter, less relevant passage may still fit
+        if merged > 1:
+            doc.metadata = dict(doc.metadata, merged_chunks=merged)
+            if TOKENS_KEY in doc.metadata:
+                doc.metadata[TOKENS_KEY] = tokens  # the first chunk's count no longer applies
+        packed.append(doc)
+        kept_shingles.append(shingles)
+        used += tokens
+    return packed
@@ -0,0 +1,124 @@
+# utils/embedding_backends.py
+"""
+Pluggable embedding backends.
+
+* "openai": `OpenAIEmbeddings` (network; batched and rate-limited by
+  `utils.embedding_executor` when building).
+* "local": a sentence-transformers model on CPU. Texts are sorted by length
+  and packed into batches under a padded-token budget (`plan_length_batches`),
+  so short chunks aren't padded to the longest one in the corpus. Torch uses
+  `threads` cores, and vectors are L2-normalised. A small model such as
+  all-MiniLM-L6-v2 embeds a query in a few milliseconds, with no network
+  round trip.
+
+`save_index` records the backend, model and dimension in index_meta.json.
+`embeddings_for_index` reads them back, so `load_vectorstore` always queries
+with the embedder the index was built with.
+"""
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from config import (
+        EMBEDDING_BACKEND, EMBEDDING_THREADS, LOCAL_EMBED_BATCH_TOKENS, LOCAL_EMBED_MAX_BATCH,
+        LOCAL_EMBEDDING_MODEL, OPENAI_EMBEDDING_MODEL,
+    )
+except Exception:
+    EMBEDDING_BACKEND = "openai"
+    OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+    LOCAL_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_THREADS = os.cpu_count() or 1
+    LOCAL_EMBED_BATCH_TOKENS = 16384
+    LOCAL_EMBED_MAX_BATCH = 128
+
+EMBEDDING_BACKENDS = ("openai", "local")
+DEFAULT_MODELS = {"openai": OPENAI_EMBEDDING_MODEL, "local": LOCAL_EMBEDDING_MODEL}
+
+
+def plan_length_batches(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Group text indices, shortest first, so each batch's padded size
+    (count × longest member) stays within `max_batch_tokens`.
+    """
+    batches, current, longest = [], [], 0
+    for i in np.argsort(lengths, kind="stable"):
+        n = max(1, int(lengths[i]))
+        if current and (len(current) >= max_batch_size or (len(current) + 1) * max(longest, n) > max_batch_tokens):
+            batches.append(current)
+            current, longest = [], 0
+        current.append(int(i))
+        longest = max(longest, n)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class LocalEmbeddings(Embeddings):
+    """sentence-transformers model on CPU with length-bucketed batches and normalised output."""
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL, threads: Optional[int] = EMBEDDING_THREADS,
+                 max_batch_tokens: int = LOCAL_EMBED_BATCH_TOKENS, max_batch_size: int = LOCAL_EMBED_MAX_BATCH,
+                 device: str = "cpu"):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError("The local embedding backend needs `pip install sentence-transformers`.") from e
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        self.model = model  # name, as used for cache keys
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self._model = SentenceTransformer(model, device=device)
+        self.dimension = self._model.get_sentence_embedding_dimension()
+
+    def _encode(self, texts: List[str], batch_size: int) -> np.ndarray:
+        return self._model.encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                                  convert_to_numpy=True, show_progress_bar=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # chars / 4 is close enough to word-piece counts for bucketing
+        lengths = [min(len(t) // 4 + 2, self._model.max_seq_length) for t in texts]
+        out = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for batch in plan_length_batches(lengths, self.max_batch_tokens, self.max_batch_size):
+            out[batch] = self._encode([texts[i] for i in batch], batch_size=len(batch))
+        return out.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text], batch_size=1)[0].tolist()
+
+
+def make_embeddings(backend: str = EMBEDDING_BACKEND, model: Optional[str] = None, **kwargs) -> Embeddings:
+    """Embedder for `backend` ("openai" or "local"); `model` defaults to the backend's configured model."""
+    model = model or DEFAULT_MODELS.get(backend)
+    if backend == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=model, **kwargs)
+    if backend == "local":
+        return LocalEmbeddings(model, **kwargs)
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {EMBEDDING_BACKENDS}")
+
+
+def index_embedding_key(meta: dict) -> Tuple[str, str]:
+    """(backend, model) an index was built with, from its index_meta.json."""
+    backend = meta.get("embedding_backend", "openai")
+    return backend, meta.get("embedding_model") or DEFAULT_MODELS.get(backend)
+
+
+def embeddings_for_index(meta: dict, **kwargs) -> Embeddings:
+    """
+    The embedder an index was built with, from its index_meta.json. Indexes
+    saved before backends were recorded are OpenAI ones.
+    """
+    backend, model = index_embedding_key(meta)
+    embeddings = make_embeddings(backend, model, **kwargs)
+    dim, built_dim = getattr(embeddings, "dimension", None), meta.get("embedding_dim")
+    if dim and built_dim and dim != built_dim:
+        raise ValueError(f"Index was built with {built_dim}-d embeddings but {meta.get('embedding_model')} "
+                         f"produces {dim}-d vectors")
+    return embeddings
@@ -0,0 +1,122 @@
+# utils/embedding_cache.py
+"""
+Content-addressed, on-disk cache of chunk embeddings.
+
+Vectors are keyed by sha256(embedding model + normalised chunk text) and stored
+as float32 blobs in SQLite, so rebuilding an index only pays for chunks whose
+text (or embedding model) actually changed.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from config import EMBEDDING_CACHE_PATH
+except Exception:
+    EMBEDDING_CACHE_PATH = ".cache/embeddings.sqlite"
+
+
+def normalise_text(text: str) -> str:
+    """Unicode-normalise and collapse whitespace so trivial reflows share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalise_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite store of key → float32 vector, safe to share between threads."""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):  # stay under SQLite's variable limit
+                batch = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self.bytes_read += len(blob)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]):
+        rows = []
+        for key, vector in items:
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, len(blob) // 4, blob))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+            self.bytes_written += sum(len(r[2]) for r in rows)
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (
+            f"Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+            f"{self.bytes_read / 1024:.1f} KB read, {self.bytes_written / 1024:.1f} KB written"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrap an `Embeddings` instance so `embed_documents` only calls the model for
+    texts missing from the cache. Duplicate texts within a call are embedded once.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model_name: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.model_name, t) for t in texts]
+        found = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            # Round through float32 so fresh and cached builds are bit-identical
+            vectors = np.asarray(vectors, dtype=np.float32).tolist()
+            fresh = list(zip(missing.keys(), vectors))
+            self.cache.put_many(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,161 @@
+# utils/embedding_executor.py
+"""
+Concurrent, rate-limit-aware embedding executor.
+
+`ConcurrentEmbeddings` wraps any `Embeddings` and splits `embed_documents`
+calls into token-bounded batches (counted with tiktoken), keeps up to
+`max_in_flight` batches in flight on a thread pool, and retries HTTP 429s
+and transient failures (5xx, timeouts, dropped connections) with jittered
+exponential backoff. A 429 on one batch pauses the whole executor
+(honouring Retry-After when the server sends one) so the other threads
+don't keep hammering the rate limit; a transient failure only backs off
+its own batch. Results come back in input order.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from utils.token_accounting import get_encoder
+
+try:
+    from config import EMBED_MAX_BATCH_TOKENS, EMBED_MAX_IN_FLIGHT
+except Exception:
+    EMBED_MAX_IN_FLIGHT = 4
+    EMBED_MAX_BATCH_TOKENS = 20000
+
+MAX_BATCH_SIZE = 512  # inputs per request; the API allows up to 2048
+
+
+def tiktoken_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    enc = get_encoder(encoding_name)
+    if enc is None:
+        raise RuntimeError(f"tiktoken encoding {encoding_name!r} is unavailable")
+    return lambda text: len(enc.encode_ordinary(text))
+
+
+def plan_batches(texts: List[str], count_tokens: Callable[[str], int], max_batch_tokens: int,
+                 max_batch_size: int = MAX_BATCH_SIZE) -> List[List[int]]:
+    """Group text indices into contiguous batches under the token and size limits."""
+    batches, current, current_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        n = count_tokens(text)
+        if current and (current_tokens + n > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _rate_limit_delay(exc: Exception) -> Optional[float]:
+    """Return the server-suggested delay (0.0 if none) for a 429, else None."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429:
+        return None
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except Exception:
+        return 0.0
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Server errors, timeouts and connection failures, which are worth retrying."""
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None:
+        return status >= 500
+    name = type(exc).__name__
+    return isinstance(exc, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name
+
+
+class ConcurrentEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+                 max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS, max_batch_size: int = MAX_BATCH_SIZE,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.embeddings = embeddings
+        self.max_in_flight = max_in_flight
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._count_tokens = count_tokens
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self.chunks = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limits = 0
+        self.seconds = 0.0
+
+    @property
+    def count_tokens(self) -> Callable[[str], int]:
+        if self._count_tokens is None:
+            self._count_tokens = tiktoken_counter()
+        return self._count_tokens
+
+    def _wait_for_cooldown(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _call(self, fn, arg):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_cooldown()
+            try:
+                with self._lock:
+                    self.requests += 1
+                return fn(arg)
+            except Exception as e:
+                suggested = _rate_limit_delay(e)
+                if (suggested is None and not _is_transient(e)) or attempt == self.max_retries:
+                    raise
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                with self._lock:
+                    self.retries += 1
+                    if suggested is not None:
+                        self.rate_limits += 1
+                        self._resume_at = max(self._resume_at, time.monotonic() + max(suggested, backoff))
+                if suggested is not None:
+                    print(f"[Embeddings] Rate limited; backing off {max(suggested, backoff):.1f}s "
+                          f"(attempt {attempt + 1})")
+                else:
+                    print(f"[Embeddings] {type(e).__name__}; retrying in {backoff:.1f}s (attempt {attempt + 1})")
+                    time.sleep(backoff)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = plan_batches(texts, self.count_tokens, self.max_batch_tokens, self.max_batch_size)
+        embed = lambda idx: self._call(self.embeddings.embed_documents, [texts[i] for i in idx])
+        if len(batches) == 1 or self.max_in_flight <= 1:
+            results = [embed(b) for b in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+                results = list(pool.map(embed, batches))  # map preserves input order
+        with self._lock:
+            self.chunks += len(texts)
+            self.seconds += time.perf_counter() - start
+        return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call(self.embeddings.embed_query, text)
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Embedded {self.chunks} chunks in {self.seconds:.1f}s ({self.chunks_per_sec:.1f} chunks/sec, "
+            f"{self.requests} requests, {self.retries} retries, {self.rate_limits} rate-limited)"
+        )
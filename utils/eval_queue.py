@@ -0,0 +1,144 @@
+# utils/eval_queue.py
+"""
+Background evaluation of answers, off the request path.
+
+`submit` only enqueues; a small pool of worker threads calls the GPT scorer
+and records each result in memory (for the UI to poll via /scores/<id>) and
+in an append-only JSONL evaluation log.
+
+Scoring must never starve answering, so under load it is shed rather than queued:
+
+* `sample_rate` of answers are scored normally;
+* once the queue is half full, only `overload_sample_rate` of them are;
+* when the queue is full, new answers are dropped.
+
+Skipped and dropped answers are recorded too, so the log shows what was shed.
+"""
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    from config import EVAL_LOG_PATH, EVAL_MAX_QUEUE, EVAL_OVERLOAD_SAMPLE_RATE, EVAL_SAMPLE_RATE, EVAL_WORKERS
+except Exception:
+    EVAL_WORKERS = 2
+    EVAL_MAX_QUEUE = 32
+    EVAL_SAMPLE_RATE = 1.0
+    EVAL_OVERLOAD_SAMPLE_RATE = 0.25
+    EVAL_LOG_PATH = "outputs/evaluations.jsonl"
+
+PENDING, DONE, FAILED, SKIPPED, DROPPED = "pending", "done", "failed", "skipped", "dropped"
+
+
+def _default_scorer(question: str, answer: str, sources: List[Dict]) -> Dict[str, float]:
+    # Imported lazily: the scorer module builds an OpenAI client at import time
+    from utils.score_responses import score_response_gpt
+    return score_response_gpt(question, answer, sources)
+
+
+class EvaluationQueue:
+    def __init__(self, score_fn: Callable[[str, str, List[Dict]], Dict[str, float]] = _default_scorer,
+                 workers: int = EVAL_WORKERS, max_queue: int = EVAL_MAX_QUEUE,
+                 sample_rate: float = EVAL_SAMPLE_RATE, overload_sample_rate: float = EVAL_OVERLOAD_SAMPLE_RATE,
+                 log_path: Optional[str] = EVAL_LOG_PATH, max_results: int = 1000, rng: random.Random = None):
+        self.score_fn = score_fn
+        self.workers = workers
+        self.max_queue = max_queue
+        self.sample_rate = sample_rate
+        self.overload_sample_rate = overload_sample_rate
+        self.log_path = log_path
+        self.max_results = max_results
+        self._rng = rng or random.Random()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._results: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self.counts = {DONE: 0, FAILED: 0, SKIPPED: 0, DROPPED: 0}
+
+    def _ensure_workers(self):
+        # Caller holds the lock
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"eval-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _record(self, eval_id: str, record: dict, log: bool = True):
+        with self._lock:
+            self._results[eval_id] = record
+            self._results.move_to_end(eval_id)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            if record["status"] in self.counts:
+                self.counts[record["status"]] += 1
+            if log and self.log_path:
+                if os.path.dirname(self.log_path):
+                    os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(record, id=eval_id)) + "\n")
+
+    def submit(self, question: str, answer: str, sources: List[Dict]) -> str:
+        """Queue an answer for scoring and return its evaluation ID immediately."""
+        eval_id = uuid.uuid4().hex
+        record = {"timestamp": datetime.now().isoformat(), "question": question, "answer": answer}
+        rate = self.sample_rate if self._queue.qsize() < self.max_queue // 2 else self.overload_sample_rate
+        if self._rng.random() >= rate:
+            self._record(eval_id, dict(record, status=SKIPPED))
+            return eval_id
+        with self._lock:
+            self._ensure_workers()
+        try:
+            self._record(eval_id, dict(record, status=PENDING), log=False)
+            self._queue.put_nowait((eval_id, record, sources))
+        except queue.Full:
+            self._record(eval_id, dict(record, status=DROPPED))
+        return eval_id
+
+    def _work(self):
+        while True:
+            eval_id, record, sources = self._queue.get()
+            start = time.perf_counter()
+            try:
+                scores = self.score_fn(record["question"], record["answer"], sources)
+                result = dict(record, status=DONE, scores=scores)
+            except Exception as e:
+                print(f"❌ Background evaluation failed: {e}")
+                result = dict(record, status=FAILED, error=str(e))
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            self._record(eval_id, result)
+            self._queue.task_done()
+
+    def status(self, eval_id: str) -> Optional[dict]:
+        """Latest record for an evaluation (None if unknown or evicted)."""
+        with self._lock:
+            record = self._results.get(eval_id)
+            return dict(record) if record else None
+
+    def join(self):
+        """Block until every queued evaluation has finished (used by tests and scripts)."""
+        self._queue.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts, queued=self._queue.qsize(), workers=len(self._threads))
+
+
+_default: Optional[EvaluationQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_eval_queue() -> EvaluationQueue:
+    """Process-wide queue, started on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = EvaluationQueue()
+        return _default
@@ -0,0 +1,100 @@
+# utils/faiss_index.py
+"""
+FAISS index families for the vectorstore.
+
+    flat – exact L2 search (what FAISS.from_embeddings builds); cost grows with the corpus
+    hnsw – graph-based ANN; params M, efConstruction, efSearch; no deletions
+    ivf  – inverted lists over trained k-means centroids; params nlist, nprobe
+
+The parameters of the index actually built are recorded in index_meta.json by
+`save_index` (via `describe_index`), and `load_vectorstore` re-applies the
+search-time ones (efSearch / nprobe) when it loads the index.
+"""
+from typing import Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+try:
+    from config import FAISS_INDEX_PARAMS, FAISS_INDEX_TYPE
+except Exception:
+    FAISS_INDEX_TYPE = "flat"
+    FAISS_INDEX_PARAMS = {}
+
+INDEX_TYPES = ("flat", "hnsw", "ivf")
+DEFAULT_PARAMS = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 80, "efSearch": 64},
+    "ivf": {"nlist": 256, "nprobe": 16},
+}
+# FAISS wants ~39 training points per centroid
+IVF_POINTS_PER_CENTROID = 39
+
+
+def index_spec(index_type: str = FAISS_INDEX_TYPE, **params) -> dict:
+    """Full spec for an index family: {"type": ..., **defaults, **params} (None params ignored)."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}; expected one of {INDEX_TYPES}")
+    given = {k: v for k, v in params.items() if v is not None}
+    return {"type": index_type, **DEFAULT_PARAMS[index_type], **given}
+
+
+def training_size(spec: Optional[dict]) -> int:
+    """Vectors to collect before the index can be created (0 if it needs no training)."""
+    if not spec or spec["type"] != "ivf":
+        return 0
+    return spec["nlist"] * IVF_POINTS_PER_CENTROID
+
+
+def make_index(dim: int, spec: dict, training_vectors: Optional[np.ndarray] = None) -> faiss.Index:
+    if spec["type"] == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, spec["M"])
+        index.hnsw.efConstruction = spec["efConstruction"]
+    elif spec["type"] == "ivf":
+        # Never ask for more centroids than the training data can support
+        n = 0 if training_vectors is None else len(training_vectors)
+        nlist = max(1, min(spec["nlist"], n // IVF_POINTS_PER_CENTROID))
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, nlist)
+        index.train(np.ascontiguousarray(training_vectors, dtype=np.float32))
+    else:
+        index = faiss.IndexFlatL2(dim)
+    apply_search_params(index, spec)
+    return index
+
+
+def apply_search_params(index: faiss.Index, spec: Optional[dict]):
+    """Set query-time knobs recorded in the spec on a (possibly freshly loaded) index."""
+    if not spec:
+        return
+    if isinstance(index, faiss.IndexHNSW) and spec.get("efSearch"):
+        index.hnsw.efSearch = int(spec["efSearch"])
+    elif isinstance(index, faiss.IndexIVF) and spec.get("nprobe"):
+        index.nprobe = min(int(spec["nprobe"]), index.nlist)
+
+
+def describe_index(index: faiss.Index) -> dict:
+    """Spec of an existing index, as recorded in index_meta.json."""
+    if isinstance(index, faiss.IndexHNSW):
+        return {"type": "hnsw", "M": index.hnsw.nb_neighbors(1), "efConstruction": index.hnsw.efConstruction,
+                "efSearch": index.hnsw.efSearch}
+    if isinstance(index, faiss.IndexIVF):
+        return {"type": "ivf", "nlist": index.nlist, "nprobe": index.nprobe}
+    return {"type": "flat"}
+
+
+def supports_delete(spec: Optional[dict]) -> bool:
+    """
+    Whether `FAISS.delete` keeps the store consistent. Only flat indexes
+    qualify: HNSW can't remove vectors, and IVF keeps the removed ids' gaps,
+    while LangChain renumbers `index_to_docstore_id` as 0..n-1 after a delete.
+    """
+    return not spec or spec["type"] == "flat"
+
+
+def empty_store(embeddings: Embeddings, spec: dict, dim: int,
+                training_vectors: Optional[np.ndarray] = None) -> FAISS:
+    """LangChain FAISS wrapper around a fresh index of the requested family."""
+    return FAISS(embeddings, make_index(dim, spec, training_vectors), InMemoryDocstore(), {})
@@ -0,0 +1,55 @@
+# utils/hybrid.py
+"""
+Hybrid retrieval: fuse dense (FAISS) and sparse (BM25) rankings with
+weighted reciprocal-rank fusion.
+
+Documents are identified by `metadata["chunk_id"]`, which `load_vectorstore`
+guarantees equals the docstore ID, so sparse-only hits can be fetched
+straight from the docstore.
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+
+try:
+    from config import HYBRID_DENSE_WEIGHT, HYBRID_SPARSE_WEIGHT, RRF_K
+except Exception:
+    HYBRID_DENSE_WEIGHT = 1.0
+    HYBRID_SPARSE_WEIGHT = 1.0
+    RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], weights: Optional[Sequence[float]] = None,
+                           k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(id) = Σ weight / (k + rank). Best first."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += weight / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def fuse_with_bm25(store: FAISS, query: str, dense_docs: List[Document], k: int, fetch_k: int = 20,
+                   dense_weight: float = HYBRID_DENSE_WEIGHT,
+                   sparse_weight: float = HYBRID_SPARSE_WEIGHT,
+                   allowed: Optional[Set[str]] = None) -> List[Document]:
+    """
+    Re-rank `dense_docs` (best first) together with the store's BM25 top `fetch_k`.
+    Returns `dense_docs[:k]` unchanged when the store has no BM25 sidecar.
+    With `allowed` (chunk IDs of a metadata filter), sparse hits outside it are skipped.
+    """
+    bm25 = getattr(store, "bm25", None)
+    if bm25 is None:
+        return dense_docs[:k]
+    by_id = {d.metadata["chunk_id"]: d for d in dense_docs}
+    if allowed is None:
+        sparse_ids = [doc_id for doc_id, _ in bm25.search(query, fetch_k)]
+    else:
+        # postings are unfiltered, so look deeper before dropping out-of-filter hits
+        sparse_ids = [doc_id for doc_id, _ in bm25.search(query, fetch_k + len(bm25.doc_ids) - len(allowed))
+                      if doc_id in allowed][:fetch_k]
+    fused = reciprocal_rank_fusion([list(by_id), sparse_ids], [dense_weight, sparse_weight])
+    return [by_id.get(doc_id) or store.docstore.search(doc_id) for doc_id, _ in fused[:k]]
@@ -0,0 +1,97 @@
+# utils/index_manifest.py
+"""
+Source manifest for incremental index builds.
+
+The manifest lives next to the FAISS files and records, for every source file,
+its content fingerprint and the docstore IDs of the chunks it produced, plus
+the build parameters. `plan_update` compares it with the current sources so the
+builder only re-embeds new/changed files and deletes chunks of removed ones.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, NamedTuple
+
+MANIFEST_FILE = "manifest.json"
+
+
+class UpdatePlan(NamedTuple):
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    unchanged: List[str]
+
+    @property
+    def is_noop(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def stale_ids(self, manifest: dict) -> List[str]:
+        """Docstore IDs that must be deleted before re-adding changed files."""
+        files = manifest.get("files", {})
+        return [cid for src in self.changed + self.removed for cid in files[src]["chunk_ids"]]
+
+
+def source_key(path: str) -> str:
+    return os.path.abspath(path)
+
+
+def fingerprint_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_entry(path: str, chunk_ids: List[str], sha256: str = None) -> dict:
+    st = os.stat(path)
+    return {
+        "sha256": sha256 or fingerprint_file(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "chunk_ids": chunk_ids,
+    }
+
+
+def chunk_id(key: str, sha256: str, i: int) -> str:
+    """Deterministic docstore ID of the i-th chunk of one version of one source file."""
+    prefix = hashlib.sha256(f"{key}\x00{sha256}".encode("utf-8")).hexdigest()[:16]
+    return f"{prefix}-{i:05d}"
+
+
+def chunk_ids_for(key: str, sha256: str, n: int) -> List[str]:
+    return [chunk_id(key, sha256, i) for i in range(n)]
+
+
+def load_manifest(index_dir: str) -> dict:
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def plan_update(manifest: dict, src_paths: List[str]) -> UpdatePlan:
+    """
+    Classify sources against the manifest. Files whose size and mtime match are
+    trusted without re-hashing; otherwise the content hash decides.
+    """
+    known: Dict[str, dict] = manifest.get("files", {})
+    added, changed, unchanged = [], [], []
+    seen = set()
+    for p in src_paths:
+        key = source_key(p)
+        seen.add(key)
+        entry = known.get(key)
+        if entry is None:
+            added.append(key)
+            continue
+        st = os.stat(p)
+        if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+            unchanged.append(key)
+        elif fingerprint_file(p) == entry["sha256"]:
+            unchanged.append(key)
+        else:
+            changed.append(key)
+    removed = [k for k in known if k not in seen]
+    return UpdatePlan(added, changed, removed, unchanged)
@@ -0,0 +1,186 @@
+# utils/index_registry.py
+"""
+Process-wide registry of loaded FAISS indexes.
+
+Loading an index unpickles the whole docstore, so it should happen once per
+process rather than once per query. The registry keys each index by its
+absolute path, remembers the on-disk version it loaded, and reloads in the
+background of a single caller when `save_index` publishes a new version.
+Callers that arrive while a reload is in progress keep getting the previous
+store, so in-flight queries are never blocked by a rebuild; a reload that
+fails, or never loads a consistent version, also leaves the previous store
+in place.
+
+Stores handed out here are shared between threads and must be treated as
+read-only: do not call `add_*`, `delete` or `merge_from` on them.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import FAISS
+from langchain_core.pydantic_v1 import Field
+
+from utils.metadata_index import filtered_search, query_constraints
+from utils.vectorstore import VECTORSTORE_PATH, index_version, load_vectorstore
+
+
+class _Entry:
+    """Current (store, version) pair for one path, plus its reload lock."""
+
+    def __init__(self):
+        self.current = None          # (store, version), swapped as one reference
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+
+class IndexRegistry:
+    def __init__(self, loader: Callable[[str], FAISS] = load_vectorstore, check_interval: float = 2.0):
+        """
+        Args:
+            loader: Function that loads a store from a directory.
+            check_interval: Seconds between on-disk version checks per index.
+        """
+        self._loader = loader
+        self._check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _entry(self, key: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def get(self, path: str = VECTORSTORE_PATH) -> FAISS:
+        """Return the shared store for `path`, loading or hot-swapping it if needed."""
+        key = os.path.abspath(path)
+        entry = self._entry(key)
+        current = entry.current
+        if current is not None and time.monotonic() - entry.checked_at < self._check_interval:
+            return current[0]
+
+        if current is None:
+            entry.lock.acquire()  # nothing to serve yet, so wait for the first load
+        elif not entry.lock.acquire(blocking=False):
+            return current[0]     # another thread is reloading; keep serving the old version
+        try:
+            return self._refresh(key, entry)
+        finally:
+            entry.lock.release()
+
+    def version(self, path: str = VECTORSTORE_PATH) -> Optional[str]:
+        """Version of the store currently served for `path` (None if not loaded)."""
+        entry = self._entries.get(os.path.abspath(path))
+        return entry.current[1] if entry and entry.current else None
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop cached stores so the next `get` reloads from disk."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+    def _refresh(self, key: str, entry: _Entry) -> FAISS:
+        entry.checked_at = time.monotonic()
+        try:
+            version = index_version(key)
+            if entry.current is not None and entry.current[1] == version:
+                return entry.current[0]
+            store, version = self._load(key, version)
+        except Exception as e:
+            if entry.current is None:
+                raise  # nothing to fall back on
+            # Keep serving the loaded version; the next check retries
+            print(f"⚠️ [IndexRegistry] Reload of {key} failed, still serving version {entry.current[1]}: {e}")
+            return entry.current[0]
+
+        store.index_version = version
+        entry.current = (store, version)
+        self.loads += 1
+        print(f"[IndexRegistry] Loaded {key} (version {version})")
+        return store
+
+    def _load(self, key: str, version: str):
+        """Load `key` and check it is the complete `version`; raise if it never settles."""
+        for attempt in range(3):
+            store = self._loader(key)
+            meta = getattr(store, "index_meta", {})
+            # Versioned indexes load one directory, named in their metadata; older
+            # in-place indexes are checked against the on-disk version after the load
+            loaded = meta.get("version") or index_version(key)
+            expected = meta.get("ntotal")
+            if loaded == version and (expected is None or expected == store.index.ntotal):
+                return store, version
+            # A writer published a new version while we were reading; load again.
+            version = index_version(key)
+            time.sleep(0.05 * (attempt + 1))
+        raise RuntimeError(f"index kept changing while loading (last version {version})")
+
+
+registry = IndexRegistry()
+
+
+def get_vectorstore(path: str = VECTORSTORE_PATH) -> FAISS:
+    """Shared, read-only FAISS store for `path` from the process-wide registry."""
+    return registry.get(path)
+
+
+class RegistryRetriever(BaseRetriever):
+    """
+    Retriever that resolves the current store from the registry on every query,
+    so long-lived chains follow index rebuilds without being reconstructed.
+    Page / filename clues in the query restrict the search to matching chunks
+    (see `utils.metadata_index`).
+    """
+
+    path: str = VECTORSTORE_PATH
+    search_type: str = "similarity"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        store = get_vectorstore(self.path)
+        metadata_index = getattr(store, "metadata_index", None)
+        ids = metadata_index.select_for_query(query) if metadata_index is not None else None
+        if ids is not None:
+            if len(ids):
+                # page / filename clues are applied inside the search, so k hits
+                # always come from the requested page or report; search type and
+                # threshold behave as they do unfiltered
+                kw = self.search_kwargs
+                return filtered_search(store, query, ids, k=kw.get("k", 4), search_type=self.search_type,
+                                       score_threshold=kw.get("score_threshold"), fetch_k=kw.get("fetch_k", 20),
+                                       lambda_mult=kw.get("lambda_mult", 0.5))
+            print(f"[Filter] No chunks match {query_constraints(query)}; searching the whole index.")
+        retriever = store.as_retriever(search_type=self.search_type, search_kwargs=self.search_kwargs)
+        return retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+class RegistryEmbeddings(Embeddings):
+    """
+    The current store's embedding function, resolved from the registry on
+    every call, for components created once at startup (answer cache, topic
+    tracker) that must embed like the index they are used with after a rebuild.
+    """
+
+    def __init__(self, path: str = VECTORSTORE_PATH):
+        self.path = path
+
+    def _current(self) -> Embeddings:
+        return get_vectorstore(self.path).embedding_function
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._current().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._current().embed_query(text)
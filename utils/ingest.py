@@ -0,0 +1,166 @@
+# utils/ingest.py
+"""
+Streaming, bounded-memory ingestion: page → chunk → embedding batch → index.add.
+
+Every stage is a generator, and the embedding stage runs behind a bounded
+queue, so at most `max_pending_batches` batches of chunks (plus the PDF page
+ranges being parsed) are held in memory at any time. Apart from the FAISS
+index and docstore themselves, peak memory no longer grows with corpus size.
+(IVF indexes are the exception: see `build_vectorstore_streaming`.)
+"""
+import queue
+import threading
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+from utils.faiss_index import empty_store, index_spec, training_size
+from utils.parallel_loader import LOADER_WORKERS, PAGES_PER_TASK, count_pages, parse_task, plan_tasks, process_pool
+
+_DONE = object()
+
+
+def iter_pdf_pages(paths: Sequence[str], backend: str = "pymupdf", workers: int = LOADER_WORKERS,
+                   pages_per_task: int = PAGES_PER_TASK, max_pending_tasks: Optional[int] = None) -> Iterator[Document]:
+    """
+    Yield pages in input order. With several workers, at most `max_pending_tasks`
+    page ranges (default 2 × workers) are parsed ahead of the consumer.
+    """
+    tasks = plan_tasks([(p, count_pages(p, backend)) for p in paths], backend, pages_per_task)
+    if workers <= 1:
+        for task in tasks:
+            yield from parse_task(task)
+        return
+
+    max_pending = max_pending_tasks or 2 * workers
+    # Usually runs in build_vectorstore_streaming's producer thread, hence spawned workers
+    with process_pool(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(parse_task, task))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_chunks(pages: Iterable[Document], split_fn: Callable[[List[Document]], List[Document]]) -> Iterator[Document]:
+    """Split page by page; splitters work per document, so the chunks are unchanged."""
+    for page in pages:
+        yield from split_fn([page])
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _put(out: queue.Queue, item, stop: threading.Event) -> bool:
+    """Put `item` unless the consumer stopped first; False if it did."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)  # blocks while the embedder is behind: backpressure
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(chunks: Iterable[Document], batch_size: int, out: queue.Queue, stop: threading.Event):
+    try:
+        for batch in iter_batches(chunks, batch_size):
+            if not _put(out, batch, stop):
+                return  # the consumer failed; stop parsing
+        _put(out, _DONE, stop)
+    except BaseException as e:  # surface parse/split errors in the consumer
+        _put(out, e, stop)
+    finally:
+        close = getattr(chunks, "close", None)
+        if close:
+            close()  # run the generators' cleanup (e.g. shut down the parsing pool)
+
+
+def build_vectorstore_streaming(chunks: Iterable[Document], embeddings: Embeddings, batch_size: int = 100,
+                                max_pending_batches: int = 2, store: Optional[FAISS] = None,
+                                on_batch: Optional[Callable[[int], None]] = None,
+                                spec: Optional[dict] = None,
+                                store_embeddings: Optional[Embeddings] = None) -> Optional[FAISS]:
+    """
+    Embed `chunks` batch by batch and add them to `store` (created from the
+    first batches if None). Parsing/splitting runs in a producer thread ahead
+    of the embedder, bounded by `max_pending_batches`.
+
+    A new store uses the index family in `spec` (see `utils.faiss_index`;
+    flat if None). An IVF index can't take vectors before it is trained, and
+    a prefix of the stream (usually the first report's opening pages) would
+    bias its centroids, so IVF builds hold the embedded batches until the
+    stream ends and train on a uniform sample of `training_size(spec)` of
+    them, as `build_vectorstore` does. That holds about as much as the
+    finished IVF-Flat index, released batch by batch as it is added.
+
+    A new store queries with `store_embeddings` (default: `embeddings`); pass
+    a plain client when `embeddings` is a build-only wrapper such as the
+    concurrent executor.
+
+    Chunks carrying `metadata["chunk_id"]` keep it as their docstore ID.
+    Returns the store, or None if `chunks` was empty and no store was given.
+    """
+    batches: queue.Queue = queue.Queue(maxsize=max_pending_batches)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, args=(chunks, batch_size, batches, stop), daemon=True)
+    producer.start()
+
+    spec = spec or index_spec("flat")
+    store_embeddings = store_embeddings or embeddings
+    held_back = deque()  # embedded batches waiting for IVF training
+
+    def add(texts, vectors, metadatas, ids):
+        store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        if on_batch:
+            on_batch(len(texts))
+
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            texts = [d.page_content for d in batch]
+            metadatas = [d.metadata for d in batch]
+            ids = [d.metadata["chunk_id"] for d in batch] if all("chunk_id" in d.metadata for d in batch) else None
+            vectors = embeddings.embed_documents(texts)
+            if store is None and not training_size(spec):
+                store = empty_store(store_embeddings, spec, len(vectors[0]))
+            if store is not None:
+                add(texts, vectors, metadatas, ids)
+            else:
+                held_back.append((texts, vectors, metadatas, ids))
+    finally:
+        # If embedding or indexing failed, release a producer blocked on the full queue
+        stop.set()
+        producer.join()
+    if held_back:
+        store = _create_store(store_embeddings, spec, held_back)
+        while held_back:
+            add(*held_back.popleft())
+    return store
+
+
+def _create_store(embeddings: Embeddings, spec: dict, held_back: Sequence[tuple]) -> FAISS:
+    """Index trained on a uniform sample of all held-back vectors (seeded, like `build_vectorstore`)."""
+    vectors = [v for b in held_back for v in b[1]]
+    sample = np.random.default_rng(0).choice(len(vectors), size=min(len(vectors), training_size(spec)),
+                                             replace=False)
+    training = np.asarray([vectors[i] for i in np.sort(sample)], dtype=np.float32)
+    return empty_store(embeddings, spec, training.shape[1], training)
@@ -2,20 +2,17 @@
 
 import os
 from dotenv import load_dotenv
-from langchain.document_loaders import UnstructuredPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from utils.parallel_loader import LOADER_WORKERS, load_pdfs
+
 load_dotenv()  # Load environment variables from .env file
 
-def load_and_split_documents(data_dir="data"):
+def load_and_split_documents(data_dir="data", workers=LOADER_WORKERS):
     """Load PDFs from the specified directory and split them into text chunks."""
-    documents = []
-
-    for filename in os.listdir(data_dir):
-        if filename.endswith(".pdf"):
-            loader = UnstructuredPDFLoader(os.path.join(data_dir, filename))
-            docs = loader.load()
-            documents.extend(docs)
+    # Unstructured parses whole files, so parallelism here is one file per worker
+    paths = [os.path.join(data_dir, f) for f in os.listdir(data_dir) if f.endswith(".pdf")]
+    documents = load_pdfs(paths, backend="unstructured", workers=workers)
 
     # Split into cleaner overlapping chunks
     splitter = RecursiveCharacterTextSplitter(
@@ -30,8 +27,7 @@ def load_documents(data_dir="data"):
     return load_and_split_documents(data_dir)
 def load_and_split_documents_from_path(path):
     """Load and split documents from a specific path."""
-    loader = UnstructuredPDFLoader(path)
-    docs = loader.load()
+    docs = load_pdfs([path], backend="unstructured", workers=1)
 
     # Split into cleaner overlapping chunks
     splitter = RecursiveCharacterTextSplitter(
@@ -0,0 +1,263 @@
+# utils/metadata_index.py
+"""
+Metadata index for prefiltered vector search.
+
+Maps source → positions, page → positions and tag → positions, where a
+position is the chunk's row in the FAISS index (the key of
+`index_to_docstore_id`). It is written next to the FAISS files by
+`save_index` and loaded by `load_vectorstore`.
+
+Page and filename clues in a query (see `utils.query_filter`) become an ID
+set that is applied *inside* the search:
+
+* small sets are scored exactly with a NumPy scan over their stored vectors;
+* larger ones go to FAISS with an `IDSelectorBatch` in the search parameters.
+
+So a filtered query always returns up to k hits from within the filter,
+instead of whatever survives a post-filter over the unfiltered top-k.
+Pages are indexed 1-based, as a reader would quote them ("page 12").
+"""
+import json
+import operator
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy, maximal_marginal_relevance
+from langchain_core.documents import Document
+
+from utils.query_filter import extract_filename_clue, extract_page_number_from_query
+
+try:
+    from config import FILENAME_FILTERING_ENABLED, FILTER_BY_PAGE
+except Exception:
+    FILENAME_FILTERING_ENABLED = True
+    FILTER_BY_PAGE = True
+
+try:
+    from config import FILTER_EXACT_SCAN_MAX
+except Exception:
+    FILTER_EXACT_SCAN_MAX = 2048
+
+METADATA_INDEX_FILE = "metadata_index.json"
+
+
+def page_of(metadata: dict) -> Optional[int]:
+    """1-based page number of a chunk (loaders store `page` 0-based)."""
+    if metadata.get("page_number") is not None:
+        return int(metadata["page_number"])
+    if metadata.get("page") is not None:
+        return int(metadata["page"]) + 1
+    return None
+
+
+class MetadataIndex:
+    def __init__(self, sources: Dict[str, List[int]], pages: Dict[str, List[int]], tags: Dict[str, List[int]],
+                 ntotal: int):
+        self.sources = {k: np.asarray(v, dtype=np.int64) for k, v in sources.items()}
+        self.pages = {str(k): np.asarray(v, dtype=np.int64) for k, v in pages.items()}
+        self.tags = {k: np.asarray(v, dtype=np.int64) for k, v in tags.items()}
+        self.ntotal = ntotal
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, dict]]) -> "MetadataIndex":
+        """Index (position, metadata) pairs."""
+        sources, pages, tags = defaultdict(list), defaultdict(list), defaultdict(list)
+        n = 0
+        for pos, metadata in rows:
+            n += 1
+            if metadata.get("source"):
+                sources[str(metadata["source"])].append(pos)
+            page = page_of(metadata)
+            if page is not None:
+                pages[str(page)].append(pos)
+            for tag in metadata.get("tags") or []:
+                tags[tag].append(pos)
+        return cls(sources, pages, tags, n)
+
+    @classmethod
+    def from_store(cls, store: FAISS) -> "MetadataIndex":
+        return cls.build((pos, store.docstore.search(doc_id).metadata)
+                         for pos, doc_id in store.index_to_docstore_id.items())
+
+    def select(self, source: Optional[str] = None, page: Optional[int] = None,
+               tags: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """
+        Sorted positions matching every given constraint, or None if none was given.
+        `source` matches as a substring of the source name (e.g. "wir2024"); a
+        clue that names no indexed source (say, a year in the question) is ignored.
+        """
+        selected = []
+        if source:
+            matches = [ids for name, ids in self.sources.items() if source.lower() in name.lower()]
+            if matches:
+                selected.append(np.unique(np.concatenate(matches)))
+        if page is not None:
+            selected.append(self.pages.get(str(page), np.empty(0, dtype=np.int64)))
+        for tag in tags or []:
+            selected.append(self.tags.get(tag, np.empty(0, dtype=np.int64)))
+        if not selected:
+            return None
+        ids = selected[0]
+        for other in selected[1:]:
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return np.sort(ids)
+
+    def select_for_query(self, query: str) -> Optional[np.ndarray]:
+        """Positions matching the page / filename clues in `query` (None if it has none)."""
+        return self.select(**query_constraints(query))
+
+    def to_dict(self) -> dict:
+        as_lists = lambda d: {k: v.tolist() for k, v in d.items()}
+        return {"ntotal": self.ntotal, "sources": as_lists(self.sources), "pages": as_lists(self.pages),
+                "tags": as_lists(self.tags)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetadataIndex":
+        return cls(data["sources"], data["pages"], data["tags"], data["ntotal"])
+
+    @classmethod
+    def load(cls, index_dir: str, store: Optional[FAISS] = None):
+        """
+        Load the sidecar from an index directory. If it is missing or stale and
+        `store` is given, rebuild it from the docstore; otherwise return None.
+        """
+        path = os.path.join(index_dir, METADATA_INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                index = cls.from_dict(json.load(f))
+            if store is None or index.ntotal == store.index.ntotal:
+                return index
+        return cls.from_store(store) if store is not None else None
+
+
+def query_constraints(query: str) -> dict:
+    """Metadata constraints implied by the query, honouring the config switches."""
+    constraints = {}
+    if FILENAME_FILTERING_ENABLED:
+        clue = extract_filename_clue(query)
+        if clue:
+            constraints["source"] = clue
+    if FILTER_BY_PAGE:
+        page = extract_page_number_from_query(query)
+        if page is not None:
+            constraints["page"] = page
+    return constraints
+
+
+def _embed_query(store: FAISS, query: str) -> np.ndarray:
+    emb = store.embedding_function
+    vector = emb.embed_query(query) if hasattr(emb, "embed_query") else emb(query)
+    x = np.asarray([vector], dtype=np.float32)
+    if getattr(store, "_normalize_L2", False):
+        faiss.normalize_L2(x)
+    return x
+
+
+def enable_reconstruct(index: faiss.Index):
+    """IVF lists need a direct map before vectors can be fetched by position."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        ivf.make_direct_map()
+
+
+def _reconstruct(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    enable_reconstruct(index)
+    return index.reconstruct_batch(ids)
+
+
+def _exact_scan(index: faiss.Index, x: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    vectors = _reconstruct(index, ids)
+    if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+        scores = -(vectors @ x[0])  # lower is better below
+    else:
+        scores = ((vectors - x[0]) ** 2).sum(axis=1)
+    top = np.argsort(scores, kind="stable")[:k]
+    distances = -scores[top] if index.metric_type == faiss.METRIC_INNER_PRODUCT else scores[top]
+    return ids[top], distances
+
+
+def _selector_search(index: faiss.Index, x: np.ndarray, ids: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    sel = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+    if isinstance(index, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=sel, efSearch=max(index.hnsw.efSearch, k))
+    elif isinstance(index, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=index.nprobe)
+    else:
+        params = faiss.SearchParameters(sel=sel)
+    distances, positions = index.search(x, k, params=params)
+    found = positions[0] >= 0
+    return positions[0][found], distances[0][found]
+
+
+def _filtered_positions(store: FAISS, x: np.ndarray, ids: np.ndarray, k: int,
+                        exact_scan_max: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(ids) <= exact_scan_max:
+        return _exact_scan(store.index, x, ids, k)
+    positions, distances = _selector_search(store.index, x, ids, k)
+    if len(positions) < k:  # ANN graph/lists ran out inside a sparse filter
+        positions, distances = _exact_scan(store.index, x, ids, k)
+    return positions, distances
+
+
+def _docs(store: FAISS, positions: np.ndarray, distances: np.ndarray) -> List[Tuple[Document, float]]:
+    return [(store.docstore.search(store.index_to_docstore_id[int(p)]), float(d))
+            for p, d in zip(positions, distances)]
+
+
+def filtered_search_with_score(store: FAISS, query: str, ids: np.ndarray, k: int = 4,
+                               exact_scan_max: int = FILTER_EXACT_SCAN_MAX) -> List[Tuple[Document, float]]:
+    """
+    Top-k (doc, distance) among the index positions `ids`, searched inside
+    FAISS rather than filtered afterwards. Returns min(k, len(ids)) hits.
+    """
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    k = min(k, len(ids))
+    if k == 0:
+        return []
+    return _docs(store, *_filtered_positions(store, _embed_query(store, query), ids, k, exact_scan_max))
+
+
+def filtered_search(store: FAISS, query: str, ids: np.ndarray, k: int = 4, search_type: str = "similarity",
+                    score_threshold: Optional[float] = None, fetch_k: int = 20, lambda_mult: float = 0.5,
+                    exact_scan_max: int = FILTER_EXACT_SCAN_MAX) -> List[Document]:
+    """
+    Filtered counterpart of `store.as_retriever(search_type, search_kwargs)`:
+
+    * "similarity": top k, dropping hits whose distance fails `score_threshold`
+      (compared like `FAISS.similarity_search` does);
+    * "similarity_score_threshold": top k with relevance score >= `score_threshold`;
+    * "mmr": k of the `fetch_k` nearest, re-selected for diversity (no threshold,
+      as in LangChain).
+    """
+    ids = np.ascontiguousarray(ids, dtype=np.int64)
+    if search_type == "mmr":
+        n = min(max(k, fetch_k), len(ids))
+        if n == 0:
+            return []
+        x = _embed_query(store, query)
+        positions, _ = _filtered_positions(store, x, ids, n, exact_scan_max)
+        selected = maximal_marginal_relevance(x[0], list(_reconstruct(store.index, positions)),
+                                              lambda_mult=lambda_mult, k=k)
+        return [store.docstore.search(store.index_to_docstore_id[int(positions[i])]) for i in selected]
+
+    hits = filtered_search_with_score(store, query, ids, k, exact_scan_max)
+    if score_threshold is not None:
+        if search_type == "similarity_score_threshold":
+            relevance = store._select_relevance_score_fn()
+            hits = [(d, s) for d, s in hits if relevance(s) >= score_threshold]
+        else:
+            cmp = operator.ge if store.distance_strategy in (
+                DistanceStrategy.MAX_INNER_PRODUCT, DistanceStrategy.JACCARD) else operator.le
+            hits = [(d, s) for d, s in hits if cmp(s, score_threshold)]
+    return [doc for doc, _ in hits]
+
+
+def allowed_chunk_ids(store: FAISS, ids: Optional[np.ndarray]) -> Optional[set]:
+    """Docstore IDs for a position set (None passes through as "no filter")."""
+    if ids is None:
+        return None
+    return {store.index_to_docstore_id[int(p)] for p in ids}
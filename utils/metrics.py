@@ -0,0 +1,309 @@
+# utils/metrics.py
+"""
+In-process latency tracing and metrics.
+
+`span("retrieval")` (or the `@traced("...")` decorator) times a pipeline
+stage. Every span feeds:
+
+* a per-stage latency window (the last METRICS_WINDOW samples), giving
+  p50 / p95 / p99 plus a running sum and count;
+* the current request's trace, if one was started with `start_trace`. A
+  trace is a list of spans with offsets, durations and parent names, and
+  can be returned as JSON.
+
+LangChain LLM calls are timed as an "llm" stage and their token usage
+counted by `MetricsCallbackHandler` (`record_tokens` for direct OpenAI
+client calls). Components that already
+keep their own statistics (the query-embedding cache, the answer cache,
+...) are read at scrape time through `register_collector`. `prometheus()` renders everything in the Prometheus
+text exposition format.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    from config import METRICS_WINDOW, TRACE_BUFFER_SIZE, TRACE_LOG_PATH
+except Exception:
+    METRICS_WINDOW = 1024
+    TRACE_BUFFER_SIZE = 200
+    TRACE_LOG_PATH = None
+
+PREFIX = "rag"
+QUANTILES = (0.5, 0.95, 0.99)
+COUNTER_HELP = {
+    "stage_errors_total": "Exceptions raised inside each stage",
+    "llm_tokens_total": "LLM tokens used, by kind (prompt / completion) and model",
+}
+
+# (name, type, help, [(labels, value), ...]) rows added to every scrape
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class Trace:
+    def __init__(self, name: str, clock=time.perf_counter):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs: Dict[str, object] = {}
+        self.spans: List[dict] = []
+        self._clock = clock
+        self._start = clock()
+        self._stack: List[str] = []
+        self.total_ms: Optional[float] = None
+
+    def offset_ms(self) -> float:
+        return round(1000 * (self._clock() - self._start), 3)
+
+    def finish(self) -> dict:
+        if self.total_ms is None:
+            self.total_ms = self.offset_ms()
+        return self.to_dict()
+
+    def to_dict(self) -> dict:
+        return {"trace_id": self.trace_id, "name": self.name, "total_ms": self.total_ms, "attrs": self.attrs,
+                "spans": list(self.spans)}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Metrics:
+    def __init__(self, window: int = METRICS_WINDOW, trace_buffer: int = TRACE_BUFFER_SIZE,
+                 trace_log_path: Optional[str] = TRACE_LOG_PATH, clock=time.perf_counter):
+        self.window = window
+        self.trace_buffer = trace_buffer
+        self.trace_log_path = trace_log_path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._sums: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._counters: Dict[Tuple[str, tuple], float] = defaultdict(float)
+        self._collectors: List[Collector] = []
+        self._traces: "OrderedDict[str, dict]" = OrderedDict()
+
+    # ── latency ──────────────────────────────────────────────
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            if stage not in self._samples:
+                self._samples[stage] = deque(maxlen=self.window)
+            self._samples[stage].append(seconds)
+            self._sums[stage] += seconds
+            self._counts[stage] += 1
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        """Time a stage; recorded in the latency window and in the current trace, if any."""
+        trace = _current.get()
+        parent = trace._stack[-1] if trace and trace._stack else None
+        offset = trace.offset_ms() if trace else None
+        if trace:
+            trace._stack.append(stage)
+        start = self._clock()
+        error = None
+        try:
+            yield attrs  # callers may add attributes (e.g. result sizes) while the span is open
+        except GeneratorExit:
+            raise  # a consumer stopped reading a streamed stage; not a failure
+        except BaseException as e:
+            error = type(e).__name__
+            self.inc("stage_errors_total", stage=stage)
+            raise
+        finally:
+            seconds = self._clock() - start
+            if trace:
+                trace._stack.pop()
+            self._record(trace, stage, seconds, offset, parent, attrs, error)
+
+    def record_span(self, stage: str, seconds: float, **attrs):
+        """Record a stage timed elsewhere (e.g. by callbacks) as if it had just ended."""
+        trace = _current.get()
+        parent = trace._stack[-1] if trace and trace._stack else None
+        offset = round(trace.offset_ms() - 1000 * seconds, 3) if trace else None
+        self._record(trace, stage, seconds, offset, parent, attrs)
+
+    def _record(self, trace, stage, seconds, offset, parent, attrs, error=None):
+        self.observe(stage, seconds)
+        if trace is None:
+            return
+        record = {"name": stage, "start_ms": offset, "duration_ms": round(1000 * seconds, 3)}
+        if parent:
+            record["parent"] = parent
+        if attrs:
+            record["attrs"] = dict(attrs)
+        if error:
+            record["error"] = error
+        trace.spans.append(record)
+
+    def latency(self) -> Dict[str, dict]:
+        """Per-stage count, mean and p50 / p95 / p99 (ms) over the recent window."""
+        with self._lock:
+            snapshot = {stage: (np.asarray(samples), self._counts[stage]) for stage, samples in self._samples.items()}
+        out = {}
+        for stage, (samples, count) in sorted(snapshot.items()):
+            p50, p95, p99 = np.percentile(samples, [100 * q for q in QUANTILES]) * 1000
+            out[stage] = {"count": count, "mean_ms": round(float(samples.mean()) * 1000, 3),
+                          "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+                          "p99_ms": round(float(p99), 3)}
+        return out
+
+    # ── counters ─────────────────────────────────────────────
+    def inc(self, name: str, value: float = 1.0, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def record_tokens(self, prompt: int = 0, completion: int = 0, model: str = "unknown"):
+        if prompt:
+            self.inc("llm_tokens_total", prompt, kind="prompt", model=model)
+        if completion:
+            self.inc("llm_tokens_total", completion, kind="completion", model=model)
+
+    def register_collector(self, collector: Collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    # ── traces ───────────────────────────────────────────────
+    def start_trace(self, name: str) -> Tuple[Trace, contextvars.Token]:
+        trace = Trace(name, self._clock)
+        return trace, _current.set(trace)
+
+    @contextmanager
+    def use_trace(self, trace: Optional[Trace]):
+        """Make `trace` current in this context (e.g. inside a streaming generator)."""
+        previous = _current.get()
+        _current.set(trace)
+        try:
+            yield trace
+        finally:
+            _current.set(previous)  # not reset(): a generator may resume in another Context
+
+    def finish_trace(self, trace: Trace, token: Optional[contextvars.Token] = None) -> dict:
+        """Close a trace, keep it in the recent-traces buffer and optionally append it to the log."""
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:  # finished from another context, e.g. after a streamed response
+                _current.set(None)
+        record = trace.finish()
+        with self._lock:
+            self._traces[trace.trace_id] = record
+            while len(self._traces) > self.trace_buffer:
+                self._traces.popitem(last=False)
+        if self.trace_log_path:
+            if os.path.dirname(self.trace_log_path):
+                os.makedirs(os.path.dirname(self.trace_log_path), exist_ok=True)
+            with open(self.trace_log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return record
+
+    def get_trace(self, trace_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    # ── exposition ───────────────────────────────────────────
+    def prometheus(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            windows = {stage: np.asarray(samples) for stage, samples in self._samples.items()}
+            sums, counts = dict(self._sums), dict(self._counts)
+            counters = dict(self._counters)
+            collectors = list(self._collectors)
+
+        lines = [f"# HELP {PREFIX}_stage_seconds Latency of each pipeline stage (quantiles over the recent window)",
+                 f"# TYPE {PREFIX}_stage_seconds summary"]
+        for stage in sorted(windows):
+            for q, v in zip(QUANTILES, np.percentile(windows[stage], [100 * q for q in QUANTILES])):
+                lines.append(f"{PREFIX}_stage_seconds{_labels({'stage': stage, 'quantile': q})} {v:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_sum{_labels({'stage': stage})} {sums[stage]:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{_labels({'stage': stage})} {counts[stage]}")
+
+        by_name: Dict[str, list] = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            by_name[name].append((dict(labels), value))
+        families = [(name, "counter", COUNTER_HELP.get(name, name), rows) for name, rows in by_name.items()]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+        for name, kind, help_text, rows in families:
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            lines.extend(f"{PREFIX}_{name}{_labels(labels)} {value:g}" for labels, value in rows)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Times each LangChain LLM call as an "llm" stage and counts its token
+    usage; streamed calls without usage data are counted with the local tokenizer.
+    """
+
+    def __init__(self, metrics: "Metrics"):
+        self.metrics = metrics
+        self._starts: Dict[object, float] = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._starts[run_id] = self.metrics._clock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        self._starts[run_id] = self.metrics._clock()
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._starts.pop(run_id, None)
+        self.metrics.inc("stage_errors_total", stage="llm")
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        output = response.llm_output or {}
+        usage = output.get("token_usage") or {}
+        model = output.get("model_name") or "unknown"
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            self.metrics.record_span("llm", self.metrics._clock() - start, model=model)
+        if usage:
+            self.metrics.record_tokens(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), model)
+            return
+        from utils.token_accounting import count_tokens
+
+        text = "".join(g.text for gens in response.generations for g in gens)
+        self.metrics.record_tokens(completion=count_tokens(text) if text else 0, model=model)
+
+
+metrics = Metrics()
+span = metrics.span
+callback = MetricsCallbackHandler(metrics)
+
+
+def traced(stage: str):
+    """Decorator form of `span`."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with metrics.span(stage):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
@@ -0,0 +1,116 @@
+# utils/parallel_loader.py
+"""
+Parse PDFs in a process pool.
+
+Each file is cut into page-range tasks (so one large report such as
+wir2024.pdf is spread over several workers), tasks are parsed in parallel, and
+the results are concatenated in input order, so the output matches a
+sequential load page for page.
+
+Backends mirror the loaders used elsewhere in the repo:
+    "pymupdf"      – like PyMuPDFLoader  (metadata: source, file_path, page, total_pages, plus the
+                     PDF's own metadata: title, author, creationDate, ...)
+    "pypdf"        – like PyPDFLoader    (metadata: source, page)
+    "unstructured" – UnstructuredPDFLoader; cannot be split by page, one task per file
+Non-PDF paths are loaded whole with TextLoader.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+try:
+    from config import LOADER_WORKERS, PAGES_PER_TASK
+except Exception:
+    LOADER_WORKERS = 1
+    PAGES_PER_TASK = 40
+
+# (path, backend, first_page, last_page_exclusive); pages are None for whole-file tasks
+Task = Tuple[str, str, Optional[int], Optional[int]]
+
+
+def count_pages(path: str, backend: str) -> Optional[int]:
+    """Page count for page-splittable backends, None when the file is parsed whole."""
+    if not path.lower().endswith(".pdf") or backend == "unstructured":
+        return None
+    if backend == "pymupdf":
+        import fitz
+
+        with fitz.open(path) as pdf:
+            return pdf.page_count
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def plan_tasks(page_counts: Sequence[Tuple[str, Optional[int]]], backend: str, pages_per_task: int) -> List[Task]:
+    """Cut each (path, page_count) into contiguous page ranges, preserving order."""
+    tasks: List[Task] = []
+    for path, n_pages in page_counts:
+        if n_pages is None:
+            tasks.append((path, backend, None, None))
+            continue
+        for start in range(0, n_pages, pages_per_task):
+            tasks.append((path, backend, start, min(start + pages_per_task, n_pages)))
+    return tasks
+
+
+def parse_task(task: Task) -> List[Document]:
+    """Parse one task. Runs inside worker processes, so it must stay top-level."""
+    path, backend, start, end = task
+    if not path.lower().endswith(".pdf"):
+        from langchain_community.document_loaders import TextLoader
+
+        return TextLoader(path, encoding="utf-8").load()
+    if backend == "unstructured":
+        from langchain_community.document_loaders import UnstructuredPDFLoader
+
+        return UnstructuredPDFLoader(path).load()
+    if backend == "pymupdf":
+        import fitz
+
+        with fitz.open(path) as pdf:
+            # document-level fields, filtered as PyMuPDFLoader does
+            info = {k: v for k, v in (pdf.metadata or {}).items() if type(v) in (str, int)}
+            return [
+                Document(
+                    page_content=pdf[i].get_text(),
+                    metadata={"source": path, "file_path": path, "page": i, "total_pages": pdf.page_count,
+                              **info},
+                )
+                for i in range(start, end)
+            ]
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [
+        Document(page_content=reader.pages[i].extract_text(), metadata={"source": path, "page": i})
+        for i in range(start, end)
+    ]
+
+
+def process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool for parse tasks. Workers are spawned, not forked: pools are also started
+    from producer and request threads, and a child forked from a threaded process
+    can deadlock on a lock another thread held at fork time.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def load_pdfs(paths: Sequence[str], backend: str = "pymupdf", workers: int = LOADER_WORKERS,
+              pages_per_task: int = PAGES_PER_TASK) -> List[Document]:
+    """
+    Load `paths` with the given backend, using `workers` processes (1 = in-process).
+
+    Output order and page metadata are identical to loading the files one after another.
+    """
+    tasks = plan_tasks([(p, count_pages(p, backend)) for p in paths], backend, pages_per_task)
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        results = map(parse_task, tasks)
+    else:
+        with process_pool(workers) as pool:
+            results = list(pool.map(parse_task, tasks))
+    return [doc for docs in results for doc in docs]
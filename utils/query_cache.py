@@ -0,0 +1,193 @@
+# utils/query_cache.py
+"""
+Query-embedding cache in front of the embedder used at retrieval time.
+
+Every retrieval path (similarity / MMR search, `boosted_retriever`, filtered
+search, debug scripts) embeds the query through the store's embedding
+function, so wrapping that one object caches them all. Entries are keyed by
+model + normalised query text (see `utils.embedding_cache.cache_key`) and kept
+in an in-memory LRU with a TTL. The optional SQLite tier survives restarts.
+
+`stats()` / `report()` expose the hit rate and the embedding time saved
+(hits × the average latency of a real embedding call).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import EmbeddingCache, cache_key, normalise_text
+
+try:
+    from config import QUERY_CACHE_PATH, QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+except Exception:
+    QUERY_CACHE_SIZE = 1024
+    QUERY_CACHE_TTL = 3600.0
+    QUERY_CACHE_PATH = ".cache/query_embeddings.sqlite"
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wrap an `Embeddings` instance so repeated queries skip the network.
+    `embed_documents` passes straight through; thread-safe.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_size: int = QUERY_CACHE_SIZE, ttl: float = QUERY_CACHE_TTL,
+                 disk: Optional[EmbeddingCache] = None, model_name: Optional[str] = None,
+                 clock=time.monotonic):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl = ttl
+        self.disk = disk
+        self.model_name = model_name or getattr(embeddings, "model", type(embeddings).__name__)
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires_at, vector)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_seconds = 0.0
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        vector = self._get(key)
+        if vector is None and self.disk is not None:
+            vector = self.disk.get_many([key]).get(key)
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put(key, vector)
+        return vector
+
+    def _store(self, key: str, vector, elapsed: float) -> List[float]:
+        vector = np.asarray(vector, dtype=np.float32).tolist()
+        with self._lock:
+            self.misses += 1
+            self.miss_seconds += elapsed
+        self._put(key, vector)
+        if self.disk is not None:
+            self.disk.put_many([(key, vector)])
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        key = cache_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+        start = time.perf_counter()
+        # Embed the normalised text, so every query sharing this key gets the same vector
+        vector = self.embeddings.embed_query(normalise_text(text))
+        return self._store(key, vector, time.perf_counter() - start)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = cache_key(self.model_name, text)
+        vector = self._lookup(key)
+        if vector is not None:
+            return vector
+        start = time.perf_counter()
+        vector = await self.embeddings.aembed_query(normalise_text(text))
+        return self._store(key, vector, time.perf_counter() - start)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Query vectors for many texts; the misses are embedded together in one
+        `embed_documents` call (the same vectors as `embed_query` for
+        symmetric embedders such as OpenAI's).
+        """
+        keys = [cache_key(self.model_name, t) for t in texts]
+        found = {}
+        for key in keys:
+            if key not in found:
+                vector = self._lookup(key)
+                if vector is not None:
+                    found[key] = vector
+        missing = {key: normalise_text(t) for key, t in zip(keys, texts) if key not in found}
+        if missing:
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            elapsed = (time.perf_counter() - start) / len(missing)
+            for key, vector in zip(missing, vectors):
+                found[key] = self._store(key, vector, elapsed)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            served = self.hits + self.disk_hits
+            total = served + self.misses
+            avg_miss = self.miss_seconds / self.misses if self.misses else 0.0
+            return {
+                "model": self.model_name,
+                "size": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": served / total if total else 0.0,
+                "avg_miss_seconds": avg_miss,
+                "saved_seconds": served * avg_miss,
+            }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (
+            f"Query cache: {s['hits']} memory hits, {s['disk_hits']} disk hits, {s['misses']} misses "
+            f"({s['hit_rate']:.0%} hit rate), ~{s['saved_seconds']:.1f}s of embedding calls saved"
+        )
+
+
+_shared: Dict[Tuple[str, str], CachedQueryEmbeddings] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_query_embeddings(key: Tuple[str, str], factory: Callable[[], Embeddings],
+                            disk_path: Optional[str] = QUERY_CACHE_PATH) -> CachedQueryEmbeddings:
+    """
+    Process-wide cache for the (backend, model) `key`, so reloaded indexes (see
+    `utils.index_registry`) keep the warm cache. `factory` builds the embedder
+    only on a miss: a local model is loaded once per process, not per reload.
+    `disk_path=None` disables the disk tier.
+    """
+    with _shared_lock:
+        cached = _shared.get(key)
+        if cached is None:
+            model = key[1]
+            disk = EmbeddingCache(disk_path) if disk_path else None
+            cached = _shared[key] = CachedQueryEmbeddings(factory(), disk=disk, model_name=model)
+        return cached
+
+
+def query_cache_stats() -> List[Dict[str, float]]:
+    with _shared_lock:
+        caches = list(_shared.values())
+    return [c.stats() for c in caches]
@@ -0,0 +1,134 @@
+# utils/query_decomposition.py
+"""
+Query decomposition and fan-out retrieval for multi-facet questions.
+
+"Compare geopolitical and financing risks across regions" asks about two
+facets, and a single top-k search tends to fill up with whichever facet
+the embedding leans towards. `decompose_query` splits such a question into
+sub-queries, by rules (coordinated facets sharing a head or a stem) or,
+optionally, by asking an LLM. The rules only fire on those two shapes, so
+an ordinary question ("In 2023, how did FDI change?") is left whole. The
+original question is always kept as the first sub-query.
+
+`fanout_search` then costs about one search, not one per sub-query: all
+sub-queries are embedded in one batched call and FAISS searches the query
+matrix in a single `index.search` (parallel across queries). The rankings
+are merged with reciprocal-rank fusion, keyed by chunk ID (the docstore
+ID), so a chunk found by several sub-queries appears once and ranks higher.
+The original question's ranking is weighted above any single facet's.
+"""
+import re
+from typing import List, Optional
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from utils.batch_audit import embed_queries
+from utils.hybrid import reciprocal_rank_fusion
+
+try:
+    from config import MAX_SUBQUERIES
+except Exception:
+    MAX_SUBQUERIES = 4
+
+MAX_FACET_WORDS = 2  # "Latin America": longer segments are clauses, not facets
+ORIGINAL_QUERY_WEIGHT = 2.0  # RRF weight of the question as asked; each sub-query weighs 1
+
+# Names containing a coordinator, which must not be split into facets
+COMPOUND_NAMES = (
+    "bosnia and herzegovina", "trinidad and tobago", "antigua and barbuda", "saint kitts and nevis",
+    "sao tome and principe", "saint vincent and the grenadines", "mergers and acquisitions",
+    "research and development", "oil and gas",
+)
+_COMPOUND = re.compile("|".join(re.escape(n).replace(r"\ ", r"\s+") for n in COMPOUND_NAMES), re.I)
+_JOIN = "\ue000"  # stands in for the spaces of a compound name while splitting
+
+_LEAD = re.compile(
+    r"^(?:please\s+)?(?:compare|contrast|assess|summari[sz]e|describe|explain|list|identify|"
+    r"what\s+(?:are|is|were|was)(?:\s+the)?|how\s+(?:do|does|did|have|has))\s+",
+    re.I,
+)
+_SPLIT = re.compile(r"\s*(?:,|;|\band\b|\bor\b|\bversus\b|\bvs\.?)\s*", re.I)
+
+DECOMPOSE_PROMPT = (
+    "Split the question below into at most {n} short, standalone search queries, one per line, "
+    "each covering one facet of the question. If it has a single facet, return it unchanged.\n\n"
+    "Question: {query}"
+)
+
+
+def _dedupe(queries: List[str], limit: int) -> List[str]:
+    seen, out = set(), []
+    for q in queries:
+        key = " ".join(q.lower().split())
+        if key and key not in seen:
+            seen.add(key)
+            out.append(q)
+    return out[:limit]
+
+
+def _same_kind(a: str, b: str) -> bool:
+    """Coordinated facets look alike: "Asia" / "Africa", not "2023" / "why" or "Asia" / "how"."""
+    return a[:1].isupper() == b[:1].isupper() and a[:1].isdigit() == b[:1].isdigit()
+
+
+def rule_subqueries(query: str) -> List[str]:
+    """
+    Facet sub-queries for the two coordinated-facet shapes; empty for anything
+    else, including questions that merely contain a comma or an "and".
+    """
+    body = _LEAD.sub("", query.strip().rstrip("?.! "))
+    body = _COMPOUND.sub(lambda m: _JOIN.join(m.group(0).split()), body)
+    segments = [s for s in _SPLIT.split(body) if s]
+    if len(segments) < 2:
+        return []
+    words = [s.split() for s in segments]
+    subqueries = []
+    if len(words[-1]) > 1 and all(len(w) == 1 and _same_kind(w[0], words[-1][0]) for w in words[:-1]):
+        # "geopolitical and financing risks across regions": facets share the tail
+        head = " ".join(words[-1][1:])
+        subqueries = [f"{s} {head}" for s in segments[:-1]] + [segments[-1]]
+    elif len(words[0]) > MAX_FACET_WORDS and all(
+        len(w) <= MAX_FACET_WORDS and _same_kind(w[0], words[0][-1]) for w in words[1:]
+    ):
+        # "risks in Asia, Africa and Latin America": facets share the stem
+        stem = " ".join(words[0][:-1])
+        subqueries = [segments[0]] + [f"{stem} {s}" for s in segments[1:]]
+    return [q.replace(_JOIN, " ") for q in subqueries]
+
+
+def llm_subqueries(query: str, llm, max_subqueries: int = MAX_SUBQUERIES) -> List[str]:
+    """Sub-queries proposed by `llm` (a LangChain chat model or LLM), one per output line."""
+    reply = llm.invoke(DECOMPOSE_PROMPT.format(n=max_subqueries, query=query))
+    text = getattr(reply, "content", reply)
+    return [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line).strip() for line in str(text).splitlines()
+            if line.strip()]
+
+
+def decompose_query(query: str, llm=None, max_subqueries: int = MAX_SUBQUERIES) -> List[str]:
+    """
+    The original query followed by its facet sub-queries, at most `max_subqueries`
+    in all. With `llm`, the model decomposes; rules are the fallback if it fails.
+    """
+    subqueries = []
+    if llm is not None:
+        try:
+            subqueries = llm_subqueries(query, llm, max_subqueries)
+        except Exception as e:
+            print(f"⚠️ LLM decomposition failed ({e}); using rules.")
+    if not subqueries:
+        subqueries = rule_subqueries(query)
+    return _dedupe([query] + subqueries, max_subqueries)
+
+
+def fanout_search(store: FAISS, subqueries: List[str], k: int = 4, fetch_k: Optional[int] = None) -> List[Document]:
+    """
+    Top-k documents for the sub-queries together: one embedding call, one
+    matrix search, RRF. `subqueries[0]` is the original question and is
+    weighted ORIGINAL_QUERY_WEIGHT.
+    """
+    fetch_k = fetch_k or 2 * k
+    _, positions = store.index.search(embed_queries(store, subqueries), fetch_k)
+    rankings = [[store.index_to_docstore_id[int(p)] for p in row if p >= 0] for row in positions]
+    fused = reciprocal_rank_fusion(rankings, [ORIGINAL_QUERY_WEIGHT] + [1.0] * (len(rankings) - 1))
+    return [store.docstore.search(doc_id) for doc_id, _ in fused[:k]]
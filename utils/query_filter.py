@@ -14,6 +14,8 @@ def extract_filename_clue(query: str) -> str | None:
         return f"wir{match.group(1)}"
     return None
 
+# Post-filters over already retrieved chunks. Retrieval itself applies these
+# clues inside the search via `utils.metadata_index`.
 def filter_chunks_by_filename(chunks: List[Document], query: str) -> List[Document]:
     clue = extract_filename_clue(query)
     if not clue:
@@ -0,0 +1,153 @@
+# utils/reranker.py
+"""
+Cross-encoder reranking of retrieval candidates.
+
+Dense and BM25 scores rank a candidate pool cheaply; a cross-encoder reads
+query and chunk together and is far more precise, so the analyst can be
+given fewer, better chunks. `CrossEncoderReranker.rerank`:
+
+* takes the first `pool_size` candidates (in retrieval order);
+* serves pair scores it has seen before from an LRU cache keyed by
+  (normalised query, chunk ID);
+* scores the rest on CPU in batches, best-ranked candidates first, and
+  stops starting new batches once the next one would overrun `budget_ms`
+  (early cutoff). Unscored candidates keep their retrieval order behind
+  the scored ones;
+* returns the top k.
+
+Reranking is off unless RERANK_ENABLED is set; it needs
+`sentence-transformers` and downloads the model on first use.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from utils.embedding_cache import normalise_text
+
+try:
+    from config import (
+        RERANK_BATCH_SIZE, RERANK_BUDGET_MS, RERANK_CACHE_SIZE, RERANK_ENABLED, RERANK_MODEL, RERANK_POOL,
+        RERANK_TOP_K,
+    )
+except Exception:
+    RERANK_ENABLED = False
+    RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_POOL = 20
+    RERANK_TOP_K = 3
+    RERANK_BUDGET_MS = 150
+    RERANK_BATCH_SIZE = 8
+    RERANK_CACHE_SIZE = 4096
+
+
+def _load_cross_encoder(model: str) -> Callable[[List[Tuple[str, str]]], Sequence[float]]:
+    try:
+        from sentence_transformers import CrossEncoder
+    except ImportError as e:
+        raise ImportError("Reranking needs `pip install sentence-transformers`.") from e
+    encoder = CrossEncoder(model, device="cpu", max_length=512)
+    return lambda pairs: encoder.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+
+class CrossEncoderReranker:
+    def __init__(self, model: str = RERANK_MODEL, pool_size: int = RERANK_POOL,
+                 budget_ms: float = RERANK_BUDGET_MS, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_size: int = RERANK_CACHE_SIZE,
+                 score_pairs: Optional[Callable[[List[Tuple[str, str]]], Sequence[float]]] = None,
+                 clock=time.perf_counter):
+        self.model = model
+        self.pool_size = pool_size
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._score_pairs = score_pairs
+        self._clock = clock
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.scored = 0
+        self.cache_hits = 0
+        self.cutoffs = 0
+        self.seconds = 0.0
+
+    @property
+    def score_pairs(self):
+        if self._score_pairs is None:
+            self._score_pairs = _load_cross_encoder(self.model)
+        return self._score_pairs
+
+    @staticmethod
+    def _key(query: str, doc: Document) -> tuple:
+        return normalise_text(query).lower(), doc.metadata.get("chunk_id") or doc.page_content
+
+    def scores(self, query: str, docs: List[Document]) -> List[Optional[float]]:
+        """Cross-encoder score per doc (higher is better); None where the budget ran out."""
+        start = self._clock()
+        keys = [self._key(query, d) for d in docs]
+        scores: List[Optional[float]] = [None] * len(docs)
+        todo = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[i] = self._cache[key]
+                    self.cache_hits += 1
+                else:
+                    todo.append(i)
+
+        batch_seconds = 0.0
+        for b in range(0, len(todo), self.batch_size):
+            elapsed = self._clock() - start
+            if b and (elapsed + batch_seconds) * 1000 > self.budget_ms:
+                with self._lock:
+                    self.cutoffs += 1
+                break
+            batch = todo[b:b + self.batch_size]
+            mark = self._clock()
+            values = self.score_pairs([(query, docs[i].page_content) for i in batch])
+            batch_seconds = self._clock() - mark
+            with self._lock:
+                for i, value in zip(batch, values):
+                    scores[i] = float(value)
+                    self._cache[keys[i]] = float(value)
+                self.scored += len(batch)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        with self._lock:
+            self.calls += 1
+            self.seconds += self._clock() - start
+        return scores
+
+    def rerank(self, query: str, docs: List[Document], k: int = RERANK_TOP_K) -> List[Document]:
+        """Top-k of the first `pool_size` docs by cross-encoder score."""
+        pool = list(docs[:self.pool_size])
+        scores = self.scores(query, pool)
+        scored = sorted((i for i, s in enumerate(scores) if s is not None), key=lambda i: -scores[i])
+        unscored = [i for i, s in enumerate(scores) if s is None]
+        return [pool[i] for i in scored + unscored][:k]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "model": self.model, "calls": self.calls, "pairs_scored": self.scored,
+                "cache_hits": self.cache_hits, "cache_size": len(self._cache), "cutoffs": self.cutoffs,
+                "avg_ms": 1000 * self.seconds / self.calls if self.calls else 0.0,
+            }
+
+
+_reranker: Optional[CrossEncoderReranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Optional[CrossEncoderReranker]:
+    """Process-wide reranker, or None when RERANK_ENABLED is off."""
+    global _reranker
+    if not RERANK_ENABLED:
+        return None
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = CrossEncoderReranker()
+        return _reranker
@@ -3,8 +3,11 @@
 from openai import OpenAI
 from typing import List, Dict
 
+from utils.metrics import metrics, traced
+
 client = OpenAI()
 
+@traced("score_response")
 def score_response_gpt(question: str, answer: str, sources: List[Dict]) -> Dict[str, float]:
     """Score the response using GPT for relevance, completeness, and faithfulness."""
     context_snippets = "\n\n".join(
@@ -46,6 +49,8 @@ Respond in this JSON format:
             {"role": "user", "content": prompt}
         ]
     )
+    if response.usage:
+        metrics.record_tokens(response.usage.prompt_tokens, response.usage.completion_tokens, "gpt-4")
 
     try:
         parsed = eval(response.choices[0].message.content.strip())  # ⚠️ Use a real parser in prod
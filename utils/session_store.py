@@ -0,0 +1,144 @@
+# utils/session_store.py
+"""
+Server-side conversation history, one row per turn in SQLite.
+
+The cookie session only carries a session ID. History is read back through
+a token-budget window: the most recent turns whose question + answer fit in
+`max_history_tokens` (token counts are stored with each turn, so windowing
+never re-tokenises). A latest turn that is over the budget on its own is
+cut to fit, answer first, rather than leaving the model with no history. Prompt size and condensation latency therefore stay
+flat however long a conversation runs.
+
+Each turn also keeps the standalone (condensed) form of its question, which
+the topic-continuity check compares the next standalone question against.
+
+Sessions idle for longer than `ttl` seconds are pruned, and each session
+keeps at most `max_turns` turns on disk.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from utils.token_accounting import count_tokens
+
+try:
+    from config import HISTORY_TOKEN_BUDGET, SESSION_DB_PATH, SESSION_MAX_TURNS, SESSION_TTL
+except Exception:
+    SESSION_DB_PATH = ".cache/sessions.sqlite"
+    HISTORY_TOKEN_BUDGET = 1500
+    SESSION_MAX_TURNS = 50
+    SESSION_TTL = 7 * 24 * 3600
+
+
+class SessionStore:
+    def __init__(self, path: str = SESSION_DB_PATH, max_history_tokens: int = HISTORY_TOKEN_BUDGET,
+                 max_turns: int = SESSION_MAX_TURNS, ttl: float = SESSION_TTL,
+                 count_tokens: Optional[Callable[[str], int]] = None, clock=time.time):
+        self.path = path
+        self.max_history_tokens = max_history_tokens
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._count_tokens = count_tokens
+        self._clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns (sid TEXT, seq INTEGER, question TEXT, answer TEXT, "
+            "tokens INTEGER, created_at REAL, PRIMARY KEY (sid, seq))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS turns_created ON turns (created_at)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(turns)")}
+        if "standalone" not in columns:  # databases created before it was recorded
+            self._conn.execute("ALTER TABLE turns ADD COLUMN standalone TEXT")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._appends = 0
+
+    @property
+    def count_tokens(self) -> Callable[[str], int]:
+        return self._count_tokens or count_tokens
+
+    def append(self, sid: str, question: str, answer: str, standalone: Optional[str] = None):
+        tokens = self.count_tokens(question) + self.count_tokens(answer)
+        with self._lock:
+            (seq,) = self._conn.execute("SELECT COALESCE(MAX(seq), -1) + 1 FROM turns WHERE sid = ?",
+                                        (sid,)).fetchone()
+            self._conn.execute("INSERT INTO turns (sid, seq, question, answer, tokens, created_at, standalone) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (sid, seq, question, answer, tokens, self._clock(), standalone))
+            self._conn.execute("DELETE FROM turns WHERE sid = ? AND seq <= ?", (sid, seq - self.max_turns))
+            self._appends += 1
+            if self._appends % 100 == 0:
+                self._prune()
+            self._conn.commit()
+
+    def history(self, sid: str) -> List[Tuple[str, str]]:
+        """Most recent (question, answer) turns within the token budget, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question, answer, tokens FROM turns WHERE sid = ? ORDER BY seq DESC LIMIT ?",
+                (sid, self.max_turns),
+            ).fetchall()
+        window, used = [], 0
+        for question, answer, tokens in rows:
+            if used + tokens > self.max_history_tokens:
+                break
+            window.append((question, answer))
+            used += tokens
+        if rows and not window:
+            window.append(self._fit_turn(rows[0][0], rows[0][1]))
+        return window[::-1]
+
+    def _fit_turn(self, question: str, answer: str) -> Tuple[str, str]:
+        """Cut a single turn to the budget: the answer's tail goes first, then the question's."""
+        question_tokens = self.count_tokens(question)
+        if question_tokens >= self.max_history_tokens:
+            return self._truncate(question, self.max_history_tokens), ""
+        return question, self._truncate(answer, self.max_history_tokens - question_tokens)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        # longest prefix within max_tokens (binary search on length), cut back to a word boundary
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        if lo == len(text):
+            return text
+        cut = text[:lo]
+        return cut[:cut.rfind(" ")] if " " in cut else cut
+
+    def last_question(self, sid: str) -> str:
+        """The previous question in standalone form (as asked, for turns recorded without it)."""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(standalone, question) FROM turns WHERE sid = ? "
+                                     "ORDER BY seq DESC LIMIT 1", (sid,)).fetchone()
+        return row[0] if row else ""
+
+    def reset(self, sid: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM turns WHERE sid = ?", (sid,))
+            self._conn.commit()
+
+    def _prune(self):
+        # Caller holds the lock. Drop every turn of sessions idle for longer than the TTL.
+        cutoff = self._clock() - self.ttl
+        self._conn.execute(
+            "DELETE FROM turns WHERE sid IN (SELECT sid FROM turns GROUP BY sid HAVING MAX(created_at) < ?)",
+            (cutoff,),
+        )
+
+    def prune(self):
+        with self._lock:
+            self._prune()
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -3,6 +3,9 @@ import re
 from typing import List, Dict
 from langchain_core.documents import Document
 
+from utils.metrics import traced
+
+@traced("summarize_sources")
 def summarize_sources_for_display(docs: List[Document], max_sentences=3) -> List[Dict]:
     summaries = []
     for doc in docs:
@@ -16,19 +19,3 @@ def summarize_sources_for_display(docs: List[Document], max_sentences=3) -> List
             "summary": short_summary
         })
     return summaries
-
-def is_topic_related(current_question: str, previous_question: str, threshold=0.5) -> bool:
-    """Check if the current question is related to the previous one based on a simple heuristic. """
-    # This is a placeholder for a more sophisticated topic modeling or similarity check.
-    # For now, we use a simple keyword overlap heuristic.
-    current_keywords = set(re.findall(r'\w+', current_question.lower()))
-    previous_keywords = set(re.findall(r'\w+', previous_question.lower()))
-    
-    if not previous_keywords:
-        return True  # No previous question to compare against
-    
-    overlap = current_keywords.intersection(previous_keywords)
-    score = len(overlap) / len(previous_keywords)
-    
-    return score >= threshold
-
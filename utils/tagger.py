@@ -0,0 +1,99 @@
+# utils/tagger.py
+"""
+Single-pass gazetteer tagger for chunk metadata.
+
+All gazetteer terms (countries, regions, sectors, risk categories) are
+compiled once into one trie-shaped regular expression, so tagging a chunk is a
+single scan of its text instead of one `re.search` per term. Output matches
+the old per-term loop: a chunk is tagged with every term that occurs as a
+whole word, in gazetteer order.
+"""
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "gazetteer.json")
+
+
+def load_gazetteer(path: str = GAZETTEER_PATH) -> Dict[str, List[str]]:
+    """Return {category: [terms]} from a JSON gazetteer file."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _trie_regex(terms: Sequence[str]) -> str:
+    """Build a regex alternation factored by common prefixes (longest match first)."""
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def walk(node: dict) -> str:
+        branches = [re.escape(ch) + walk(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{pattern})?" if "" in node else pattern
+
+    return walk(trie)
+
+
+class GazetteerTagger:
+    def __init__(self, gazetteer: Optional[Dict[str, List[str]]] = None):
+        gazetteer = gazetteer if gazetteer is not None else load_gazetteer()
+        terms = [t.lower() for terms in gazetteer.values() for t in terms]
+        self.terms = list(dict.fromkeys(terms))
+        # term → gazetteer category ("countries", "regions", ...); first listing wins
+        self.categories: Dict[str, str] = {}
+        for category, category_terms in gazetteer.items():
+            for t in category_terms:
+                self.categories.setdefault(t.lower(), category)
+        self._order = {t: i for i, t in enumerate(self.terms)}
+        # Zero-width lookahead lets terms nested at other offsets ("africa" inside
+        # "south africa") match too, as they did with one search per term.
+        self._pattern = re.compile(rf"(?=\b({_trie_regex(self.terms)})\b)")
+        # Terms that are a whole-word prefix of a longer term share its start offset
+        self._prefixes = {
+            t: [p for p in self.terms if p != t and t.startswith(p) and not t[len(p)].isalnum()]
+            for t in self.terms
+        }
+
+    def tag(self, text: str) -> List[str]:
+        found = set()
+        for match in self._pattern.finditer(text.lower()):
+            term = match.group(1)
+            found.add(term)
+            found.update(self._prefixes[term])
+        return sorted(found, key=self._order.__getitem__)
+
+    def terms_in(self, category: str) -> List[str]:
+        return [t for t in self.terms if self.categories[t] == category]
+
+    def tag_documents(self, docs: List[Document], workers: int = 1) -> List[Document]:
+        """Set `metadata["tags"]` on every document, optionally across processes."""
+        texts = [d.page_content for d in docs]
+        if workers > 1 and len(texts) > 1000:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                all_tags = list(pool.map(self.tag, texts, chunksize=500))
+        else:
+            all_tags = [self.tag(t) for t in texts]
+        for doc, tags in zip(docs, all_tags):
+            doc.metadata["tags"] = tags
+        return docs
+
+
+_default_tagger: Optional[GazetteerTagger] = None
+
+
+def default_tagger() -> GazetteerTagger:
+    """Tagger for the bundled gazetteer, compiled once per process."""
+    global _default_tagger
+    if _default_tagger is None:
+        _default_tagger = GazetteerTagger()
+    return _default_tagger
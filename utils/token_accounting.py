@@ -0,0 +1,148 @@
+# utils/token_accounting.py
+"""
+Token accounting shared by chunking, embedding batches, context packing and
+the corpus statistics report.
+
+* `get_encoder` loads each tiktoken encoding once per process (loading it
+  is far slower than encoding a chunk).
+* `encode_batch` / `count_batch` encode many texts at once on tiktoken's
+  native thread pool.
+* `annotate_token_counts` stores each chunk's count in
+  `metadata["tokens"]`. The count is saved with the docstore, so later
+  budget checks (`doc_tokens`, the context packer, the stats report) read it
+  instead of re-encoding.
+
+When the encoding can't be loaded (e.g. offline), counts fall back to a
+chars / 4 estimate and the report is flagged as estimated.
+"""
+import functools
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+    from config import CHUNK_OVERSIZE_TOKENS, TOKEN_ENCODING, TOKEN_THREADS
+except Exception:
+    TOKEN_ENCODING = "cl100k_base"
+    TOKEN_THREADS = 8
+    CHUNK_OVERSIZE_TOKENS = 3000
+
+TOKENS_KEY = "tokens"
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoder(encoding: str = TOKEN_ENCODING):
+    """The tiktoken encoding, loaded once; None when it can't be loaded."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(encoding)
+    except Exception as e:
+        print(f"⚠️ tiktoken unavailable ({e}); estimating tokens as chars / 4")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def count_tokens(text: str, encoding: str = TOKEN_ENCODING) -> int:
+    enc = get_encoder(encoding)
+    return len(enc.encode_ordinary(text)) if enc is not None else estimate_tokens(text)
+
+
+def encode_batch(texts: Sequence[str], encoding: str = TOKEN_ENCODING,
+                 num_threads: int = TOKEN_THREADS) -> List[List[int]]:
+    """Token IDs for every text, encoded in parallel."""
+    enc = get_encoder(encoding)
+    if enc is None:
+        raise RuntimeError(f"tiktoken encoding {encoding!r} is unavailable")
+    return enc.encode_ordinary_batch(list(texts), num_threads=num_threads)
+
+
+def count_batch(texts: Sequence[str], encoding: str = TOKEN_ENCODING,
+                num_threads: int = TOKEN_THREADS) -> List[int]:
+    if get_encoder(encoding) is None:
+        return [estimate_tokens(t) for t in texts]
+    return [len(ids) for ids in encode_batch(texts, encoding, num_threads)]
+
+
+def annotate_token_counts(docs: Sequence[Document], encoding: str = TOKEN_ENCODING) -> List[int]:
+    """Set `metadata["tokens"]` on docs that lack it (one batched encode); returns every doc's count."""
+    missing = [d for d in docs if TOKENS_KEY not in d.metadata]
+    for doc, n in zip(missing, count_batch([d.page_content for d in missing], encoding)):
+        doc.metadata[TOKENS_KEY] = n
+    return [d.metadata[TOKENS_KEY] for d in docs]
+
+
+def doc_tokens(doc: Document) -> int:
+    """A chunk's token count, from its metadata when it was recorded at indexing time."""
+    n = doc.metadata.get(TOKENS_KEY)
+    return n if n is not None else count_tokens(doc.page_content)
+
+
+def _distribution(counts: np.ndarray, edges: np.ndarray) -> dict:
+    p50, p90, p95, p99 = np.percentile(counts, [50, 90, 95, 99])
+    return {
+        "chunks": int(len(counts)), "tokens": int(counts.sum()), "mean": round(float(counts.mean()), 1),
+        "min": int(counts.min()), "max": int(counts.max()),
+        "p50": float(p50), "p90": float(p90), "p95": float(p95), "p99": float(p99),
+        "histogram": np.histogram(counts, bins=edges)[0].tolist(),
+    }
+
+
+def corpus_report(docs: Sequence[Document], oversize_tokens: int = CHUNK_OVERSIZE_TOKENS, bins: int = 10,
+                  max_listed: int = 100, encoding: str = TOKEN_ENCODING) -> dict:
+    """
+    Token statistics for a chunked corpus: overall and per source (percentiles
+    and a histogram over shared bin edges), plus the chunks over `oversize_tokens`.
+    """
+    counts = np.asarray(annotate_token_counts(docs, encoding), dtype=np.int64)
+    report = {"encoding": encoding, "estimated": get_encoder(encoding) is None, "chunks": len(docs),
+              "tokens": int(counts.sum()), "oversize_tokens": oversize_tokens}
+    if not len(docs):
+        return report
+
+    edges = np.histogram_bin_edges(counts, bins=bins)
+    by_source: Dict[str, List[int]] = defaultdict(list)
+    for i, doc in enumerate(docs):
+        by_source[str(doc.metadata.get("source") or "unknown")].append(i)
+    oversize = [i for i in np.argsort(-counts, kind="stable") if counts[i] > oversize_tokens]
+
+    report.update({
+        "histogram_edges": [round(float(e), 1) for e in edges],
+        "overall": _distribution(counts, edges),
+        "sources": {src: _distribution(counts[idx], edges) for src, idx in sorted(by_source.items())},
+        "oversize": {
+            "count": len(oversize),
+            "chunks": [{"source": docs[i].metadata.get("source"), "page": docs[i].metadata.get("page"),
+                        "chunk_id": docs[i].metadata.get("chunk_id"), "tokens": int(counts[i])}
+                       for i in oversize[:max_listed]],
+        },
+    })
+    return report
+
+
+def write_report(report: dict, path: str):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def format_report(report: dict) -> str:
+    """Few-line summary of a `corpus_report` for logs."""
+    if not report["chunks"]:
+        return "No chunks."
+    o = report["overall"]
+    lines = [
+        f"{report['chunks']} chunks, {report['tokens']} tokens"
+        + (" (estimated: tiktoken unavailable)" if report["estimated"] else ""),
+        f"per chunk: mean {o['mean']}  p50 {o['p50']:.0f}  p95 {o['p95']:.0f}  p99 {o['p99']:.0f}  max {o['max']}",
+        f"chunks over {report['oversize_tokens']} tokens: {report['oversize']['count']}",
+    ]
+    return "\n".join(lines)
@@ -0,0 +1,66 @@
+# utils/topic_continuity.py
+"""
+Topic-continuity check for follow-up questions, by embedding similarity.
+
+The new (standalone) question is embedded with the store's embedding
+function, which the retriever uses moments later for the same text, so the
+vector comes out of the query-embedding cache instead of costing an extra
+request. Each session's previous question vector is kept in a bounded LRU,
+so comparing needs no call at all; after a restart the previous question is
+simply re-embedded (usually a query-cache hit as well). Callers pass that
+previous question in its standalone form too (`SessionStore.last_question`),
+so a pronoun-only follow-up is never compared against unresolved text.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    from config import TOPIC_SIMILARITY_THRESHOLD
+except Exception:
+    TOPIC_SIMILARITY_THRESHOLD = 0.8
+
+
+def _unit(vector) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+class TopicTracker:
+    def __init__(self, embeddings: Embeddings, threshold: float = TOPIC_SIMILARITY_THRESHOLD,
+                 max_sessions: int = 10000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_sessions = max_sessions
+        self._previous: "OrderedDict[str, np.ndarray]" = OrderedDict()  # session → last question vector
+        self._lock = threading.Lock()
+
+    def similarity(self, session_id: str, question: str, previous_question: Optional[str] = None) -> Optional[float]:
+        """
+        Cosine similarity of `question` to the session's previous question
+        (None for a first question), and remember `question` as the new previous one.
+        `previous_question`, used when no vector is held, must be a standalone question too.
+        """
+        current = _unit(self.embeddings.embed_query(question))
+        with self._lock:
+            previous = self._previous.pop(session_id, None)
+            self._previous[session_id] = current
+            while len(self._previous) > self.max_sessions:
+                self._previous.popitem(last=False)
+        if previous is not None and previous.shape != current.shape:
+            previous = None  # held from before a rebuild with another embedding model
+        if previous is None and previous_question:
+            previous = _unit(self.embeddings.embed_query(previous_question))
+        return None if previous is None else float(previous @ current)
+
+    def is_related(self, session_id: str, question: str, previous_question: Optional[str] = None) -> bool:
+        score = self.similarity(session_id, question, previous_question)
+        return score is None or score >= self.threshold
+
+    def reset(self, session_id: str):
+        with self._lock:
+            self._previous.pop(session_id, None)
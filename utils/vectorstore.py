@@ -1,42 +1,80 @@
 # utils/vectorstore.py
 
+import json
 import os
-from typing import List
+import shutil
+import time
+import uuid
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
 
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_openai.embeddings import OpenAIEmbeddings
+
+from utils.bm25 import BM25_FILE, BM25Index
+from utils.embedding_backends import (
+    DEFAULT_MODELS, EMBEDDING_BACKEND, embeddings_for_index, index_embedding_key, make_embeddings,
+)
+from utils.embedding_cache import EMBEDDING_CACHE_PATH, CachedEmbeddings, EmbeddingCache
+from utils.embedding_executor import MAX_BATCH_SIZE, ConcurrentEmbeddings
+from utils.faiss_index import (
+    FAISS_INDEX_PARAMS, FAISS_INDEX_TYPE, apply_search_params, describe_index, empty_store, index_spec, training_size,
+)
+from utils.hybrid import fuse_with_bm25
+from utils.ingest import build_vectorstore_streaming, iter_chunks, iter_pdf_pages
+from utils.metadata_index import (
+    METADATA_INDEX_FILE, MetadataIndex, allowed_chunk_ids, enable_reconstruct, filtered_search,
+)
+from utils.parallel_loader import LOADER_WORKERS
+from utils.query_cache import shared_query_embeddings
+from utils.reranker import get_reranker
+from utils.tagger import GazetteerTagger, default_tagger
+from utils.token_accounting import annotate_token_counts
+
+try:
+    from config import INDEX_KEEP_VERSIONS
+except Exception:
+    INDEX_KEEP_VERSIONS = 3
 
 # Load .env once
 load_dotenv()
 
 VECTORSTORE_PATH = "vectorstore_index"
-EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_MODEL = DEFAULT_MODELS[EMBEDDING_BACKEND]
+INDEX_META_FILE = "index_meta.json"
+# Each saved version lives in versions/<version>/; CURRENT names the live one
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
 
 # === DOCUMENT LOADING ===
 
-def load_documents_from_pdf_dir(dir_path="data") -> List[Document]:
+def iter_documents_from_pdf_dir(dir_path="data", workers=LOADER_WORKERS) -> Iterator[Document]:
+    """
+    Yield annotated pages of all PDFs in the directory as they are parsed.
+
+    Files (and page ranges of large files) are parsed in `workers` processes
+    with a bounded look-ahead; pages come out in the same order as a
+    sequential load.
+    """
+    files = sorted(f for f in os.listdir(dir_path) if f.endswith(".pdf"))
+    for d in iter_pdf_pages([os.path.join(dir_path, f) for f in files], backend="pymupdf", workers=workers):
+        d.metadata["source"] = os.path.basename(d.metadata["source"])
+        d.metadata["page_number"] = d.metadata["page"] + 1
+        yield d
+
+def load_documents_from_pdf_dir(dir_path="data", workers=LOADER_WORKERS) -> List[Document]:
     """Load and annotate all PDFs in the directory with source + page metadata."""
-    documents = []
-    for file in os.listdir(dir_path):
-        if file.endswith(".pdf"):
-            path = os.path.join(dir_path, file)
-            loader = PyMuPDFLoader(path)
-            docs = loader.load()
-            for i, d in enumerate(docs):
-                d.metadata["source"] = file
-                d.metadata["page_number"] = i + 1
-            documents.extend(docs)
+    documents = list(iter_documents_from_pdf_dir(dir_path, workers))
     print(f"Loaded {len(documents)} documents from {dir_path}")
     return documents
 
-def split_documents(docs: List[Document], chunk_size=500, chunk_overlap=100) -> List[Document]:
+def split_documents(docs: List[Document], chunk_size=500, chunk_overlap=100,
+                    tagger: Optional[GazetteerTagger] = None, workers=1) -> List[Document]:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
-    import re
 
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
@@ -45,45 +83,203 @@ def split_documents(docs: List[Document], chunk_size=500, chunk_overlap=100) ->
     )
     chunks = splitter.split_documents(docs)
 
-    # === SMART TAGGING BASED ON COUNTRIES ===
-    countries = [
-    "mali", "chile", "el salvador", "morocco", "vietnam", "china", "turkiye", 
-    "egypt", "india", "mexico", "france", "germany", "united states", 
-    "switzerland", "romania", "south africa"
-]
-    # Add more countries as needed
-    for chunk in chunks:
-        text = chunk.page_content.lower()
-        tags = [country for country in countries if re.search(rf"\b{country}\b", text)]
-        chunk.metadata["tags"] = tags
+    # === SMART TAGGING BASED ON THE GAZETTEER ===
+    # Countries, regions, sectors and risk categories from utils/gazetteer.json,
+    # matched in a single compiled pass per chunk
+    (tagger or default_tagger()).tag_documents(chunks, workers=workers)
+    annotate_token_counts(chunks)  # metadata["tokens"], reused by stats and context packing
     return chunks
 
+def iter_split_documents(docs: Iterable[Document], chunk_size=500, chunk_overlap=100) -> Iterator[Document]:
+    """Streaming `split_documents`: yields tagged chunks, with token counts, page by page."""
+    return iter_chunks(docs, lambda page: split_documents(page, chunk_size, chunk_overlap))
+
 
 # === VECTORSTORE BUILD / SAVE / LOAD ===
 
-def build_vectorstore(chunks: List[Document], batch_size=100) -> FAISS:
-    """Embed text chunks and build a FAISS index."""
+def _make_embedder(cache_path=EMBEDDING_CACHE_PATH, batch_size=MAX_BATCH_SIZE):
+    """
+    The configured embedding backend (OpenAI behind the concurrent executor,
+    or the local model, which batches itself), wrapped in the on-disk cache
+    unless `cache_path` is None. Returns (model, executor or None, embedder, cache);
+    `model` is a normally configured client for the store's embedding function.
+    """
+    if EMBEDDING_BACKEND == "openai":
+        # Retries are left to the executor: it backs off on 429s across all threads
+        # and retries 5xx / timeouts / connection errors per batch. Only the
+        # executor's client has them disabled; the store queries with the defaults.
+        embedding_model = make_embeddings("openai", EMBEDDING_MODEL)
+        executor = ConcurrentEmbeddings(make_embeddings("openai", EMBEDDING_MODEL, max_retries=0),
+                                        max_batch_size=batch_size)
+    else:
+        embedding_model = make_embeddings(EMBEDDING_BACKEND, EMBEDDING_MODEL)
+        executor = None
+    cache = EmbeddingCache(cache_path) if cache_path else None
+    base = executor or embedding_model
+    embedder = CachedEmbeddings(base, cache, EMBEDDING_MODEL) if cache else base
+    return embedding_model, executor, embedder, cache
+
+def build_vectorstore(chunks: List[Document], batch_size=MAX_BATCH_SIZE, cache_path=EMBEDDING_CACHE_PATH,
+                      index_type=FAISS_INDEX_TYPE, index_params=None) -> FAISS:
+    """
+    Embed text chunks and build a FAISS index.
+
+    `index_type` picks the index family ("flat", "hnsw" or "ivf"; see
+    `utils.faiss_index`) and `index_params` overrides its defaults
+    (M, efConstruction, efSearch / nlist, nprobe).
+
+    Embeddings are looked up in the on-disk cache at `cache_path` first, so
+    unchanged chunks are not re-embedded; pass `cache_path=None` to disable.
+    Misses are sent as concurrent, token-bounded requests of at most
+    `batch_size` chunks each.
+    """
     texts = [doc.page_content for doc in chunks]
     metadatas = [doc.metadata for doc in chunks]
-    embedding_model = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+    embedding_model, executor, embedder, cache = _make_embedder(cache_path, batch_size)
 
+    # Slices of max_in_flight batches keep the executor's pool full between progress updates
+    step = batch_size * (executor.max_in_flight if executor else 1)
     embedded_texts = []
-    for i in tqdm(range(0, len(texts), batch_size), desc="Embedding in batches"):
-        batch = texts[i:i + batch_size]
-        embedded = embedding_model.embed_documents(batch)
-        embedded_texts.extend(embedded)
-
-    faiss_store = FAISS.from_embeddings(
-        text_embeddings=list(zip(texts, embedded_texts)),
-        embedding=embedding_model,
-        metadatas=metadatas
-    )
+    for i in tqdm(range(0, len(texts), step), desc="Embedding in batches"):
+        embedded_texts.extend(embedder.embed_documents(texts[i:i + step]))
+    if executor:
+        print(executor.report())
+    if cache:
+        print(cache.report())
+        cache.close()
+
+    spec = index_spec(index_type, **{**FAISS_INDEX_PARAMS, **(index_params or {})})
+    vectors = np.asarray(embedded_texts, dtype=np.float32)
+    training = None
+    if training_size(spec):
+        # Train IVF centroids on a uniform sample of the corpus
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(vectors), size=min(len(vectors), training_size(spec)), replace=False)
+        training = vectors[np.sort(sample)]
+    faiss_store = empty_store(embedding_model, spec, vectors.shape[1], training)
+    faiss_store.add_embeddings(list(zip(texts, embedded_texts)), metadatas=metadatas)
     return faiss_store
 
-def save_vectorstore(chunks: List[Document], path=VECTORSTORE_PATH):
-    """Build and save FAISS vectorstore locally."""
-    vs = build_vectorstore(chunks)
-    vs.save_local(path)
+def _current_pointer(path) -> Optional[str]:
+    pointer = os.path.join(path, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer, encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def resolve_index_dir(path=VECTORSTORE_PATH) -> str:
+    """
+    Directory holding the live FAISS files for the index at `path`: the
+    version named by its CURRENT pointer, or `path` itself for indexes saved
+    before versioned directories.
+    """
+    version = _current_pointer(path)
+    return os.path.join(path, VERSIONS_DIR, version) if version else path
+
+
+def read_index_meta(path=VECTORSTORE_PATH) -> dict:
+    """Return the metadata saved next to the FAISS files (empty if none)."""
+    meta_path = os.path.join(resolve_index_dir(path), INDEX_META_FILE)
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_version(path=VECTORSTORE_PATH) -> str:
+    """
+    Identify the on-disk version of an index.
+
+    Indexes written by `save_index` are named by their CURRENT pointer; older
+    ones fall back to the version in their metadata or a fingerprint of the
+    FAISS/pickle file stats.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Vectorstore directory not found: {path}")
+    version = _current_pointer(path) or read_index_meta(path).get("version")
+    if version:
+        return version
+    stats = []
+    for name in ("index.faiss", "index.pkl"):
+        st = os.stat(os.path.join(path, name))
+        stats.append(f"{st.st_mtime_ns}:{st.st_size}")
+    return "-".join(stats)
+
+
+def save_index(vs: FAISS, path=VECTORSTORE_PATH, meta: Optional[dict] = None,
+               sidecars: Optional[dict] = None, keep_versions: int = INDEX_KEEP_VERSIONS) -> str:
+    """
+    Save a FAISS store so that readers never see a half-written index.
+
+    The store, its BM25 keyword and metadata indexes, any other JSON `sidecars`
+    (given as {filename: data}) and the metadata (carrying a fresh version) are
+    written to a directory of their own under versions/, which is then
+    published by atomically replacing the CURRENT pointer. Readers resolve the
+    pointer once and load a complete version; processes using
+    `utils.index_registry` pick up the new version on their next lookup. All
+    but the newest `keep_versions` versions are pruned.
+    Returns the new version string.
+    """
+    versions = os.path.join(path, VERSIONS_DIR)
+    os.makedirs(versions, exist_ok=True)
+    now = time.time()
+    version = f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(versions, f".staging-{version}")
+    try:
+        vs.save_local(staging)
+        sidecars = dict(sidecars or {})
+        sidecars.setdefault(BM25_FILE, BM25Index.from_store(vs).to_dict())
+        sidecars.setdefault(METADATA_INDEX_FILE, MetadataIndex.from_store(vs).to_dict())
+        for name, data in sidecars.items():
+            with open(os.path.join(staging, name), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        meta = dict(meta or {}, version=version, ntotal=vs.index.ntotal, embedding_dim=vs.index.d,
+                    index=describe_index(vs.index))
+        with open(os.path.join(staging, INDEX_META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.rename(staging, os.path.join(versions, version))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    tmp_pointer = os.path.join(path, f".{CURRENT_FILE}.tmp-{version}")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(path, CURRENT_FILE))
+
+    # Version names sort by save time; never prune the one just published
+    old = sorted(name for name in os.listdir(versions) if not name.startswith(".") and name != version)
+    for name in old[:max(0, len(old) - max(keep_versions, 1) + 1)]:
+        shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+    return version
+
+
+def save_vectorstore(chunks: Iterable[Document], path=VECTORSTORE_PATH, batch_size=512,
+                     max_pending_batches=2, cache_path=EMBEDDING_CACHE_PATH,
+                     index_type=FAISS_INDEX_TYPE, index_params=None):
+    """
+    Build and save FAISS vectorstore locally.
+
+    `chunks` may be a list or a generator (e.g. `iter_split_documents(
+    iter_documents_from_pdf_dir())`); it is consumed in windows of `batch_size`
+    chunks through the bounded streaming pipeline in `utils.ingest`, so memory
+    stays flat. Each window is embedded as several concurrent requests.
+    """
+    embedding_model, executor, embedder, cache = _make_embedder(cache_path)
+    progress = tqdm(desc="Embedding chunks", unit="chunk")
+    spec = index_spec(index_type, **{**FAISS_INDEX_PARAMS, **(index_params or {})})
+    vs = build_vectorstore_streaming(chunks, embedder, batch_size=batch_size,
+                                     max_pending_batches=max_pending_batches, on_batch=progress.update,
+                                     spec=spec, store_embeddings=embedding_model)
+    progress.close()
+    if executor:
+        print(executor.report())
+    if cache:
+        print(cache.report())
+        cache.close()
+    if vs is None:
+        raise ValueError("No chunks to index.")
+    save_index(vs, path, meta={"embedding_backend": EMBEDDING_BACKEND, "embedding_model": EMBEDDING_MODEL})
     print(f"Vectorstore saved to {path}")
 
 # def load_vectorstore(path=VECTORSTORE_PATH) -> FAISS:
@@ -93,50 +289,117 @@ def save_vectorstore(chunks: List[Document], path=VECTORSTORE_PATH):
 #     return FAISS.load_local(path, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
 
 
+def _keyword_boost(query: str, results: List[tuple], apply: bool = True) -> List[Document]:
+    """
+    Legacy ranking for indexes without a BM25 sidecar: constant distance
+    offsets for country-tag and keyword hits. Only country tags get the
+    strong offset; region, sector and risk tags ("energy", "debt") are
+    generic words and count as plain keyword hits. `apply=False` keeps the
+    dense order (the reranker replaces the offsets).
+    """
+    if not apply:
+        return [doc for doc, _ in results]
+    keywords = [kw.lower() for kw in query.split()]
+    countries = set(default_tagger().terms_in("countries"))
+
+    boosted = []
+    for doc, score in results:
+        doc_text = doc.page_content.lower()
+        doc_tags = [tag.lower() for tag in doc.metadata.get("tags", [])]
+
+        # Boost logic
+        exact_country_match = any(kw in countries and kw in doc_tags for kw in keywords)
+        keyword_match = any(kw in doc_text for kw in keywords)
+
+        if exact_country_match:
+            boosted_score = score - 8  # Strongest boost
+        elif keyword_match:
+            boosted_score = score - 3  # Mild boost
+        else:
+            boosted_score = score
+
+        boosted.append((doc, boosted_score))
+
+    # Sort by boosted score (lower = better)
+    boosted.sort(key=lambda x: x[1])
+    return [doc for doc, _ in boosted]
+
+
+def candidate_count(k: int, reranker=None) -> int:
+    """Dense candidates fetched per query by `rank_candidates` (the pool plus headroom for fusion)."""
+    return max(20, max(k, reranker.pool_size) if reranker else k)
+
+
+def rank_candidates(store: FAISS, query: str, k: int = 8, reranker=None,
+                    dense: Optional[List[tuple]] = None) -> Tuple[List[Document], bool]:
+    """
+    The retrieval pipeline behind `boosted_retriever`: page / filename
+    prefilter, BM25 fusion (or the legacy keyword boost) and the optional
+    reranker. `dense` holds the unfiltered (doc, distance) candidates when
+    the caller has already searched (batched audits); otherwise the store is
+    searched here. Returns the top k and whether the prefilter applied.
+    """
+    pool = max(k, reranker.pool_size) if reranker else k
+    fetch = candidate_count(k, reranker)
+    metadata_index = getattr(store, "metadata_index", None)
+    ids = metadata_index.select_for_query(query) if metadata_index is not None else None
+    if ids is not None and len(ids):
+        # page / filename clues: search only inside the matching chunks
+        filtered = True
+        docs = fuse_with_bm25(store, query, filtered_search(store, query, ids, k=fetch), pool,
+                              allowed=allowed_chunk_ids(store, ids))
+    else:
+        filtered = False
+        if dense is None:
+            dense = store.similarity_search_with_score(query, k=fetch)
+        if getattr(store, "bm25", None) is not None:
+            docs = fuse_with_bm25(store, query, [doc for doc, _ in dense], pool)
+        else:
+            docs = _keyword_boost(query, dense, apply=reranker is None)[:pool]
+
+    if reranker:
+        docs = reranker.rerank(query, docs, k)
+    return docs[:k], filtered
+
+
 def load_vectorstore(path=VECTORSTORE_PATH) -> FAISS:
     """Load FAISS index and return a retriever that prioritises keyword hits."""
     if not os.path.exists(path):
         raise FileNotFoundError(f"Vectorstore directory not found: {path}")
 
-    faiss_store = FAISS.load_local(path, OpenAIEmbeddings(), allow_dangerous_deserialization=True)
+    # Query with the backend / model the index was built with (recorded in index_meta.json),
+    # through a process-wide LRU/TTL cache (plus optional disk tier)
+    # Resolve the CURRENT pointer once, so every file comes from the same version
+    index_dir = resolve_index_dir(path)
+    index_meta = read_index_meta(index_dir)
+    embeddings = shared_query_embeddings(index_embedding_key(index_meta), lambda: embeddings_for_index(index_meta))
+    faiss_store = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+    faiss_store.index_meta = index_meta
+    # Re-apply recorded query-time parameters (efSearch / nprobe) for ANN indexes
+    apply_search_params(faiss_store.index, faiss_store.index_meta.get("index"))
+    faiss_store.bm25 = BM25Index.load(index_dir)
+    # source / page / tag → positions, for prefiltered search (rebuilt if the sidecar is missing)
+    faiss_store.metadata_index = MetadataIndex.load(index_dir, faiss_store)
+    enable_reconstruct(faiss_store.index)  # before the store is shared between threads
+    # Make every chunk addressable by its docstore ID (used by hybrid fusion)
+    for doc_id in faiss_store.index_to_docstore_id.values():
+        faiss_store.docstore.search(doc_id).metadata.setdefault("chunk_id", doc_id)
 
     # Create a retriever with keyword prioritisation
-    # This custom retriever boosts results based on country tags or keyword hits
-    # It overrides the default similarity search to apply custom scoring logic
+    # With a BM25 sidecar, dense and keyword rankings are fused (RRF); older
+    # indexes fall back to boosting on country tags or keyword hits. With
+    # reranking enabled, a cross-encoder picks the final k from the candidate pool.
+    reranker = get_reranker()
+
     def boosted_retriever(query: str, k: int = 8):
         """Custom retriever that boosts chunks with country tag matches or keyword hits."""
-        results = faiss_store.similarity_search_with_score(query, k=20)
-        keywords = [kw.lower() for kw in query.split()]
-
-        boosted = []
-        for doc, score in results:
-            doc_text = doc.page_content.lower()
-            doc_tags = [tag.lower() for tag in doc.metadata.get("tags", [])]
-
-            # Boost logic
-            exact_country_match = any(kw in doc_tags for kw in keywords)
-            keyword_match = any(kw in doc_text for kw in keywords)
-
-            if exact_country_match:
-                boosted_score = score - 8  # Strongest boost
-            elif keyword_match:
-                boosted_score = score - 3  # Mild boost
-            else:
-                boosted_score = score
-
-            boosted.append((doc, boosted_score))
-
-        # Sort by boosted score (lower = better)
-        boosted.sort(key=lambda x: x[1])
-
-        # Debug output
-        for i, (doc, score) in enumerate(boosted[:k]):
-            print(f"RESULT {i+1}: score={score:.2f}, tags={doc.metadata.get('tags', [])}")
+        docs, filtered = rank_candidates(faiss_store, query, k, reranker)
+        label = " (filtered)" if filtered else ""
+        for i, doc in enumerate(docs):
+            print(f"RESULT {i+1}{label}: tags={doc.metadata.get('tags', [])}")
             print(doc.page_content[:300].replace("\n", " "))
             print("-" * 60)
-
-        return [doc for doc, _ in boosted[:k]]
-
+        return docs
 
     # Attach as method
     faiss_store.boosted_retriever = boosted_retriever
@@ -145,12 +408,10 @@ def load_vectorstore(path=VECTORSTORE_PATH) -> FAISS:
 # === FOR SCRIPT EXECUTION ===
 
 if __name__ == "__main__":
-    docs = load_documents_from_pdf_dir()
-    chunks = split_documents(docs)
+    chunks = iter_split_documents(iter_documents_from_pdf_dir())
 
-    print(f"Splitting into {len(chunks)} chunks...")
     # Optional: filter specific documents
-    chunks = [doc for doc in chunks if 'wir2024' in doc.metadata.get("source", "")]
+    chunks = (doc for doc in chunks if 'wir2024' in doc.metadata.get("source", ""))
     save_vectorstore(chunks)
     print("Vectorstore built and persisted.")
     # Uncomment to load and test